@@ -1,6 +1,12 @@
 from celery import Celery
+from celery.signals import task_prerun, task_postrun
+from celery import states
 from dash import CeleryManager
 import os
+import logging
+from db_manager.augur_manager import pool_metrics as augur_pool_metrics
+from _redis_pools import pool_metrics as redis_pool_metrics
+from cache_manager.cache_manager import CacheManager
 
 redis_host = "{}".format(os.getenv("REDIS_SERVICE_HOST", "redis-cache"))
 redis_port = "{}".format(os.getenv("REDIS_SERVICE_PORT", "6379"))
@@ -18,4 +24,47 @@ celery_app = Celery(
 # tasks have 30 minutes to execute before they're killed.
 celery_app.conf.update(task_time_limit=1800, task_acks_late=True, task_track_started=True)
 
+# honor task priorities on the Redis broker: each queue is split into one list per
+# step that workers drain in order, 0 first. Workers reserve one task at a time so
+# that a task queued at a higher priority isn't stuck behind reserved ones.
+celery_app.conf.update(
+    broker_transport_options={"priority_steps": list(range(10)), "sep": ":", "queue_order_strategy": "priority"},
+    task_default_priority=3,
+    worker_prefetch_multiplier=1,
+)
+
 celery_manager = CeleryManager(celery_app=celery_app)
+
+
+@task_postrun.connect
+def log_pool_metrics(task=None, **kwargs):
+    """Logs the worker process's connection pool usage after each task, for capacity planning."""
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f"POOLS: {task.name} augur={augur_pool_metrics()} redis={redis_pool_metrics()}")
+
+
+def _leased_repos(args):
+    """Repos a task may hold leases on- query tasks take the list of repos as first argument."""
+    if args and isinstance(args[0], list):
+        return args[0]
+    return []
+
+
+@task_prerun.connect
+def renew_leases(task_id=None, task=None, args=None, **kwargs):
+    """Extends the leases of a query task on its repos when an attempt starts, so they outlive retries."""
+    repos = _leased_repos(args)
+    if repos:
+        CacheManager().renewm(task, repos, task_id)
+
+
+@task_postrun.connect
+def release_leases(task_id=None, task=None, args=None, state=None, **kwargs):
+    """Releases the leases of a query task once it has cached its results or given up.
+
+    Searches started afterwards fetch repos that are still missing themselves
+    instead of attaching to the finished task.
+    """
+    repos = _leased_repos(args)
+    if repos and state != states.RETRY:
+        CacheManager().releasem(task, repos, task_id)
@@ -7,6 +7,7 @@ from flask_login import (
     UserMixin,
 )
 import redis
+from _redis_pools import users_client
 from flask import url_for, redirect, abort, session, request, flash, current_app
 import logging
 import json
@@ -66,20 +67,15 @@ def configure_server_login(server):
         Returns:
             User | None: User object if user ID in session, None otherwise.
         """
-        users_cache = redis.StrictRedis(
-            host=os.getenv("REDIS_SERVICE_USERS_HOST", "redis-users"),
-            port=6379,
-            password=os.getenv("REDIS_PASSWORD", ""),
-        )
+        users_cache = users_client()
         try:
-            users_cache.ping()
+            # JSON of a user that was set in the Redis instance
+            user_info = users_cache.get(id)
         except redis.exceptions.ConnectionError:
             logging.error("LOAD_USER: Could not connect to users-cache.")
             return None
 
-        # return the JSON of a user that was set in the Redis instance
-        if users_cache.exists(id):
-            usn = json.loads(users_cache.get(id))["username"]
+        if user_info:
             return User(id)
         return None
 
@@ -96,20 +92,15 @@ def configure_server_login(server):
             None
 
         """
-        users_cache = redis.StrictRedis(
-            host=os.getenv("REDIS_SERVICE_USERS_HOST", "redis-users"),
-            port=6379,
-            password=os.getenv("REDIS_PASSWORD", ""),
-        )
-        try:
-            users_cache.ping()
-        except redis.exceptions.ConnectionError:
-            logging.error("LOGOUT: Could not connect to users-cache.")
-            return redirect("/")
+        users_cache = users_client()
 
         if current_user.is_authenticated:
             c_id = current_user.get_id()
-            users_cache.delete(c_id)
+            try:
+                users_cache.delete(c_id)
+            except redis.exceptions.ConnectionError:
+                logging.error("LOGOUT: Could not connect to users-cache.")
+                return redirect("/")
             logout_user()
             logging.warning(f"USER {c_id} LOGGED OUT")
         else:
@@ -127,11 +118,7 @@ def configure_server_login(server):
         Returns:
             None
         """
-        users_cache = redis.StrictRedis(
-            host=os.getenv("REDIS_SERVICE_USERS_HOST", "redis-users"),
-            port=6379,
-            password=os.getenv("REDIS_PASSWORD", ""),
-        )
+        users_cache = users_client()
         try:
             users_cache.ping()
         except redis.exceptions.ConnectionError:
@@ -174,11 +161,7 @@ def configure_server_login(server):
         Returns:
             None
         """
-        users_cache = redis.StrictRedis(
-            host=os.getenv("REDIS_SERVICE_USERS_HOST", "redis-users"),
-            port=6379,
-            password=os.getenv("REDIS_PASSWORD", ""),
-        )
+        users_cache = users_client()
         try:
             users_cache.ping()
         except redis.exceptions.ConnectionError:
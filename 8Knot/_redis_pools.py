@@ -0,0 +1,105 @@
+"""
+    Process-wide Redis connection pools.
+
+    8Knot talks to two Redis instances: 'redis-cache' (query results, job queue)
+    and 'redis-users' (user sessions and groups). Clients created through this
+    module share one connection pool per instance and process instead of opening
+    new connections for every callback or request.
+
+    redis-py resets a pool in a forked child the first time it's used there,
+    so it's safe to create clients before Celery / gunicorn fork their workers.
+
+    Pool size is capped by REDIS_MAX_CONNECTIONS (per instance and process).
+"""
+import os
+import threading
+import redis
+
+# connections each pool may open at most.
+DEFAULT_MAX_CONNECTIONS = 50
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(name, host, port, decode_responses):
+    """Returns the pool for a Redis instance, creating it on first use.
+
+    Args:
+        name (str): name of the instance, "cache" or "users"
+        host (str): hostname of the instance
+        port (str | int): port of the instance
+        decode_responses (bool): whether clients decode responses to str.
+
+    Returns:
+        redis.ConnectionPool: shared pool
+    """
+    key = (name, decode_responses)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = redis.ConnectionPool(
+                host=host,
+                port=port,
+                password=os.getenv("REDIS_PASSWORD", ""),
+                decode_responses=decode_responses,
+                max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", str(DEFAULT_MAX_CONNECTIONS))),
+            )
+        return _pools[key]
+
+
+def cache_client(decode_responses=False):
+    """Client of the 'redis-cache' instance backed by the shared pool.
+
+    Args:
+        decode_responses (bool): whether responses are decoded to str.
+
+    Returns:
+        redis.StrictRedis: client
+    """
+    pool = _get_pool(
+        "cache",
+        # openshift, compose will reconcile the 'redis' naming via the dns
+        host=os.getenv("REDIS_SERVICE_HOST", "redis-cache"),
+        port=os.getenv("REDIS_SERVICE_PORT", "6379"),
+        decode_responses=decode_responses,
+    )
+    return redis.StrictRedis(connection_pool=pool)
+
+
+def users_client(decode_responses=False):
+    """Client of the 'redis-users' instance backed by the shared pool.
+
+    Args:
+        decode_responses (bool): whether responses are decoded to str.
+
+    Returns:
+        redis.StrictRedis: client
+    """
+    pool = _get_pool(
+        "users",
+        host=os.getenv("REDIS_SERVICE_USERS_HOST", "redis-users"),
+        port=6379,
+        decode_responses=decode_responses,
+    )
+    return redis.StrictRedis(connection_pool=pool)
+
+
+def pool_metrics():
+    """Usage of this process's pools.
+
+    Returns:
+        dict{str: dict}: per pool, connections created, idle and in use, and the cap.
+    """
+    with _pools_lock:
+        pools = dict(_pools)
+
+    metrics = {}
+    for (name, decode_responses), pool in pools.items():
+        label = f"{name}-decoded" if decode_responses else name
+        metrics[label] = {
+            "created_connections": pool._created_connections,
+            "idle_connections": len(pool._available_connections),
+            "in_use_connections": len(pool._in_use_connections),
+            "max_connections": pool.max_connections,
+        }
+    return metrics
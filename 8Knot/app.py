@@ -15,14 +15,17 @@ import os
 import sys
 import logging
 import dash
+import flask
+from flask_login import current_user
 from sqlalchemy.exc import SQLAlchemyError
 import plotly.io as plt_io
 import dash_bootstrap_components as dbc
 import dash_bootstrap_templates as dbt
-from db_manager.augur_manager import AugurManager
+from db_manager.augur_manager import AugurManager, pool_metrics as augur_pool_metrics
 import _login
 from _celery import celery_app, celery_manager
 import _bots as bots
+from _redis_pools import pool_metrics as redis_pool_metrics
 
 logging.basicConfig(format="%(asctime)s %(levelname)-8s %(message)s", level=logging.INFO)
 
@@ -48,6 +51,10 @@ augur.multiselect_startup()
 
 """IMPORT AFTER GLOBAL VARIABLES SET"""
 import pages.index.index_callbacks as index_callbacks
+from queries.repo_stats_query import schedule_repo_stats
+
+# build the per-repo size statistics in the background if they're missing or outdated.
+schedule_repo_stats()
 
 
 """SET STYLING FOR APPLICATION"""
@@ -84,6 +91,17 @@ server = app.server
 server = _login.configure_server_login(server)
 
 
+# pool usage is only served if enabled, and only to signed-in users when login is enabled.
+if os.getenv("POOL_METRICS_ENABLED", "False") == "True":
+
+    @server.route("/metrics/pools/")
+    def pool_metrics():
+        """Connection pool usage of the app-server process, for capacity planning."""
+        if use_oauth and not current_user.is_authenticated:
+            flask.abort(401)
+        return flask.jsonify({"redis": redis_pool_metrics(), "augur": augur_pool_metrics()})
+
+
 """DASH PAGES LAYOUT"""
 # layout of the app stored in the app_layout file, must be imported after the app is initiated
 from pages.index.index_layout import layout
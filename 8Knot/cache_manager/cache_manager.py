@@ -1,18 +1,217 @@
-import redis
 import os
+import ast
 import hashlib
+import importlib.util
+import json
+import math
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-import io
+import pyarrow as pa
+from _redis_pools import cache_client
+
+# hash-field under which the ordered list of a frame's column names is stored.
+COLUMNS_FIELD = "__columns__"
+
+# identifies the storage layout of values in Redis. It's part of every key
+# so that blobs written in an older layout are never decoded as the current one.
+LAYOUT_VERSION = "columnar-1"
+
+# directory of the app's top-level packages, the imports of query modules are resolved in it.
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# app modules whose code doesn't change what queries cache, left out of their fingerprints.
+FINGERPRINT_EXCLUDE = {"app", "cache_manager", "db_manager", "_redis_pools"}
+
+# per-key metadata, stored next to the column fields of each key.
+SIZE_FIELD = "__size__"
+FETCHED_AT_FIELD = "__fetched_at__"
+CODEC_FIELD = "__codec__"
+VERSION_FIELD = "__version__"
+CHUNKS_FIELD = "__chunks__"
+WATERMARK_FIELD = "__watermark__"
+
+# compression codecs that column blobs can be written with.
+CODECS = ["none", "lz4", "zstd"]
+
+# Redis structures tracking every cached key for the eviction policy.
+# sizes: hash {key: bytes}, access: zset {key: last access time}, hits: zset {key: read count}
+SIZES_INDEX = "8knot:cache:sizes"
+ACCESS_INDEX = "8knot:cache:access"
+HITS_INDEX = "8knot:cache:hits"
+
+# counter of the bytes of all keys in SIZES_INDEX, so writes can check the
+# budget without summing the index.
+TOTAL_BYTES = "8knot:cache:bytes"
+
+# the least recently used keys checked for expiry on every write; the total
+# still counts keys whose TTL ran out until they're forgotten.
+EXPIRY_SAMPLE = 16
+
+# candidates looked at per round trip, and skipped at most per write, when over budget.
+EVICTION_BATCH = 64
+EVICTION_SCAN = 1024
+
+# size bookkeeping that keeps TOTAL_BYTES in step with SIZES_INDEX. KEYS: SIZES_INDEX, TOTAL_BYTES.
+# A missing counter, e.g. next to an index written before it existed, is summed from the index once.
+_INIT_TOTAL = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    local total = 0
+    for _, size in ipairs(redis.call('HVALS', KEYS[1])) do
+        total = total + tonumber(size)
+    end
+    redis.call('SET', KEYS[2], total)
+end
+"""
+_REGISTER_SIZE = (
+    _INIT_TOTAL
+    + """
+local old = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or 0)
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+return redis.call('INCRBY', KEYS[2], tonumber(ARGV[2]) - old)
+"""
+)
+_FORGET_SIZES = (
+    _INIT_TOTAL
+    + """
+local freed = 0
+for _, h in ipairs(ARGV) do
+    local size = redis.call('HGET', KEYS[1], h)
+    if size then
+        freed = freed + tonumber(size)
+        redis.call('HDEL', KEYS[1], h)
+    end
+end
+return redis.call('DECRBY', KEYS[2], freed)
+"""
+)
+
+# channel that setm publishes the keys it has written to.
+READY_CHANNEL = "8knot:cache:ready"
+
+# seconds 'wait_for' blocks on the channel before re-checking the cache itself,
+# a safety net in case a notification is lost (e.g. while reconnecting).
+WAIT_RECHECK = 30
+
+# default byte cap of the per-process cache of decoded columns. 0 disables it.
+DEFAULT_L1_MAX_BYTES = 268435456
+
+# times grabm re-reads keys that were rewritten while it was reading them.
+GRAB_RETRIES = 3
+
+# frames whose Arrow representation is larger than this are split into row chunks,
+# keeping every Redis value well below its 512MB limit. 0 disables chunking.
+DEFAULT_CHUNK_BYTES = 67108864
+
+# bytes a streamed write may buffer across all its repos before flushing chunks early. 0 for no cap.
+DEFAULT_STREAM_BUFFER_BYTES = 268435456
+
+# expiry of chunks a streamed write has flushed but not yet committed,
+# so that chunks of a write that never completes don't stay behind.
+STREAM_PENDING_TTL = 3600
+
+# prefix of the lease keys of (func, repo) pairs a query job is fetching,
+# "<prefix><key>" holds the id of the job that owns the lease.
+LEASE_PREFIX = "8knot:lease:"
+
+# default seconds a lease is held without being renewed: a task attempt's
+# time limit plus the delay before it's retried, with some margin.
+DEFAULT_LEASE_TTL = 2400
+
+# owner-checked lease operations; a job mustn't renew or release a lease
+# that has expired and been claimed by another job in the meantime.
+_RENEW_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# column types that queries declare for their cached columns, see CACHE_SCHEMA in the query modules.
+TIMESTAMP_UTC = pa.timestamp("ns", tz="UTC")
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+STRING = pa.string()
+
+# default time-to-live of a cached query result, in seconds. 0 disables expiry.
+DEFAULT_TTL = 604800
+
+# keys read or requested within this many seconds are never evicted and won't expire,
+# so data a search just found in cache can't vanish before its visualizations read it.
+EVICTION_GRACE = 600
 
 
 class CacheManager:
     """
     Manages access to Redis cache.
 
+    Each (func, repo) pair is stored as a Redis hash with one field per
+    DataFrame column. Every field holds a single-column Arrow IPC stream,
+    so readers can request only the columns they need and Redis never
+    ships the rest over the network.
+
+    Cached results expire after a per-query TTL and the total size of the
+    cache is kept under a byte budget by evicting the least recently (lru)
+    or least frequently (lfu) read keys. Configured via the environment:
+
+        CACHE_TTL : default TTL in seconds, 0 for no expiry.
+        CACHE_TTL_<FUNC_NAME> : per-query override, e.g. CACHE_TTL_COMMITS_QUERY.
+        CACHE_MAX_BYTES : byte budget for all cached results, 0 for no budget.
+        CACHE_EVICTION_POLICY : "lru" (default) or "lfu".
+
+    Column blobs are compressed with CACHE_CODEC ("none", "lz4" or "zstd") at
+    CACHE_CODEC_LEVEL (codec default if unset). Compression is part of the
+    Arrow IPC stream, so blobs of any codec are read back transparently and
+    keys written before a codec change stay readable. The codec a key was
+    written with is recorded under its CODEC_FIELD.
+
+    Every write stamps the key with a new VERSION_FIELD. Decoded columns are
+    kept in a per-process LRU cache keyed by (key, version, column) and capped
+    at CACHE_L1_MAX_BYTES, so visualizations of the same page reading the same
+    repos only download and decode each column once. A rewritten key has a new
+    version, which invalidates everything decoded from the old one.
+
+    Queries can declare the Arrow types of their cached columns (a schema),
+    which every write casts the frames to, e.g. timestamps to
+    timestamp[ns, UTC] and repetitive strings to dictionaries. Readers then
+    get datetime64 and categorical columns without converting them.
+
+    Frames larger than CACHE_CHUNK_BYTES are split into chunks of rows. The key
+    then only holds a manifest (columns, version, CHUNKS_FIELD and metadata) and
+    the column blobs of chunk i live in the hash "<key>:<version>:<i>". Readers
+    download and decode such frames one chunk at a time.
+
+    A query job fetching a (func, repo) pair holds a lease on it for at most
+    CACHE_LEASE_TTL seconds. Searches for repos that are being fetched attach
+    to the job holding the lease instead of fetching them a second time.
+
     Attributes
     ----------
         _redis : (private) Redis object
 
+        _lease_ttl : (private) seconds a lease is held without being renewed
+
+        _max_bytes : (private) byte budget of the cache
+
+        _eviction_policy : (private) "lru" or "lfu"
+
+        _codec : (private) name of codec column blobs are written with
+
+        _ipc_options : (private) pa.ipc.IpcWriteOptions applying '_codec'
+
+        _chunk_bytes : (private) size above which frames are chunked
+
+        _stream_buffer_bytes : (private) bytes a streamed write buffers at most
+
     Methods
     -------
         _get_hash(func, repo) (private) :
@@ -20,17 +219,28 @@ class CacheManager:
             function and the list of repos that the function is being run with.
 
         set(func, repo, data) :
-            Sets data at key hash(func, repo).
+            Sets DataFrame data at key hash(func, repo).
 
-        setm(func, [repo], [data]) :
-            Sets [data] at keys [hash(func, repo)] of [repo]
+        setm(func, [repo], [data], [watermark], schema) :
+            Sets [DataFrame data] at keys [hash(func, repo)] of [repo]
 
-        get(func, repo):
-            Returns data at key hash(func, repo), None if Nil.
+        stream(func, [repo], previous, schema) :
+            Returns a writer that caches per-repo results batch by batch while they're fetched.
 
-        getm(func, [repo]):
-            Returns data at keys [hash(func, repo)], None if Nil.
-            Uses r.mget([keys])
+        mergem(func, [repo], [delta], [watermark], keys, sort_by, schema) :
+            Merges new and changed rows into the cached DataFrames of [repo].
+
+        watermarks(func, [repo]) :
+            Returns the high-water marks the cached DataFrames were fetched up to.
+
+        stalem(func, [repo], max_age) :
+            Returns the cached repos fetched more than max_age seconds ago.
+
+        get(func, repo, columns):
+            Returns [{column: blob}] per chunk at key hash(func, repo), None if Nil.
+
+        getm(func, [repo], columns):
+            Returns [[{column: blob}]] per chunk at keys [hash(func, repo)], None if Nil.
 
         exists(func, repo):
             Returns number of names that exist.
@@ -38,24 +248,80 @@ class CacheManager:
         existsm(func, [repo]):
             Returns number of names that exist.
 
+        missingm(func, [repo]):
+            Returns the repos whose keys don't exist, in one round trip.
+
+        claimm(func, [repo], job_id):
+            Leases the (func, repo) pairs to a job, returns the job that holds each lease.
+
+        renewm(func, [repo], job_id):
+            Extends the leases a job holds.
+
+        releasem(func, [repo], job_id):
+            Releases the leases a job holds.
+
+        grabm(func, [repo], columns):
+            Returns aggregate DataFrame of the requested columns if all available.
+
+        wait_for(func, [repo], timeout, columns):
+            Blocks until grabm can return data, woken by the notifications setm publishes.
+
+        touchm(func, [repo]):
+            Marks keys as recently used so they survive eviction and expiry for a grace period.
+
+        metadata(func, repo):
+            Returns size, codec, fetch time, hit count, last access and TTL of a key.
+
     """
 
     def __init__(self, decode_value=False):
-        # Redis cache for job queue and results cache
-        self._redis = redis.StrictRedis(
-            # openshift, compose will reconcile the 'redis' naming via the dns
-            host=os.getenv("REDIS_SERVICE_HOST", "redis-cache"),
-            port=os.getenv("REDIS_SERVICE_PORT", "6379"),
-            password=os.getenv("REDIS_PASSWORD", ""),
-            decode_responses=decode_value,
+        # Redis cache for job queue and results cache,
+        # connections come from the process-wide pool.
+        self._redis = cache_client(decode_responses=decode_value)
+
+        self._max_bytes = int(os.getenv("CACHE_MAX_BYTES", "0"))
+        self._eviction_policy = os.getenv("CACHE_EVICTION_POLICY", "lru").lower()
+        self._chunk_bytes = int(os.getenv("CACHE_CHUNK_BYTES", str(DEFAULT_CHUNK_BYTES)))
+        self._stream_buffer_bytes = int(os.getenv("CACHE_STREAM_BUFFER_BYTES", str(DEFAULT_STREAM_BUFFER_BYTES)))
+        self._lease_ttl = int(os.getenv("CACHE_LEASE_TTL", str(DEFAULT_LEASE_TTL)))
+
+        level = os.getenv("CACHE_CODEC_LEVEL")
+        self.set_codec(
+            codec=os.getenv("CACHE_CODEC", "none").lower(),
+            level=int(level) if level else None,
         )
 
+    def set_codec(self, codec, level=None):
+        """Sets the compression codec that column blobs are written with.
+
+        Falls back to "none" if the codec is unknown or not built into pyarrow.
+
+        Args:
+            codec (str): one of CODECS
+            level (int | None): compression level, codec default if None.
+        """
+        if codec not in CODECS or (codec != "none" and not pa.Codec.is_available(codec)):
+            logging.error(f"CACHE: CODEC {codec} UNAVAILABLE, WRITING UNCOMPRESSED")
+            codec = "none"
+
+        if codec == "none":
+            self._codec = codec
+            self._ipc_options = pa.ipc.IpcWriteOptions()
+        else:
+            self._codec = codec if level is None else f"{codec}:{level}"
+            self._ipc_options = pa.ipc.IpcWriteOptions(compression=pa.Codec(codec, compression_level=level))
+
     def _get_hash(self, func, repo):
         """
         (private)
         Creates an MD5-hash based on the string-bytes
-        of the passed function and the list of repos that
-        the function is going to be run on.
+        of the passed function, its fingerprint and the list
+        of repos that the function is going to be run on.
+
+        Because of the fingerprint, results of a query are
+        refetched once the code of its module or of the helpers
+        it imports changes, or its QUERY_VERSION is bumped. Stale
+        results are left to expire or be evicted.
 
         Hash is used as a key by which the status of and results from the
         worker are accessed from the Queue.
@@ -78,87 +344,472 @@ class CacheManager:
         # use the called function's name
         hashfunc.update(bytes(func.__name__, "utf-8"))
 
+        # and the version of its code
+        hashfunc.update(bytes(_query_fingerprint(func), "utf-8"))
+
         # and the repo list we're passing to it
         hashfunc.update(bytes(str(repo), "utf-8"))
+
+        # and the storage layout the value is written in
+        hashfunc.update(bytes(LAYOUT_VERSION, "utf-8"))
+
         # grab the hex hash that's been generated.
         h = hashfunc.hexdigest()
 
         return h
 
-    def set(self, func, repo, data):
+    def _get_ttl(self, func):
+        """
+        (private)
+        Time-to-live of results of a query function.
+
+        Args:
+            func (function): Query function used
+
+        Returns:
+            int: seconds, 0 if results don't expire.
+        """
+        default = os.getenv("CACHE_TTL", str(DEFAULT_TTL))
+        return int(os.getenv(f"CACHE_TTL_{func.__name__.upper()}", default))
+
+    def _serialize_chunks(self, df, schema=None):
+        """
+        (private)
+        Converts a DataFrame to Arrow and splits it into chunks of
+        at most '_chunk_bytes', each serialized per column.
+
+        Args:
+            df (pd.DataFrame | pa.Table): frame to serialize. Index is discarded.
+            schema (dict{str: pa.DataType} | None): declared column types, see '_conform'.
+
+        Returns:
+            list[str]: column names
+            list[dict{str: bytes}]: per chunk, column blobs. A single chunk if small enough.
+        """
+        table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+        if schema is not None:
+            table = _conform(table, schema)
+
+        n = 1
+        if self._chunk_bytes > 0:
+            n = max(1, math.ceil(table.nbytes / self._chunk_bytes))
+
+        if n == 1:
+            slices = [table]
+        else:
+            rows = math.ceil(table.num_rows / n)
+            slices = [table.slice(offset, rows) for offset in range(0, table.num_rows, rows)]
+
+        return table.column_names, [self._serialize_columns(t) for t in slices]
+
+    def _serialize_columns(self, table):
+        """
+        (private)
+        Splits an Arrow table into one Arrow IPC stream per column.
+
+        Args:
+            table (pa.Table): table to serialize.
+
+        Returns:
+            dict{str: bytes}: column name to single-column IPC stream.
+        """
+        fields = {}
+        for name, column in zip(table.column_names, table.columns):
+            fields[name] = _table_to_ipc(pa.table([column], names=[name]), self._ipc_options)
+
+        return fields
+
+    def _deserialize_columns(self, blobs):
+        """
+        (private)
+        Rebuilds an Arrow table from per-column IPC streams.
+
+        Args:
+            blobs (dict{str: bytes}): column name to single-column IPC stream.
+
+        Returns:
+            pa.Table: columns in the order of 'blobs'.
+        """
+        names = list(blobs.keys())
+        columns = [_ipc_to_table(blobs[n]).column(0) for n in names]
+        return pa.table(columns, names=names)
+
+    def _chunk_keys(self, h, version, n_chunks):
+        """
+        (private)
+        Names of the hashes holding the chunks of a version of a key.
+
+        Args:
+            h (str): key
+            version (str | None): version of the value
+            n_chunks (int): number of chunks, 0 if the value isn't chunked.
+
+        Returns:
+            list[str]: chunk keys, in row order.
+        """
+        return [f"{h}:{version}:{i}" for i in range(n_chunks)]
+
+    def _manifests(self, hs):
+        """
+        (private)
+        Version and number of chunks of keys, in one round trip.
+
+        Args:
+            hs (list[str]): keys
+
+        Returns:
+            list[(str | None, int)]: version (None if key doesn't exist) and number of chunks.
+        """
+        pipe = self._redis.pipeline(transaction=False)
+        for h in hs:
+            pipe.hmget(h, [VERSION_FIELD, CHUNKS_FIELD])
+
+        return [(_to_str(v), int(n or 0)) for v, n in pipe.execute()]
+
+    def _heads(self, hs):
+        """
+        (private)
+        Version, column names and number of chunks of keys, in one round trip.
+
+        Args:
+            hs (list[str]): keys
+
+        Returns:
+            list[(str, list[str], int) | None]: per key, None if it doesn't exist.
+        """
+        pipe = self._redis.pipeline(transaction=False)
+        for h in hs:
+            pipe.hmget(h, [VERSION_FIELD, COLUMNS_FIELD, CHUNKS_FIELD])
+
+        heads = []
+        for version, names, n_chunks in pipe.execute():
+            if names is None:
+                heads.append(None)
+            else:
+                heads.append((_to_str(version), json.loads(names), int(n_chunks or 0)))
+        return heads
+
+    def set(self, func, repo, data, schema=None):
         """Sets redis value as data at name=hash(func, repo)
 
         Args:
             func (function): Query function used
             repo (int): repo_id of repo
-            data (list(dict)): rows of data in dictionary format.
+            data (pd.DataFrame): rows of data for the repo.
+            schema (dict{str: pa.DataType} | None): declared column types.
 
         Returns:
             boolean: confirmation of successful set operation.
         """
 
-        # set redis value at 'name=hash' to 'data'
-        ack = self._redis.set(name=self._get_hash(func=func, repo=repo), value=data)
-
-        return ack
+        return self.setm(func=func, repos=[repo], datas=[data], schema=schema)
 
-    def setm(self, func, repos, datas):
+    def setm(self, func, repos, datas, watermarks=None, schema=None):
         """Sets many redis value as data at name=hash(func, repo)
 
+        Each frame is written as a hash of per-column blobs, or as a
+        manifest and chunk hashes if it's large. The previous value of a
+        key (including its chunks) is replaced atomically so readers never
+        see a mix of old and new columns. Keys get the query's TTL and the
+        cache is trimmed to its byte budget afterwards.
+
+        Once written, the keys are published on READY_CHANNEL to wake
+        callbacks blocked in 'wait_for'.
+
         Args:
             func (function): Query function used
             repo (list[int]): list of repo_ids of repos
-            data (list[list(dict)]): list of rows of data in dictionary format.
+            data (list[pd.DataFrame | pa.Table]): list of per-repo DataFrames, e.g. from 'partition_by_repo'.
+            watermarks (list[str | None] | None): per repo, high-water mark of the rows in data.
+            schema (dict{str: pa.DataType} | None): declared column types the frames are cast to.
+                Raises ValueError if a frame lacks a declared column.
 
         Returns:
-            list[boolean]: confirmations of successful set operations.
+            boolean: confirmation of successful set operations.
         """
+        if watermarks is None:
+            watermarks = [None] * len(repos)
 
         # create hashes for each (func, repo_id) pair
         hs = [self._get_hash(func, r) for r in repos]
-        ds = datas
 
-        # bulk-set keys to values in Redis
-        acks = self._redis.mset(dict(zip(hs, ds)))
+        values = []
+        for df, watermark in zip(datas, watermarks):
+            names, chunks = self._serialize_chunks(df, schema)
+            values.append({"names": names, "version": uuid.uuid4().hex, "chunks": chunks, "watermark": watermark})
 
-        # from redis docs: "(Return is) always OK since MSET can't fail."
-        return acks
+        self._commit(func, hs, values)
 
-    def get(self, func, repo):
-        """Get redis value as data at name=hash(func, repo)
+        # MULTI/EXEC raises on failure, so reaching here means all keys were set.
+        return True
+
+    def _commit(self, func, hs, values):
+        """
+        (private)
+        Atomically replaces the values of keys, publishes them on
+        READY_CHANNEL and trims the cache to its byte budget.
 
         Args:
             func (function): Query function used
-            repo (int): list of repo_id of repo
+            hs (list[str]): keys
+            values (list[dict]): per key, "names" (column names), "version",
+                "chunks" (column blobs per chunk still to be written), "watermark"
+                and optionally "written"/"written_bytes" (chunks of "version"
+                that are already in Redis, and their size).
+        """
+        now = time.time()
+        ttl = self._get_ttl(func)
+
+        # chunk layout of the values being replaced
+        previous = self._manifests(hs)
+
+        # replace each key's columns in a single MULTI/EXEC round trip
+        register_size = self._redis.register_script(_REGISTER_SIZE)
+        pipe = self._redis.pipeline(transaction=True)
+        for h, value, (prev_version, prev_chunks) in zip(hs, values, previous):
+            version, chunks = value["version"], value["chunks"]
+            written = value.get("written", 0)
+            n_chunks = written + len(chunks)
+            size = value.get("written_bytes", 0) + sum(len(b) for chunk in chunks for b in chunk.values())
+
+            manifest = {
+                COLUMNS_FIELD: json.dumps(value["names"]),
+                CODEC_FIELD: self._codec,
+                SIZE_FIELD: size,
+                FETCHED_AT_FIELD: now,
+                VERSION_FIELD: version,
+                CHUNKS_FIELD: 0,
+            }
+            if value["watermark"] is not None:
+                manifest[WATERMARK_FIELD] = value["watermark"]
+
+            pipe.delete(h, *self._chunk_keys(h, prev_version, prev_chunks))
+
+            if n_chunks == 1 and not written:
+                manifest.update(chunks[0])
+            else:
+                manifest[CHUNKS_FIELD] = n_chunks
+                keys = self._chunk_keys(h, version, n_chunks)
+                for k, fields in zip(keys[written:], chunks):
+                    pipe.hset(k, mapping=fields)
+
+                # chunks written ahead carry a provisional expiry
+                for k in keys:
+                    if ttl > 0:
+                        pipe.expire(k, ttl)
+                    else:
+                        pipe.persist(k)
+
+            pipe.hset(h, mapping=manifest)
+            if ttl > 0:
+                pipe.expire(h, ttl)
+
+            # register key with the eviction indexes. Hit counts survive a
+            # refetch so popular repos keep their standing.
+            register_size(keys=[SIZES_INDEX, TOTAL_BYTES], args=[h, size], client=pipe)
+            pipe.zadd(ACCESS_INDEX, {h: now})
+            pipe.zincrby(HITS_INDEX, 0, h)
+
+        # part of the transaction, so it's only sent once the data is readable.
+        pipe.publish(READY_CHANNEL, json.dumps(hs))
+        pipe.execute()
+
+        self._enforce_budget()
+
+    def stream(self, func, repos, previous=None, schema=None):
+        """Writer that caches results of 'repos' while they're being fetched.
+
+        Batches passed to its 'write' are split per repo and buffered; full
+        chunks are flushed to Redis right away so the buffered rows stay
+        bounded. 'close' commits all repos atomically, like 'setm'. Until
+        then readers see the previous values.
+
+        Usage:
+            with cm.stream(func, repos) as stream:
+                for batch in dbm.stream_query(query_string):
+                    stream.write(batch)
+                ack = stream.close()
+
+        Args:
+            func (function): Query function used
+            repo (list[int]): list of repo_ids of repos
+            previous (list[str | None] | None): watermarks of the repos before this write.
+            schema (dict{str: pa.DataType} | None): declared column types the batches are cast to.
 
         Returns:
-            boolean: confirmation of successful set operation.
+            _CacheStream: writer
+        """
+        return _CacheStream(self, func, repos, previous, schema)
+
+    def mergem(self, func, repos, deltas, watermarks, keys=None, sort_by=None, schema=None):
+        """Merges rows fetched since the cached watermarks into the cached frames.
+
+        Rows of a delta replace cached rows with the same 'keys', the rest
+        are appended. Repos whose delta is empty are only marked as fetched.
+        Repos that have left the cache in the meantime are skipped; they're
+        fetched in full the next time they're requested.
+
+        Args:
+            func (function): Query function used
+            repo (list[int]): list of repo_ids of repos
+            deltas (list[pd.DataFrame | pa.Table]): per repo, new and changed rows.
+            watermarks (list[str | None]): per repo, high-water mark after merging.
+            keys (list[str] | None): columns identifying a row, all columns if None.
+            sort_by (str | list[str] | None): columns the merged frames are sorted by.
+            schema (dict{str: pa.DataType} | None): declared column types the merged frames are cast to.
+
+        Returns:
+            boolean: confirmation of successful merge operations.
+        """
+        now = time.time()
+        changed = [(r, d, w) for r, d, w in zip(repos, deltas, watermarks) if len(d) > 0]
+        unchanged = [(r, w) for r, d, w in zip(repos, deltas, watermarks) if len(d) == 0]
+
+        # nothing new- only record that the repos are fresh. Keys that
+        # are gone by now mustn't be recreated with only these fields.
+        hs = [self._get_hash(func, r) for r, _ in unchanged]
+        pipe = self._redis.pipeline(transaction=False)
+        for h, (_, w), (version, _) in zip(hs, unchanged, self._manifests(hs)):
+            if version is None:
+                continue
+            pipe.hset(h, FETCHED_AT_FIELD, now)
+            if w is not None:
+                pipe.hset(h, WATERMARK_FIELD, w)
+        pipe.execute()
+
+        if not changed:
+            return True
+
+        merge_repos, merged, merged_watermarks = [], [], []
+        cached = self.getm(func, [r for r, _, _ in changed])
+        for (r, delta, w), blobs in zip(changed, cached):
+            if blobs is None:
+                logging.warning(f"CACHE: {func.__name__} {r} LEFT THE CACHE BEFORE MERGE, SKIPPED")
+                continue
+
+            if isinstance(delta, pa.Table):
+                delta = delta.to_pandas()
+
+            df = pd.concat([self._assemble([blobs]), delta], ignore_index=True)
+            df = df.drop_duplicates(subset=keys, keep="last", ignore_index=True)
+            if sort_by is not None:
+                df = df.sort_values(by=sort_by, ignore_index=True)
+
+            merge_repos.append(r)
+            merged.append(df)
+            merged_watermarks.append(w)
+
+        if not merge_repos:
+            return True
+
+        return self.setm(func=func, repos=merge_repos, datas=merged, watermarks=merged_watermarks, schema=schema)
+
+    def watermarks(self, func, repos):
+        """High-water marks the cached frames were fetched up to.
+
+        Args:
+            func (function): Query function used
+            repo (list[int]): list of repo_ids of repos
+
+        Returns:
+            list[str | None]: per repo, None if not cached or fetched without one.
+        """
+        pipe = self._redis.pipeline(transaction=False)
+        for r in repos:
+            pipe.hget(self._get_hash(func, r), WATERMARK_FIELD)
+
+        return [_to_str(w) for w in pipe.execute()]
+
+    def versions(self, func, repos):
+        """Versions of the cached frames. A frame gets a new version whenever it's written.
+
+        Lets callers keep results derived from cached frames until one of them changes.
+
+        Args:
+            func (function): Query function used
+            repo (list[int]): list of repo_ids of repos
+
+        Returns:
+            list[str | None]: per repo, None if not cached.
+        """
+        return [version for version, _ in self._manifests([self._get_hash(func, r) for r in repos])]
+
+    def stalem(self, func, repos, max_age):
+        """Finds the cached repos that were fetched more than max_age seconds ago.
+
+        Args:
+            func (function): Query function used
+            repo (list[int]): list of repo_ids of repos
+            max_age (float): seconds
+
+        Returns:
+            list[int]: stale repos. Repos that aren't cached aren't included.
         """
+        pipe = self._redis.pipeline(transaction=False)
+        for r in repos:
+            pipe.hget(self._get_hash(func, r), FETCHED_AT_FIELD)
+
+        cutoff = time.time() - max_age
+        return [r for r, t in zip(repos, pipe.execute()) if t is not None and float(t) < cutoff]
 
-        # get redis value at "name=hash"
-        r = self._redis.get(name=self._get_hash(func, repo))
+    def get(self, func, repo, columns=None):
+        """Get redis value as data at name=hash(func, repo)
 
-        return r
+        Args:
+            func (function): Query function used
+            repo (int): repo_id of repo
+            columns (list[str] | None): columns to fetch, all if None.
 
-    def getm(self, func, repos):
+        Returns:
+            list[dict{str: bytes}] | None: per chunk, column blobs. None if key doesn't exist.
+        """
+
+        return self.getm(func=func, repos=[repo], columns=columns)[0]
+
+    def getm(self, func, repos, columns=None):
         """Gets many redis value as data at name=hash(func, repo)
 
+        Only the requested columns are sent by Redis. Reads the manifests
+        in one round trip and the column blobs of all keys in another.
+
         Args:
             func (function): Query function used
             repo (list[int]): list of repo_ids of repos
+            columns (list[str] | None): columns to fetch, all if None.
 
         Returns:
-            (list[list(dict)]): list of rows of data in dictionary format.
+            list[list[dict{str: bytes}] | None]: for each repo, column blobs per chunk, in column order.
         """
 
         # create hashes for each (func, repo_id) pair
         hs = [self._get_hash(func, r) for r in repos]
 
-        # bulk-get values from keys in Redis
-        rs = self._redis.mget(hs)
+        heads = self._heads(hs)
+
+        # bulk-get fields of keys and their chunks in Redis in one round trip
+        pipe = self._redis.pipeline(transaction=False)
+        for h, head in zip(hs, heads):
+            if head is None:
+                continue
+            version, names, n_chunks = head
+            wanted = _check_columns(h, names, columns)
+            for k in self._chunk_keys(h, version, n_chunks) or [h]:
+                pipe.hmget(k, wanted)
+        rs = iter(pipe.execute())
+
+        out = []
+        for h, head in zip(hs, heads):
+            # key doesn't exist
+            if head is None:
+                out.append(None)
+                continue
+
+            version, names, n_chunks = head
+            wanted = _check_columns(h, names, columns)
+            out.append([dict(zip(wanted, next(rs))) for _ in range(max(n_chunks, 1))])
 
         # return results
-        return rs
+        return out
 
     def exists(self, func, repo):
         """Checks whether key is in Redis for hash(func, repo)
@@ -197,33 +848,958 @@ class CacheManager:
         # return results
         return n
 
-    def grabm(self, func, repos):
-        """Checks to see if data is ready using 'existsm'
-        and builds aggregate DataFrame to return to callback.
+    def missingm(self, func, repos):
+        """Finds the repos that aren't in Redis for hash(func, repo)
+
+        Args:
+            func (function): Query function used
+            repo (list[int]): list of repo_ids of repos
+
+        Returns:
+            list[int]: repos whose keys don't exist
+        """
+
+        # one pipelined EXISTS per key instead of a round trip each
+        pipe = self._redis.pipeline(transaction=False)
+        for r in repos:
+            pipe.exists(self._get_hash(func, r))
+        found = pipe.execute()
+
+        return [r for r, n in zip(repos, found) if not n]
+
+    def claimm(self, func, repos, job_id):
+        """Leases (func, repo) pairs to a job that's about to fetch them,
+        unless another job already holds their lease.
+
+        Args:
+            func (function): Query function used
+            repo (list[int]): list of repo_ids of repos
+            job_id (str): id of the job
+
+        Returns:
+            list[str]: per repo, the id of the job holding its lease- job_id if it was claimed.
+        """
+        keys = [LEASE_PREFIX + self._get_hash(func, r) for r in repos]
+        owners = [None] * len(keys)
+
+        # a lease can expire between a failed claim and reading its owner,
+        # then it's claimed again.
+        pending = list(range(len(keys)))
+        while pending:
+            pipe = self._redis.pipeline(transaction=False)
+            for i in pending:
+                pipe.set(keys[i], job_id, nx=True, ex=self._lease_ttl)
+            claimed = pipe.execute()
+
+            pipe = self._redis.pipeline(transaction=False)
+            held = [i for i, c in zip(pending, claimed) if not c]
+            for i in held:
+                pipe.get(keys[i])
+            for i, c in zip(pending, claimed):
+                if c:
+                    owners[i] = job_id
+
+            pending = []
+            for i, owner in zip(held, pipe.execute()):
+                if owner is None:
+                    pending.append(i)
+                else:
+                    owners[i] = _to_str(owner)
+
+        return owners
+
+    def renewm(self, func, repos, job_id):
+        """Extends the leases job_id holds on (func, repo) pairs to CACHE_LEASE_TTL seconds.
+
+        Args:
+            func (function): Query function used
+            repo (list[int]): list of repo_ids of repos
+            job_id (str): id of the job
+        """
+        self._run_lease_script(_RENEW_LEASE, func, repos, job_id, self._lease_ttl)
+
+    def releasem(self, func, repos, job_id):
+        """Releases the leases job_id holds on (func, repo) pairs.
+
+        Args:
+            func (function): Query function used
+            repo (list[int]): list of repo_ids of repos
+            job_id (str): id of the job
+        """
+        self._run_lease_script(_RELEASE_LEASE, func, repos, job_id)
+
+    def _run_lease_script(self, script, func, repos, job_id, *args):
+        """
+        (private)
+        Runs an owner-checked lease operation on the lease of every (func, repo) pair.
+        """
+        if not repos:
+            return
+
+        op = self._redis.register_script(script)
+        pipe = self._redis.pipeline(transaction=False)
+        for r in repos:
+            op(keys=[LEASE_PREFIX + self._get_hash(func, r)], args=[job_id, *args], client=pipe)
+        pipe.execute()
+
+    def grabm(self, func, repos, columns=None):
+        """Checks to see if data is ready and builds aggregate
+        DataFrame to return to callback.
+
+        Columns already decoded by this process for the current version
+        of a key are taken from the in-process cache, only the rest is
+        downloaded from Redis. Chunked keys are downloaded and decoded one
+        chunk at a time so only one chunk's blobs are held at once.
 
         Args:
             func (function): Query function used
             repo (list[int]): list of repo_ids of repos
+            columns (list[str] | None): columns to fetch and decode, all if None.
 
         Returns:
             pd.DataFrame | None: Data if all available.
         """
 
-        num_repos = len(repos)
-        ready = self.existsm(func=func, repos=repos) == num_repos
-        if not ready:
+        # create hashes for each (func, repo_id) pair
+        hs = [self._get_hash(func, r) for r in repos]
+
+        for _ in range(GRAB_RETRIES):
+            # readiness, version, column names and chunks of every key in one round trip
+            heads = self._heads(hs)
+
+            if any(head is None for head in heads):
+                return None
+
+            versions = [v for v, _, _ in heads]
+            chunks = [n for _, _, n in heads]
+            wanted = [_check_columns(h, names, columns) for h, (_, names, _) in zip(hs, heads)]
+
+            decoded = [{c: _L1.get(h, v, c) for c in cs} for h, v, cs in zip(hs, versions, wanted)]
+            missing = [[c for c, col in d.items() if col is None] for d in decoded]
+
+            # download the columns of unchunked keys this process hasn't decoded yet
+            pipe = self._redis.pipeline(transaction=False)
+            for h, m, n in zip(hs, missing, chunks):
+                if m and not n:
+                    pipe.hmget(h, [VERSION_FIELD] + m)
+            fetched = iter(pipe.execute())
+
+            consistent = True
+            for h, v, m, n, d in zip(hs, versions, missing, chunks, decoded):
+                if not m:
+                    continue
+
+                if n:
+                    cols = self._read_chunks(h, v, n, m)
+                else:
+                    r = next(fetched)
+                    cols = None
+                    if _to_str(r[0]) == v:
+                        cols = {c: _ipc_to_table(blob).column(0) for c, blob in zip(m, r[1:])}
+
+                # key was rewritten or removed since its version was read
+                if cols is None:
+                    consistent = False
+                    continue
+
+                for c, col in cols.items():
+                    d[c] = col
+                    _L1.put(h, v, c, col)
+
+            if consistent:
+                break
+        else:
+            return None
+
+        self._record_hits(func=func, repos=repos)
+
+        tables = [pa.table(list(d.values()), names=list(d.keys())) for d in decoded]
+        return self._to_frame(tables)
+
+    def _read_chunks(self, h, version, n_chunks, columns):
+        """
+        (private)
+        Downloads and decodes columns of a chunked key, one chunk at a time.
+
+        Args:
+            h (str): key
+            version (str): version of the value
+            n_chunks (int): number of chunks
+            columns (list[str]): columns to read
+
+        Returns:
+            dict{str: pa.ChunkedArray} | None: columns, None if a chunk is gone (value was rewritten or evicted).
+        """
+        parts = {c: [] for c in columns}
+        for k in self._chunk_keys(h, version, n_chunks):
+            blobs = self._redis.hmget(k, columns)
+            if any(blob is None for blob in blobs):
+                return None
+
+            for c, blob in zip(columns, blobs):
+                parts[c].append(_ipc_to_table(blob))
+
+        # chunks of streamed writes may have been typed differently (e.g. all-null columns)
+        return {c: _concat_tables(parts[c]).column(0) for c in columns}
+
+    def wait_for(self, func, repos, timeout=None, columns=None):
+        """Blocks until data for all repos is cached, then returns it like 'grabm'.
+
+        Instead of polling, waits on READY_CHANNEL and only re-checks the
+        cache when a query task publishes one of the awaited keys.
+
+        Args:
+            func (function): Query function used
+            repo (list[int]): list of repo_ids of repos
+            timeout (float | None): seconds to wait at most, forever if None.
+            columns (list[str] | None): columns to fetch and decode, all if None.
+
+        Returns:
+            pd.DataFrame | None: Data, None if it didn't become available within 'timeout'.
+        """
+        hs = {self._get_hash(func, r) for r in repos}
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+
+        # subscribe before the first check so that a write landing
+        # between the check and the wait can't be missed.
+        pubsub.subscribe(READY_CHANNEL)
+        try:
+            while True:
+                df = self.grabm(func=func, repos=repos, columns=columns)
+                if df is not None:
+                    return df
+
+                # wait until one of our keys is written, then check again
+                while True:
+                    wait = WAIT_RECHECK
+                    if deadline is not None:
+                        wait = min(wait, deadline - time.monotonic())
+                        if wait <= 0:
+                            return None
+
+                    msg = pubsub.get_message(timeout=wait)
+                    if msg is None or hs.intersection(json.loads(msg["data"])):
+                        break
+        finally:
+            pubsub.close()
+
+    def touchm(self, func, repos):
+        """Marks keys as recently used. They won't be evicted, and
+        won't expire, for at least EVICTION_GRACE seconds.
+
+        Args:
+            func (function): Query function used
+            repo (list[int]): list of repo_ids of repos
+        """
+        hs = [self._get_hash(func, r) for r in repos]
+        now = time.time()
+
+        pipe = self._redis.pipeline(transaction=False)
+        for h in hs:
+            pipe.zadd(ACCESS_INDEX, {h: now}, xx=True)
+            pipe.ttl(h)
+            pipe.hmget(h, [VERSION_FIELD, CHUNKS_FIELD])
+        rs = pipe.execute()
+
+        # push back expiry of keys that are about to expire, chunks included
+        pipe = self._redis.pipeline(transaction=False)
+        for h, ttl, (version, n_chunks) in zip(hs, rs[1::3], rs[2::3]):
+            if 0 <= ttl < EVICTION_GRACE:
+                for k in [h] + self._chunk_keys(h, _to_str(version), int(n_chunks or 0)):
+                    pipe.expire(k, EVICTION_GRACE)
+        pipe.execute()
+
+    def metadata(self, func, repo):
+        """Eviction metadata of the key for (func, repo).
+
+        Args:
+            func (function): Query function used
+            repo (int): repo_id of repo
+
+        Returns:
+            dict | None: size, codec, chunks, fetched_at, hits, last_access, ttl; None if key doesn't exist.
+        """
+        h = self._get_hash(func, repo)
+
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.hmget(h, [SIZE_FIELD, CODEC_FIELD, CHUNKS_FIELD, FETCHED_AT_FIELD])
+        pipe.zscore(HITS_INDEX, h)
+        pipe.zscore(ACCESS_INDEX, h)
+        pipe.ttl(h)
+        (size, codec, n_chunks, fetched_at), hits, last_access, ttl = pipe.execute()
+
+        if size is None:
             return None
 
-        # get all results from cache
-        dfs_from_cache = self.getm(func=func, repos=repos)
+        return {
+            "size": int(size),
+            # keys written before codecs were introduced are uncompressed
+            "codec": _to_str(codec) if codec else "none",
+            "chunks": int(n_chunks or 0),
+            "fetched_at": float(fetched_at),
+            "hits": int(hits or 0),
+            "last_access": last_access,
+            "ttl": ttl,
+        }
+
+    def _record_hits(self, func, repos):
+        """
+        (private)
+        Updates last access time and hit count of keys that were read.
+
+        Args:
+            func (function): Query function used
+            repo (list[int]): list of repo_ids of repos
+        """
+        hs = [self._get_hash(func, r) for r in repos]
+        now = time.time()
+
+        pipe = self._redis.pipeline(transaction=False)
+        for h in hs:
+            pipe.zadd(ACCESS_INDEX, {h: now}, xx=True)
+            pipe.zincrby(HITS_INDEX, 1, h)
+        pipe.execute()
+
+    def _enforce_budget(self):
+        """
+        (private)
+        Evicts keys until the cached results fit into the byte budget.
+
+        Keys are evicted in order of last access (lru) or of hit count,
+        ties broken by last access (lfu). Keys used in the last EVICTION_GRACE
+        seconds are kept even if the budget is exceeded.
+
+        The total size is read from TOTAL_BYTES, so a write within the budget
+        costs a bounded number of commands however many keys are cached.
+        Candidates are only looked at while the total is over budget, and a
+        write skips at most EVICTION_SCAN keys it can't evict.
+        """
+        if self._max_bytes <= 0:
+            return
+
+        # keys that have expired via their TTL are only forgotten, not evicted.
+        # The least recently used keys are the first to expire.
+        self._forget_expired([_to_str(k) for k in self._redis.zrange(ACCESS_INDEX, 0, EXPIRY_SAMPLE - 1)])
+
+        total = int(self._redis.get(TOTAL_BYTES) or 0)
+        if total <= self._max_bytes:
+            return
+
+        index = HITS_INDEX if self._eviction_policy == "lfu" else ACCESS_INDEX
+        grace_cutoff = time.time() - EVICTION_GRACE
+        evicted = 0
+        start = 0
+        while total > self._max_bytes and start < EVICTION_SCAN:
+            batch = [_to_str(k) for k in self._redis.zrange(index, start, start + EVICTION_BATCH - 1)]
+            if not batch:
+                break
+            start += len(batch)
+
+            pipe = self._redis.pipeline(transaction=False)
+            for k in batch:
+                pipe.exists(k)
+                pipe.hget(SIZES_INDEX, k)
+                pipe.zscore(ACCESS_INDEX, k)
+                pipe.zscore(HITS_INDEX, k)
+            rs = pipe.execute()
+            found = {k: r for k, r in zip(batch, zip(*[iter(rs)] * 4))}
+
+            expired = [k for k, (alive, _, _, _) in found.items() if not alive]
+            if expired:
+                total = self._forget(expired)
+                # forgotten keys leave the index, the ones after them move up.
+                start -= len(expired)
+
+            # hit counts tie often, those ties are broken by last access.
+            alive = [k for k in batch if found[k][0]]
+            if self._eviction_policy == "lfu":
+                alive.sort(key=lambda k: (found[k][3] or 0, found[k][2] or 0))
+
+            evict = []
+            for k in alive:
+                if total <= self._max_bytes:
+                    break
+                if (found[k][2] or 0) > grace_cutoff:
+                    continue
+                evict.append(k)
+                total -= int(found[k][1] or 0)
+
+            if evict:
+                chunk_keys = [k for h, (v, n) in zip(evict, self._manifests(evict)) for k in self._chunk_keys(h, v, n)]
+                self._redis.delete(*evict, *chunk_keys)
+                total = self._forget(evict)
+                start -= len(evict)
+                evicted += len(evict)
+
+            # in lru order every key after one in its grace period is in it too.
+            if self._eviction_policy != "lfu" and any((found[k][2] or 0) > grace_cutoff for k in alive):
+                break
+
+        if evicted:
+            logging.warning(f"CACHE: EVICTED {evicted} KEYS ({self._eviction_policy}), {total} BYTES REMAIN")
+
+    def _forget_expired(self, hs):
+        """
+        (private)
+        Forgets those of the keys that no longer exist.
+
+        Args:
+            hs (list[str]): keys to check
+        """
+        if not hs:
+            return
+
+        pipe = self._redis.pipeline(transaction=False)
+        for h in hs:
+            pipe.exists(h)
+        self._forget([h for h, alive in zip(hs, pipe.execute()) if not alive])
+
+    def _forget(self, hs):
+        """
+        (private)
+        Removes keys from the eviction indexes and their sizes from TOTAL_BYTES.
+
+        Args:
+            hs (list[str]): keys to forget
+
+        Returns:
+            int | None: total bytes of the keys still indexed, None if there was nothing to forget
+        """
+        if not hs:
+            return None
+
+        forget_sizes = self._redis.register_script(_FORGET_SIZES)
+        pipe = self._redis.pipeline(transaction=False)
+        forget_sizes(keys=[SIZES_INDEX, TOTAL_BYTES], args=hs, client=pipe)
+        pipe.zrem(ACCESS_INDEX, *hs)
+        pipe.zrem(HITS_INDEX, *hs)
+        return int(pipe.execute()[0])
+
+    def _assemble(self, blobs_from_cache):
+        """
+        (private)
+        Combines per-repo column blobs into a single DataFrame.
+
+        The per-repo Arrow tables are concatenated without copying their
+        buffers and converted to pandas once at the end, instead of building
+        and concatenating one DataFrame per repo.
+
+        Args:
+            blobs_from_cache (list[list[dict{str: bytes}]]): per-repo, per-chunk column blobs from 'getm'.
+
+        Returns:
+            pd.DataFrame: rows of all repos.
+        """
+        return self._to_frame([self._deserialize_columns(blobs) for chunks in blobs_from_cache for blobs in chunks])
+
+    def _to_frame(self, tables):
+        """
+        (private)
+        Concatenates per-repo Arrow tables and converts them to pandas once.
+
+        Args:
+            tables (list[pa.Table]): per-repo tables of the same query.
+
+        Returns:
+            pd.DataFrame: rows of all repos.
+        """
+        table = _concat_tables(tables)
+        del tables
+
+        # self_destruct releases each Arrow column as soon as it has been converted.
+        # Columns are deliberately consolidated into pandas-owned blocks: zero-copy
+        # (split_blocks) conversion yields read-only arrays, and visualizations
+        # modify the returned frame in place.
+        return table.to_pandas(self_destruct=True)
+
 
-        pd_dfs = []
-        for bdf in dfs_from_cache:
-            bbuff = io.BytesIO(bdf)
-            bbuff.seek(0)
-            df = pd.read_feather(bbuff)
-            pd_dfs.append(df)
+def _table_to_ipc(table, options=None):
+    """Writes an Arrow table as an IPC stream.
 
-        out_df = pd.concat(pd_dfs)
+    Args:
+        table (pa.Table): table to serialize
+        options (pa.ipc.IpcWriteOptions | None): e.g. body compression
 
-        return out_df
+    Returns:
+        bytes: IPC stream
+    """
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class _CacheStream:
+    """
+    (private)
+    Writes per-repo results to the cache while they're being fetched,
+    returned by 'CacheManager.stream'.
+
+    Rows are buffered per repo as Arrow tables. A repo's buffer is flushed
+    as a chunk once it reaches the chunk size, and the largest buffers are
+    flushed early if all of them together exceed the stream buffer size.
+    Flushed chunks belong to a new version of the key that only becomes
+    visible when 'close' commits it.
+    """
+
+    def __init__(self, cm, func, repos, previous=None, schema=None):
+        self._cm = cm
+        self._func = func
+        self._repos = list(repos)
+        self._previous = previous
+        self._declared = schema
+
+        self._hs = [cm._get_hash(func, r) for r in self._repos]
+        self._positions = {r: i for i, r in enumerate(self._repos)}
+        self._versions = [uuid.uuid4().hex for _ in self._repos]
+
+        self._schema = None
+        self._pieces = [[] for _ in self._repos]
+        self._buffered = [0] * len(self._repos)
+        self._written = [0] * len(self._repos)
+        self._written_bytes = [0] * len(self._repos)
+
+        # newest cached / oldest left-out mark per repo, one Series per batch
+        self._newest = []
+        self._oldest_left_out = []
+
+        self._done = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        elif not self._done:
+            self.close()
+        return False
+
+    def write(self, df, marks=None, left_out=None):
+        """Buffers a batch of rows of any of the repos.
+
+        Args:
+            df (pd.DataFrame): rows, with the repo in column "id".
+            marks (pd.Series | None): timestamp of each row to derive watermarks from, see 'high_water_marks'.
+            left_out (pd.Series[bool] | None): rows of df that aren't cached.
+        """
+        if marks is not None:
+            if left_out is None:
+                left_out = pd.Series(False, index=df.index)
+            self._newest.append(marks[~left_out].groupby(df["id"][~left_out]).max())
+            self._oldest_left_out.append(marks[left_out].groupby(df["id"][left_out]).min())
+
+        if left_out is not None:
+            df = df[~left_out]
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._declared is not None:
+            table = _conform(table, self._declared)
+        if self._schema is None:
+            self._schema = table.schema
+
+        touched = []
+        for r, rows in df.groupby("id", sort=False).indices.items():
+            i = self._positions.get(r)
+            if i is None:
+                continue
+            piece = table.take(rows)
+            self._pieces[i].append(piece)
+            self._buffered[i] += piece.nbytes
+            touched.append(i)
+
+        del table
+
+        chunk_bytes = self._cm._chunk_bytes
+        for i in touched:
+            if chunk_bytes > 0 and self._buffered[i] >= chunk_bytes:
+                self._flush(i)
+
+        max_buffer = self._cm._stream_buffer_bytes
+        while max_buffer > 0 and sum(self._buffered) > max_buffer:
+            self._flush(max(range(len(self._repos)), key=lambda i: self._buffered[i]))
+
+    def close(self):
+        """Commits the written rows of all repos atomically.
+
+        Returns:
+            boolean: confirmation of successful set operations.
+        """
+        if self._done:
+            return True
+
+        values = []
+        for i in range(len(self._repos)):
+            chunks = []
+            if self._pieces[i] or not self._written[i]:
+                chunks = [self._cm._serialize_columns(self._take_buffer(i))]
+
+            values.append(
+                {
+                    "names": (self._schema or pa.schema([])).names,
+                    "version": self._versions[i],
+                    "chunks": chunks,
+                    "written": self._written[i],
+                    "written_bytes": self._written_bytes[i],
+                    "watermark": None,
+                }
+            )
+
+        if self._newest:
+            newest = pd.concat(self._newest).groupby(level=0).max()
+            oldest_left_out = pd.concat(self._oldest_left_out).groupby(level=0).min()
+            for value, watermark in zip(values, _watermarks(self._repos, newest, oldest_left_out, self._previous)):
+                value["watermark"] = watermark
+
+        self._cm._commit(self._func, self._hs, values)
+        self._done = True
+        return True
+
+    def abort(self):
+        """Drops the chunks that have been flushed, the cached values stay as they were."""
+        self._done = True
+        keys = [
+            k
+            for h, version, n in zip(self._hs, self._versions, self._written)
+            for k in self._cm._chunk_keys(h, version, n)
+        ]
+        if keys:
+            self._cm._redis.delete(*keys)
+
+    def _take_buffer(self, i):
+        """Concatenates and empties the buffer of the repo at position i."""
+        pieces = self._pieces[i]
+        self._pieces[i] = []
+        self._buffered[i] = 0
+        if not pieces:
+            return (self._schema or pa.schema([])).empty_table()
+        return _concat_tables(pieces)
+
+    def _flush(self, i):
+        """Writes the buffer of the repo at position i to Redis as its next chunk."""
+        fields = self._cm._serialize_columns(self._take_buffer(i))
+        k = self._cm._chunk_keys(self._hs[i], self._versions[i], self._written[i] + 1)[-1]
+
+        pipe = self._cm._redis.pipeline(transaction=False)
+        pipe.hset(k, mapping=fields)
+        pipe.expire(k, STREAM_PENDING_TTL)
+        pipe.execute()
+
+        self._written[i] += 1
+        self._written_bytes[i] += sum(len(b) for b in fields.values())
+
+
+class _DecodedCache:
+    """
+    (private)
+    Per-process LRU cache of decoded Arrow columns.
+
+    Entries are keyed by (key, version, column) and evicted least recently
+    used first once their total size exceeds 'max_bytes'. Storing a column
+    for a new version of a key drops all columns of its older versions.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._entries_of_key = {}
+        self._version_of_key = {}
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, h, version, column):
+        """Returns the decoded column or None if it isn't cached."""
+        if version is None:
+            return None
+
+        with self._lock:
+            col = self._entries.get((h, version, column))
+            if col is not None:
+                self._entries.move_to_end((h, version, column))
+            return col
+
+    def put(self, h, version, column, col):
+        """Caches a decoded column of version 'version' of key 'h'."""
+        if version is None or self.max_bytes <= 0 or col.nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            # the key has been rewritten, older columns are stale
+            if self._version_of_key.get(h) != version:
+                for k in list(self._entries_of_key.get(h, ())):
+                    self._remove(k)
+                self._version_of_key[h] = version
+
+            k = (h, version, column)
+            if k in self._entries:
+                return
+
+            self._entries[k] = col
+            self._entries_of_key.setdefault(h, set()).add(k)
+            self._nbytes += col.nbytes
+
+            while self._nbytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, k):
+        col = self._entries.pop(k)
+        self._nbytes -= col.nbytes
+
+        keys = self._entries_of_key[k[0]]
+        keys.discard(k)
+        if not keys:
+            del self._entries_of_key[k[0]]
+            del self._version_of_key[k[0]]
+
+
+# decoded columns shared by all CacheManager objects of this process.
+_L1 = _DecodedCache(int(os.getenv("CACHE_L1_MAX_BYTES", str(DEFAULT_L1_MAX_BYTES))))
+
+
+def _to_str(v):
+    """Decodes Redis responses of clients created without 'decode_responses'."""
+    return v.decode("utf-8") if isinstance(v, bytes) else v
+
+
+def partition_by_repo(df, repos, drop_id=False):
+    """Splits a query's rows per repo in a single pass, for 'setm'.
+
+    The frame is converted to Arrow once and its rows are ordered by repo
+    with a stable sort, so every repo's rows are a contiguous, zero-copy
+    slice whose bounds are found by binary search. Rows keep their order
+    within a repo.
+
+    Args:
+        df (pd.DataFrame): rows of all repos, with the repo in column "id".
+        repos (list[int]): repos to split out, in the order of the result.
+        drop_id (bool): whether the "id" column is left out of the slices.
+
+    Returns:
+        list[pa.Table]: per repo, its rows. Empty for repos without rows.
+    """
+    ids = df["id"].to_numpy()
+    order = np.argsort(ids, kind="stable")
+    ids = ids[order]
+
+    table = pa.Table.from_pandas(df, preserve_index=False).take(order)
+    if drop_id:
+        table = table.remove_column(table.schema.get_field_index("id"))
+
+    starts = np.searchsorted(ids, repos, side="left")
+    ends = np.searchsorted(ids, repos, side="right")
+
+    return [table.slice(start, end - start) for start, end in zip(starts, ends)]
+
+
+def high_water_marks(ids, marks, repos, left_out=None, previous=None):
+    """Per-repo watermarks of fetched rows, for 'setm' and 'mergem'.
+
+    A repo's watermark is the newest mark among its rows. Repos without
+    rows keep their previous watermark or get the newest of the batch;
+    every row up to it has been seen. Rows that were fetched but aren't
+    cached (e.g. dated today) must be fetched again, so a watermark never
+    passes the oldest of them.
+
+    Args:
+        ids (pd.Series): repo_id of each row
+        marks (pd.Series): timestamp of each row (e.g. collection or update time)
+        repos (list[int]): repos that were fetched
+        left_out (pd.Series[bool] | None): rows that aren't cached
+        previous (list[str | None] | None): watermarks of a refresh's repos, kept if they have no new rows.
+
+    Returns:
+        list[str | None]: per repo, None if no rows have been fetched at all.
+    """
+    if left_out is None:
+        left_out = pd.Series(False, index=marks.index)
+
+    newest = marks[~left_out].groupby(ids[~left_out]).max()
+    oldest_left_out = marks[left_out].groupby(ids[left_out]).min()
+
+    return _watermarks(repos, newest, oldest_left_out, previous)
+
+
+def _watermarks(repos, newest, oldest_left_out, previous=None):
+    """Watermarks from the newest cached and oldest left-out mark of each repo, see 'high_water_marks'.
+
+    Args:
+        repos (list[int]): repos that were fetched
+        newest (pd.Series): repo_id to newest mark of its cached rows
+        oldest_left_out (pd.Series): repo_id to oldest mark of its left-out rows
+        previous (list[str | None] | None): previous watermarks of the repos
+
+    Returns:
+        list[str | None]: per repo
+    """
+    batch = newest.max()
+
+    out = []
+    for i, r in enumerate(repos):
+        mark = newest.get(r, pd.NaT)
+        if pd.isna(mark) and previous is not None and previous[i] is not None:
+            mark = pd.Timestamp(previous[i])
+        if pd.isna(mark):
+            mark = batch
+        if r in oldest_left_out.index and not pd.isna(oldest_left_out[r]):
+            mark = oldest_left_out[r] if pd.isna(mark) else min(mark, oldest_left_out[r])
+        out.append(None if pd.isna(mark) else str(mark))
+    return out
+
+
+def _query_fingerprint(func):
+    """Fingerprint of the code that produces a query function's results.
+
+    Covers the whole module the function is defined in, i.e. its other
+    functions and module-level constants such as CACHE_SCHEMA and
+    QUERY_VERSION, and the app's modules it imports (transitively), e.g.
+    helpers from pages.utils. Infrastructure (FINGERPRINT_EXCLUDE) is left
+    out, it doesn't change what's cached and LAYOUT_VERSION covers how.
+
+    Read from the source files rather than the live objects so that it's
+    the same in every process, whether or not the modules were imported
+    there. Modules are fingerprinted by their syntax trees without
+    docstrings, edits to comments, docs or formatting don't invalidate
+    cached results.
+
+    Args:
+        func (function): Query function, only __module__ is used.
+
+    Returns:
+        str: fingerprint, empty if the source isn't available.
+    """
+    module = getattr(func, "__module__", None)
+    if module in _FINGERPRINTS:
+        return _FINGERPRINTS[module]
+
+    try:
+        path = importlib.util.find_spec(module).origin
+    except (AttributeError, ImportError, TypeError, ValueError):
+        path = None
+
+    hashfunc = hashlib.md5()
+    seen, pending = set(), [path]
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        try:
+            with open(path) as f:
+                tree = ast.parse(f.read())
+        except (OSError, SyntaxError, TypeError, ValueError):
+            logging.warning(f"CACHE: NO SOURCE FOR {func.__name__} ({path}), NOT FINGERPRINTED")
+            _FINGERPRINTS[module] = ""
+            return ""
+
+        hashfunc.update(bytes(ast.dump(_strip_docstrings(tree)), "utf-8"))
+        pending.extend(_app_imports(tree))
+
+    _FINGERPRINTS[module] = hashfunc.hexdigest()
+    return _FINGERPRINTS[module]
+
+
+def _strip_docstrings(tree):
+    """Syntax tree without the docstrings of the module, its classes and functions."""
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            body = node.body
+            if body and isinstance(body[0], ast.Expr) and isinstance(getattr(body[0], "value", None), ast.Constant):
+                if isinstance(body[0].value.value, str):
+                    node.body = body[1:] or [ast.Pass()]
+    return tree
+
+
+def _app_imports(tree):
+    """Source files of the app's modules that a module imports, except FINGERPRINT_EXCLUDE."""
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(a.name for a in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.append(node.module)
+
+    paths = []
+    for name in names:
+        if name.split(".")[0] in FINGERPRINT_EXCLUDE:
+            continue
+        base = os.path.join(APP_DIR, *name.split("."))
+        for path in (base + ".py", os.path.join(base, "__init__.py")):
+            if os.path.isfile(path):
+                paths.append(path)
+                break
+    return paths
+
+
+_FINGERPRINTS = {}
+
+
+def _conform(table, schema):
+    """Casts the declared columns of a table to their declared types.
+
+    Columns that aren't declared keep the type Arrow inferred for them.
+
+    Args:
+        table (pa.Table): frame to write
+        schema (dict{str: pa.DataType}): declared column types
+
+    Raises:
+        ValueError: if a declared column is missing.
+
+    Returns:
+        pa.Table: table with the declared types
+    """
+    missing = [c for c in schema if c not in table.column_names]
+    if missing:
+        raise ValueError(f"CACHE: DECLARED COLUMNS {missing} MISSING FROM FRAME")
+
+    for name, t in schema.items():
+        i = table.schema.get_field_index(name)
+        if table.schema.field(i).type != t:
+            table = table.set_column(i, name, table.column(i).cast(t))
+
+    return table
+
+
+def _check_columns(h, names, columns):
+    """Requested columns of a key, all of them if 'columns' is None.
+
+    Raises:
+        KeyError: if a requested column isn't cached under the key.
+    """
+    if columns is None:
+        return names
+
+    absent = [c for c in columns if c not in names]
+    if absent:
+        raise KeyError(f"Columns {absent} not cached under {h}")
+    return list(columns)
+
+
+def _concat_tables(tables):
+    """Concatenates Arrow tables of the same query.
+
+    Tables with identical schemas are combined zero-copy. Repos whose column
+    was entirely null (or which had no rows) are inferred as a different Arrow
+    type, so the schemas are unified by promotion in that case.
+
+    Args:
+        tables (list[pa.Table]): per-repo tables
+
+    Returns:
+        pa.Table: one table whose chunks are the input tables.
+    """
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def _ipc_to_table(blob):
+    """Reads an IPC stream written by '_table_to_ipc'.
+
+    Args:
+        blob (bytes): IPC stream
+
+    Returns:
+        pa.Table: deserialized table
+    """
+    return pa.ipc.open_stream(pa.py_buffer(blob)).read_all()
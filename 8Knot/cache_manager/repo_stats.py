@@ -0,0 +1,167 @@
+import os
+import time
+import logging
+from _redis_pools import cache_client
+
+# per-repo statistics that are kept, each is a count of rows in Augur.
+STATS = ["commits", "prs", "issues", "contributor_actions"]
+
+# Redis hash {repo_id: count} of each statistic is stored at "<prefix><stat>".
+STATS_PREFIX = "8knot:repo-stats:"
+
+# time the statistics were last rebuilt.
+UPDATED_KEY = "8knot:repo-stats:updated"
+
+# held by the worker rebuilding the statistics so only one does at a time.
+REFRESH_LEASE = "8knot:repo-stats:refresh"
+
+# default seconds after which the statistics are rebuilt.
+DEFAULT_REFRESH_AFTER = 86400
+
+# seconds a rebuild may take before another one can be started.
+REFRESH_LEASE_TTL = 3600
+
+
+class RepoStats:
+    """
+    Per-repo size statistics of the Augur database, kept in Redis.
+
+    Counts of commits, PRs, issues and contributor actions per repo let the
+    app estimate what a selection will cost before it's fetched: the query
+    dispatcher balances its shards by them and the search bar warns about
+    very large selections.
+
+    The statistics are rebuilt by 'repo_stats_query' every
+    REPO_STATS_REFRESH_AFTER seconds, see 'claim_refresh'.
+
+    Attributes
+    ----------
+        _redis : (private) Redis object
+
+        _refresh_after : (private) seconds after which the statistics are rebuilt
+
+    Methods
+    -------
+        setm(df) :
+            Replaces all statistics with those of df.
+
+        getm(stat, [repo]) :
+            Returns a statistic of each repo, None if unknown.
+
+        totals([repo]) :
+            Returns the sum of each statistic over the repos.
+
+        ranked(stat) :
+            Returns all repos ordered by a statistic.
+
+        age() :
+            Returns seconds since the statistics were rebuilt.
+
+        claim_refresh() :
+            Claims the next rebuild if the statistics are due for one.
+    """
+
+    def __init__(self):
+        self._redis = cache_client()
+        self._refresh_after = int(os.getenv("REPO_STATS_REFRESH_AFTER", str(DEFAULT_REFRESH_AFTER)))
+
+    def setm(self, df):
+        """Replaces all statistics with those of df.
+
+        Each statistic is written to a temporary hash that's renamed over
+        the current one, so readers never see a partially written statistic.
+
+        Args:
+            df (pd.DataFrame): one row per repo, columns 'repo_id' and STATS.
+        """
+        pipe = self._redis.pipeline(transaction=True)
+        for stat in STATS:
+            key = STATS_PREFIX + stat
+            mapping = dict(zip(df["repo_id"].astype(int).tolist(), df[stat].astype(int).tolist()))
+            if not mapping:
+                pipe.delete(key)
+                continue
+            pipe.delete(f"{key}:new")
+            pipe.hset(f"{key}:new", mapping=mapping)
+            pipe.rename(f"{key}:new", key)
+        pipe.set(UPDATED_KEY, time.time())
+        pipe.execute()
+
+    def getm(self, stat, repos):
+        """A statistic of each repo.
+
+        Args:
+            stat (str): one of STATS
+            repos (list[int]): repo_ids
+
+        Returns:
+            list[int | None]: statistic per repo, None for repos without statistics.
+        """
+        if not repos:
+            return []
+
+        values = self._redis.hmget(STATS_PREFIX + stat, repos)
+        return [None if v is None else int(v) for v in values]
+
+    def totals(self, repos):
+        """The sum of each statistic over the repos.
+
+        Args:
+            repos (list[int]): repo_ids
+
+        Returns:
+            dict{str: int}: sum per statistic, repos without statistics are counted as 0.
+        """
+        if not repos:
+            return {stat: 0 for stat in STATS}
+
+        pipe = self._redis.pipeline(transaction=False)
+        for stat in STATS:
+            pipe.hmget(STATS_PREFIX + stat, repos)
+
+        return {stat: sum(int(v) for v in values if v is not None) for stat, values in zip(STATS, pipe.execute())}
+
+    def ranked(self, stat):
+        """All repos ordered by a statistic, largest first.
+
+        Args:
+            stat (str): one of STATS
+
+        Returns:
+            list[(int, int)]: (repo_id, statistic) pairs
+        """
+        values = self._redis.hgetall(STATS_PREFIX + stat)
+        return sorted(((int(r), int(v)) for r, v in values.items()), key=lambda rv: rv[1], reverse=True)
+
+    def age(self):
+        """Seconds since the statistics were rebuilt.
+
+        Returns:
+            float | None: age, None if they were never built.
+        """
+        updated = self._redis.get(UPDATED_KEY)
+        if updated is None:
+            return None
+        return time.time() - float(updated)
+
+    def claim_refresh(self):
+        """Claims the next rebuild of the statistics if they're missing or
+        older than REPO_STATS_REFRESH_AFTER seconds.
+
+        At most one claim succeeds per REFRESH_LEASE_TTL seconds, so every
+        process may call this without rebuilds piling up.
+
+        Returns:
+            bool: whether the caller should start a rebuild.
+        """
+        if self._refresh_after <= 0:
+            return False
+
+        age = self.age()
+        if age is not None and age < self._refresh_after:
+            return False
+
+        claimed = bool(self._redis.set(REFRESH_LEASE, time.time(), nx=True, ex=REFRESH_LEASE_TTL))
+        if claimed:
+            logging.warning(f"REPO_STATS: REBUILD CLAIMED, AGE {age}")
+        return claimed
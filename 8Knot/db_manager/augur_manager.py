@@ -3,13 +3,76 @@
 """
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv
 import sqlalchemy as salc
 import os
 import logging
 import sys
+import tempfile
+import threading
 import requests
 from sqlalchemy.exc import SQLAlchemyError
 
+# connection pool of the engine each process shares, overridden by
+# AUGUR_POOL_SIZE, AUGUR_MAX_OVERFLOW and AUGUR_POOL_RECYCLE (seconds).
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+DEFAULT_POOL_RECYCLE = 1800
+
+# rows per batch fetched from the server-side cursor of 'stream_query',
+# overridden by AUGUR_STREAM_BATCH_ROWS.
+DEFAULT_STREAM_BATCH_ROWS = 50000
+
+# how queries that declare the types of their columns are fetched, overridden by
+# AUGUR_FETCH_ENGINE. "read_sql": rows are materialized as Python objects by pandas,
+# "copy": Postgres sends them as CSV via COPY, parsed straight into Arrow columns.
+FETCH_ENGINES = ["read_sql", "copy"]
+DEFAULT_FETCH_ENGINE = "read_sql"
+
+# COPY output is spooled in memory up to this size, then to a temporary file.
+COPY_SPOOL_BYTES = 67108864
+
+# bytes of CSV parsed into one record batch when a COPY result is streamed.
+COPY_BLOCK_BYTES = 16777216
+
+# engines by (connection string, schema), created once per process.
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _reset_engines_after_fork():
+    """Forked processes (Celery, gunicorn workers) open their own connections
+    instead of using the parent's, which stay open for the parent."""
+    for engine in _engines.values():
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_reset_engines_after_fork)
+
+
+def pool_metrics():
+    """Usage of this process's Augur connection pools.
+
+    Returns:
+        dict{str: dict}: per database, connections checked in, checked out and in overflow, and the caps.
+    """
+    with _engines_lock:
+        engines = dict(_engines)
+
+    metrics = {}
+    for engine in engines.values():
+        pool = engine.pool
+        metrics[f"{engine.url.host}/{engine.url.database}"] = {
+            "pool_size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            # negative while fewer than pool_size connections have been opened
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+        }
+    return metrics
+
 
 class AugurManager:
     """
@@ -41,15 +104,22 @@ class AugurManager:
             Schema credential to Augur database.
             The target schema of the database we want to access.
 
+        fetch_engine : str
+            How queries that declare their column types are fetched, one of FETCH_ENGINES.
+
     Methods:
     --------
         get_engine():
-            Connects to Augur databse with supplied credentials and
-            returns engine object.
+            Returns the process's engine connected to Augur database with
+            supplied credentials, creating it on first use.
 
-        run_query(query_string):
+        run_query(query_string, params, column_types):
             Runs a SQL-query against Augur database and returns resulting
             Pandas dataframe.
+
+        stream_query(query_string, params, batch_size, column_types):
+            Runs a SQL-query against Augur database with a server-side cursor
+            and yields the result in Pandas dataframes of batch_size rows.
     """
 
     def __init__(self, handles_oauth=False):
@@ -70,6 +140,10 @@ class AugurManager:
             logging.critical(f"AUGUR: Database credentials incomplete: {ke}")
             raise KeyError(ke)
 
+        self.fetch_engine = os.getenv("AUGUR_FETCH_ENGINE", DEFAULT_FETCH_ENGINE).lower()
+        if self.fetch_engine not in FETCH_ENGINES:
+            raise ValueError(f"AUGUR_FETCH_ENGINE must be one of {FETCH_ENGINES}, not {self.fetch_engine}")
+
         # oauth endpoints have to be intact to proceed
         if handles_oauth:
             try:
@@ -92,7 +166,11 @@ class AugurManager:
 
     def get_engine(self):
         """
-        Creates _engine.Engine object connected to our Augur database.
+        Returns _engine.Engine object connected to our Augur database.
+
+        The engine and its connection pool are shared by all AugurManager
+        objects of a process. It's created, and its connection verified,
+        only the first time; later calls don't connect to the database.
 
         Returns:
         --------
@@ -107,27 +185,37 @@ class AugurManager:
             self.user, self.password, self.host, self.port, self.database
         )
 
-        engine = salc.create_engine(
-            database_connection_string,
-            connect_args={"options": "-csearch_path={}".format(self.schema)},
-            pool_pre_ping=True,
-        )
-
-        # verify that engine works
-        try:
-            # context managed connect, closes automatically
-            with engine.connect() as conn:
-                logging.warning("AUGUR: Connection to DB succeeded")
-
-            self.engine = engine
-
-        except SQLAlchemyError as err:
-            logging.error(f"AUGUR: DB couldn't connect: {err.__cause__}")
-            raise SQLAlchemyError(err)
+        key = (database_connection_string, self.schema)
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = salc.create_engine(
+                    database_connection_string,
+                    connect_args={"options": "-csearch_path={}".format(self.schema)},
+                    pool_pre_ping=True,
+                    pool_size=int(os.getenv("AUGUR_POOL_SIZE", str(DEFAULT_POOL_SIZE))),
+                    max_overflow=int(os.getenv("AUGUR_MAX_OVERFLOW", str(DEFAULT_MAX_OVERFLOW))),
+                    pool_recycle=int(os.getenv("AUGUR_POOL_RECYCLE", str(DEFAULT_POOL_RECYCLE))),
+                )
+
+                # verify that engine works
+                try:
+                    # context managed connect, closes automatically
+                    with engine.connect() as conn:
+                        logging.warning("AUGUR: Connection to DB succeeded")
+
+                except SQLAlchemyError as err:
+                    logging.error(f"AUGUR: DB couldn't connect: {err.__cause__}")
+                    engine.dispose()
+                    raise SQLAlchemyError(err)
+
+                _engines[key] = engine
+
+        self.engine = engine
 
         return engine
 
-    def run_query(self, query_string: str) -> pd.DataFrame:
+    def run_query(self, query_string: str, params: dict = None, column_types: dict = None) -> pd.DataFrame:
         """
         Runs SQL query against our Augur database.
 
@@ -135,6 +223,12 @@ class AugurManager:
         -----
             query_string (str): SQL query to run.
 
+            params (dict): values of the query's bound parameters (':name'). Lists are
+                bound as arrays, e.g. 'repo_id = ANY(:repo_ids)'.
+
+            column_types (dict{str: pa.DataType}): Arrow type of every column of the
+                result. Lets the query be fetched with COPY if 'fetch_engine' is "copy".
+
         Returns:
         --------
             pd.DataFrame: Results from SQL query.
@@ -148,16 +242,146 @@ class AugurManager:
         query = salc.sql.text(query_string)
 
         try:
-            with self.engine.connect() as conn:
-                result_df = pd.read_sql(query, con=conn)
+            if column_types is not None and self.fetch_engine == "copy":
+                with tempfile.SpooledTemporaryFile(max_size=COPY_SPOOL_BYTES) as spool:
+                    table = self._copy_reader(query_string, params, column_types, spool).read_all()
+                result_df = _cast_timestamps(table, column_types).to_pandas(self_destruct=True)
+            else:
+                with self.engine.connect() as conn:
+                    result_df = pd.read_sql(query, con=conn, params=params)
         except:
             raise Exception("DB Read Failure")
 
-        result_df = result_df.reset_index()
-        result_df.drop("index", axis=1, inplace=True)
-
+        # read_sql already returns a RangeIndex, no need to copy the frame to reset it.
         return result_df
 
+    def stream_query(self, query_string: str, params: dict = None, batch_size: int = None, column_types: dict = None):
+        """
+        Runs SQL query against our Augur database and yields the result in batches.
+
+        Rows are read from a server-side cursor, so neither the database driver
+        nor the caller ever hold more than 'batch_size' of them at once.
+
+        With 'column_types' and the "copy" fetch engine, the result is spooled
+        via COPY instead and parsed in batches of about COPY_BLOCK_BYTES of CSV.
+
+        Args:
+        -----
+            query_string (str): SQL query to run.
+
+            params (dict): values of the query's bound parameters (':name').
+
+            batch_size (int): rows per batch, AUGUR_STREAM_BATCH_ROWS if None.
+
+            column_types (dict{str: pa.DataType}): Arrow type of every column of the result.
+
+        Yields:
+        --------
+            pd.DataFrame: Results from SQL query, at least one (possibly empty) frame.
+        """
+        if self.engine is None:
+            logging.critical("No engine- please use 'get_engine' method to create engine.")
+            return
+
+        if batch_size is None:
+            batch_size = int(os.getenv("AUGUR_STREAM_BATCH_ROWS", str(DEFAULT_STREAM_BATCH_ROWS)))
+
+        if column_types is not None and self.fetch_engine == "copy":
+            yield from self._stream_copy(query_string, params, column_types)
+            return
+
+        query = salc.sql.text(query_string)
+
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(
+                    query, params or {}
+                )
+                columns = list(result.keys())
+
+                empty = True
+                for rows in result.partitions(batch_size):
+                    empty = False
+                    yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
+                if empty:
+                    yield pd.DataFrame(columns=columns)
+        except SQLAlchemyError:
+            raise Exception("DB Read Failure")
+
+    def _stream_copy(self, query_string, params, column_types):
+        """
+        (private)
+        Yields the result of a query fetched with COPY in batches, see 'stream_query'.
+        """
+        with tempfile.SpooledTemporaryFile(max_size=COPY_SPOOL_BYTES) as spool:
+            try:
+                reader = self._copy_reader(query_string, params, column_types, spool, block_size=COPY_BLOCK_BYTES)
+            except Exception:
+                raise Exception("DB Read Failure")
+
+            empty = True
+            for batch in reader:
+                empty = False
+                table = _cast_timestamps(pa.Table.from_batches([batch]), column_types)
+                yield table.to_pandas(self_destruct=True)
+
+            if empty:
+                yield pd.DataFrame(columns=reader.schema.names)
+
+    def _copy_reader(self, query_string, params, column_types, spool, block_size=None):
+        """
+        (private)
+        Runs a query as 'COPY (query) TO STDOUT' in CSV format into 'spool'
+        and opens an Arrow CSV reader on it.
+
+        Columns are parsed with their declared types instead of being
+        inferred, timestamps are parsed afterwards by '_cast_timestamps'.
+
+        Args:
+        -----
+            query_string (str): SQL query to run.
+
+            params (dict): values of the query's bound parameters (':name').
+
+            column_types (dict{str: pa.DataType}): Arrow type of every column of the result.
+
+            spool (file): binary file the CSV is written to.
+
+            block_size (int): bytes of CSV per record batch, Arrow's default if None.
+
+        Returns:
+        --------
+            pa.csv.CSVStreamingReader: reader of the result.
+        """
+        # COPY can't take bound parameters; the driver renders them into the statement.
+        compiled = str(salc.sql.text(query_string).compile(dialect=self.engine.dialect))
+
+        conn = self.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            statement = cursor.mogrify(compiled, params or {}).decode("utf-8")
+
+            # timestamps with time zone are written with a "+00" offset, which Arrow parses.
+            cursor.execute("SET LOCAL TIME ZONE 'UTC'")
+            cursor.copy_expert(f"COPY ({statement}) TO STDOUT WITH (FORMAT csv, HEADER true)", spool)
+            cursor.close()
+        finally:
+            conn.close()
+
+        spool.seek(0)
+
+        read_options = pa.csv.ReadOptions() if block_size is None else pa.csv.ReadOptions(block_size=block_size)
+        convert_options = pa.csv.ConvertOptions(
+            column_types={c: pa.string() if pa.types.is_timestamp(t) else t for c, t in column_types.items()},
+            # NULL is written unquoted and empty, an empty string as ""
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+            true_values=["t"],
+            false_values=["f"],
+        )
+        return pa.csv.open_csv(spool, read_options=read_options, convert_options=convert_options)
+
     def multiselect_startup(self):
         logging.warning(f"MULTISELECT_STARTUP")
 
@@ -344,3 +568,34 @@ class AugurManager:
 
         if result.status_code == 200:
             return result.json()
+
+
+def _cast_timestamps(table, column_types):
+    """Parses the timestamp columns of a COPY result, which are read as text.
+
+    Columns declared with a time zone accept values with and without offset
+    (timestamp and timestamptz columns), the latter are taken to be in UTC.
+
+    Args:
+        table (pa.Table): result with timestamp columns as strings
+        column_types (dict{str: pa.DataType}): declared types
+
+    Returns:
+        pa.Table: result with typed timestamp columns
+    """
+    for name, t in column_types.items():
+        if not pa.types.is_timestamp(t) or name not in table.column_names:
+            continue
+
+        col = table.column(name)
+        if t.tz is None:
+            parsed = col.cast(t)
+        else:
+            try:
+                parsed = col.cast(t)
+            except pa.ArrowInvalid:
+                parsed = col.cast(pa.timestamp(t.unit)).cast(t)
+
+        table = table.set_column(table.schema.get_field_index(name), name, parsed)
+
+    return table
@@ -135,10 +135,7 @@ def toggle_popover(n, is_open):
 def commit_domains_graph(repolist, num, start_date, end_date):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=cq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=cq, repos=repolist)
+    df = cache.wait_for(func=cq, repos=repolist, columns=["author_email", "author_timestamp"])
 
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
@@ -156,10 +156,7 @@ def compay_associated_activity_graph(repolist, num, start_date, end_date, bot_sw
 
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=cmq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=cmq, repos=repolist)
+    df = cache.wait_for(func=cmq, repos=repolist)
 
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
@@ -8,13 +8,13 @@ import logging
 from dateutil.relativedelta import *  # type: ignore
 import plotly.express as px
 from pages.utils.graph_utils import color_seq
-from queries.company_query import company_query as cmq
+from queries.company_query import company_query as cmq, company_names
 import io
 from cache_manager.cache_manager import CacheManager as cm
 from pages.utils.job_utils import nodata_graph
+from pages.utils.company_names import CompanyIndex
 import time
 import datetime as dt
-from fuzzywuzzy import fuzz
 import app
 
 PAGE = "affiliation"
@@ -134,10 +134,8 @@ def toggle_popover(n, is_open):
 def gh_company_affiliation_graph(repolist, num, start_date, end_date, bot_switch):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=cmq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=cmq, repos=repolist)
+    df = cache.wait_for(func=cmq, repos=repolist)
+    names = cache.wait_for(func=company_names, repos=repolist)
 
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
@@ -152,7 +150,7 @@ def gh_company_affiliation_graph(repolist, num, start_date, end_date, bot_switch
         df = df[~df["cntrb_id"].isin(app.bots_list)]
 
     # function for all data pre processing, COULD HAVE ADDITIONAL INPUTS AND OUTPUTS
-    df = process_data(df, num, start_date, end_date)
+    df = process_data(df, names, num, start_date, end_date)
 
     fig = create_figure(df)
 
@@ -160,7 +158,7 @@ def gh_company_affiliation_graph(repolist, num, start_date, end_date, bot_switch
     return fig
 
 
-def process_data(df: pd.DataFrame, num, start_date, end_date):
+def process_data(df: pd.DataFrame, names: pd.DataFrame, num, start_date, end_date):
     """Implement your custom data-processing logic in this function.
     The output of this function is the data you intend to create a visualization with,
     requiring no further processing."""
@@ -177,34 +175,24 @@ def process_data(df: pd.DataFrame, num, start_date, end_date):
     if end_date is not None:
         df = df[df.created <= end_date]
 
-    # intital count of same company name in github profile
-    result = df.cntrb_company.value_counts(dropna=False)
-
-    # reset format for df work
-    df = result.to_frame()
-    df["company_name"] = df.index
-    df = df.reset_index()
-    df["company_name"] = df["company_name"].astype(str)
-    df = df.rename(columns={"index": "orginal_name", "cntrb_company": "contribution_count"})
-
-    # applies fuzzy matching comparing all rows to each other
-    df["match"] = df.apply(lambda row: fuzzy_match(df, row["company_name"]), axis=1)
-
-    # changes company name to match other fuzzy matches
-    for x in range(0, len(df)):
-        # gets match values for the current row
-        matches = df.iloc[x]["match"]
-        for y in matches:
-            # for each match, change the name to its match and clear out match column as
-            # it will unnecessarily reapply changes
-            df.loc[y, "company_name"] = df.iloc[x]["company_name"]
-            df.loc[y, "match"] = ""
+    # canonical company names, as matched per repo when the data was fetched
+    canonical = names.drop_duplicates(subset="cntrb_company").set_index("cntrb_company")["company_name"]
+    company = df["cntrb_company"].astype(object)
+    df = pd.DataFrame({"company_name": company.map(canonical).fillna(company).astype(object)})
+
+    # spellings of the same company can differ between repos, match the repos' names against each other.
+    # there are only a few of those per company, so this is cheap.
+    counts = df["company_name"].value_counts()
+    df["company_name"] = df["company_name"].map(CompanyIndex(counts.index, counts.to_numpy()).canonical())
+
+    # keep contributors without a company as their own group, named as before
+    df["company_name"] = df["company_name"].fillna("nan").astype(str)
 
     # groups all same name company affiliation and sums the contributions
     df = (
-        df.groupby(by="company_name")["contribution_count"]
-        .sum()
-        .reset_index()
+        df.groupby(by="company_name")
+        .size()
+        .reset_index(name="contribution_count")
         .sort_values(by=["contribution_count"])
         .reset_index(drop=True)
     )
@@ -224,17 +212,6 @@ def process_data(df: pd.DataFrame, num, start_date, end_date):
     return df
 
 
-def fuzzy_match(df, name):
-    """
-    This function compares each row to all of the other values in the company_name column and
-    outputs a list on if there is a fuzzy match between the different rows. This gives the values
-    necessary for the loop to change the company name if there is a match. 70 is the match value
-    threshold for the partial ratio to be considered a match
-    """
-    matches = df.apply(lambda row: (fuzz.partial_ratio(row["company_name"], name) >= 70), axis=1)
-    return [i for i, x in enumerate(matches) if x]
-
-
 def create_figure(df: pd.DataFrame):
     # graph generation
     fig = px.pie(
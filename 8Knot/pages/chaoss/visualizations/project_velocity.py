@@ -242,10 +242,7 @@ def project_velocity_graph(
 
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=ctq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=ctq, repos=repolist)
+    df = cache.wait_for(func=ctq, repos=repolist)
 
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
@@ -292,13 +289,13 @@ def process_data(
         df = df[df.created_at <= end_date]
 
     # df to hold value of unique contributors for each repo
-    df_cntrbs = pd.DataFrame(df.groupby("repo_name")["cntrb_id"].nunique()).rename(
+    df_cntrbs = pd.DataFrame(df.groupby("repo_name", observed=True)["cntrb_id"].nunique()).rename(
         columns={"cntrb_id": "num_unique_contributors"}
     )
 
     # group actions and repos to get the counts of the actions by repo
-    df_actions = pd.DataFrame(df.groupby("repo_name")["Action"].value_counts())
-    df_actions = df_actions.rename(columns={"Action": "count"}).reset_index()
+    # observed=True so that unused categories don't show up as zero counts
+    df_actions = df.groupby(["repo_name", "Action"], observed=True).size().reset_index(name="count")
 
     # pivot df to reformat the actions to be columns and repo_id to be rows
     df_actions = df_actions.pivot(index="repo_name", columns="Action", values="count")
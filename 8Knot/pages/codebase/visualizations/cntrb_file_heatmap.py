@@ -161,10 +161,7 @@ def repo_dropdown(repo_ids):
 def directory_dropdown(repo_id):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=rfq, repos=[repo_id])
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=rfq, repos=[repo_id])
+    df = cache.wait_for(func=rfq, repos=[repo_id])
 
     # test if there is data
     if df.empty:
@@ -222,20 +219,11 @@ def cntrb_file_heatmap_graph(repo_id, directory, bot_switch):
     cache = cm()
 
     # execute queries for the 3 needed dfs
-    df_file = cache.grabm(func=rfq, repos=[repo_id])
-    while df_file is None:
-        time.sleep(1.0)
-        df_file = cache.grabm(func=rfq, repos=[repo_id])
-
-    df_actions = cache.grabm(func=cnq, repos=[repo_id])
-    while df_actions is None:
-        time.sleep(1.0)
-        df_actions = cache.grabm(func=cnq, repos=[repo_id])
-
-    df_file_cntbs = cache.grabm(func=cpfq, repos=[repo_id])
-    while df_file_cntbs is None:
-        time.sleep(1.0)
-        df_file_cntbs = cache.grabm(func=cpfq, repos=[repo_id])
+    df_file = cache.wait_for(func=rfq, repos=[repo_id])
+
+    df_actions = cache.wait_for(func=cnq, repos=[repo_id])
+
+    df_file_cntbs = cache.wait_for(func=cpfq, repos=[repo_id])
 
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
@@ -4,6 +4,7 @@ import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output, State
 import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
 import logging
 from dateutil.relativedelta import *  # type: ignore
 import plotly.express as px
@@ -12,6 +13,7 @@ from queries.pr_assignee_query import pr_assignee_query as praq
 import io
 from cache_manager.cache_manager import CacheManager as cm
 from pages.utils.job_utils import nodata_graph
+from pages.utils.interval_state import period_sums
 import time
 import datetime as dt
 import app
@@ -150,10 +152,7 @@ def toggle_popover(n, is_open):
 def cntrib_pr_assignment_graph(repolist, interval, assign_req, bot_switch):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=praq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=praq, repos=repolist)
+    df = cache.wait_for(func=praq, repos=repolist)
 
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
@@ -188,20 +187,11 @@ def process_data(df: pd.DataFrame, interval, assign_req):
     # drop all issues that have no assignments
     df = df[~df.assignment_action.isnull()]
 
-    # df of rows that are assignments
-    df_contrib = df[df["assignment_action"] == "assigned"]
-
     # count the assignments total for each contributor
-    df_contrib = (
-        df_contrib["assignee"]
-        .value_counts()
-        .to_frame()
-        .reset_index()
-        .rename(columns={"assignee": "count", "index": "assignee"})
-    )
+    assign_counts = df.loc[df["assignment_action"] == "assigned", "assignee"].value_counts()
 
     # create list of all contributors that meet the assignment requirement
-    contributors = df_contrib["assignee"][df_contrib["count"] >= assign_req].to_list()
+    contributors = assign_counts.index[assign_counts >= assign_req].to_list()
 
     # no update if there are not any contributors that meet the criteria
     if len(contributors) == 0:
@@ -231,12 +221,16 @@ def process_data(df: pd.DataFrame, interval, assign_req):
     else:
         df_assign["end_date"] = df_assign.start_date + pd.DateOffset(years=1)
 
-    # iterates through contributors and dates for assignment values
-    for contrib in contributors:
-        df_assign[contrib] = df_assign.apply(
-            lambda row: pr_assignment(df, row.start_date, row.end_date, contrib),
-            axis=1,
-        )
+    # an assignment counts towards every interval from the one it's made in (and the pr exists)
+    # until the pr is closed; an unassignment takes it back out from then on.
+    weights = np.select(
+        [df["assignment_action"] == "assigned", df["assignment_action"] == "unassigned"], [1, -1], default=0
+    )
+    since = df[["created", "assign_date"]].max(axis=1, skipna=False)
+    counts = period_sums(
+        df["assignee"], weights, since, df["closed"], df_assign["start_date"], df_assign["end_date"], contributors
+    )
+    df_assign[contributors] = counts.astype(int)
 
     # formatting for graph generation
     if interval == "M":
@@ -305,51 +299,3 @@ def create_figure(df: pd.DataFrame, interval):
     )
 
     return fig
-
-
-def pr_assignment(df, start_date, end_date, contrib):
-    """
-    This function takes a start and an end date and determines how many
-    prs that are open during that time interval and are currently assigned
-    to the contributor.
-
-    Args:
-    -----
-        df : Pandas Dataframe
-            Dataframe with issue assignment actions of the assignees
-
-        start_date : Datetime Timestamp
-            Timestamp of the start time of the time interval
-
-        end_date : Datetime Timestamp
-            Timestamp of the end time of the time interval
-
-        contrib : str
-            contrb_id for the contributor
-
-    Returns:
-    --------
-        int: Number of assignments to the contributor in the time window
-    """
-
-    # drop rows not by contrib
-    df = df[df["assignee"] == contrib]
-
-    # drop rows that are more recent than the end date
-    df_created = df[df["created"] <= end_date]
-
-    # Keep issues that were either still open after the 'start_date' or that have not been closed.
-    df_in_range = df_created[(df_created["closed"] > start_date) | (df_created["closed"].isnull())]
-
-    # get all issue unassignments and drop rows that have been unassigned more recent than the end date
-    df_unassign = df_in_range[
-        (df_in_range["assignment_action"] == "unassigned") & (df_in_range["assign_date"] <= end_date)
-    ]
-
-    # get all issue assignments and drop rows that have been assigned more recent than the end date
-    df_assigned = df_in_range[
-        (df_in_range["assignment_action"] == "assigned") & (df_in_range["assign_date"] <= end_date)
-    ]
-
-    # return the different of assignments and unassignments
-    return df_assigned.shape[0] - df_unassign.shape[0]
@@ -117,10 +117,7 @@ def toggle_popover(n, is_open):
 def commits_over_time_graph(repolist, interval):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=cmq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=cmq, repos=repolist)
+    df = cache.wait_for(func=cmq, repos=repolist, columns=["commits", "date"])
 
     # data ready.
     start = time.perf_counter()
@@ -118,10 +118,7 @@ def toggle_popover(n, is_open):
 def cntrib_issue_assignment_graph(repolist, interval, bot_switch):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=iaq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=iaq, repos=repolist)
+    df = cache.wait_for(func=iaq, repos=repolist)
 
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
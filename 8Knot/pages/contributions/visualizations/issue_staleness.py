@@ -12,6 +12,7 @@ import plotly.express as px
 from pages.utils.graph_utils import get_graph_time_values, color_seq
 from queries.issues_query import issues_query as iq
 from pages.utils.job_utils import nodata_graph
+from pages.utils.interval_state import IntervalState
 from cache_manager.cache_manager import CacheManager as cm
 import io
 import time
@@ -174,10 +175,7 @@ def new_staling_issues_graph(repolist, interval, staling_interval, stale_interva
 
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=iq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=iq, repos=repolist)
+    df = cache.wait_for(func=iq, repos=repolist)
 
     start = time.perf_counter()
     logging.warning("ISSUES STALENESS - START")
@@ -215,12 +213,9 @@ def process_data(df: pd.DataFrame, interval, staling_interval, stale_interval):
     # df for new, staling, and stale issues for time interval
     df_status = dates.to_frame(index=False, name="Date")
 
-    # dynamically apply the function to all dates defined in the date_range to create df_status
-    df_status["New"], df_status["Staling"], df_status["Stale"] = zip(
-        *df_status.apply(
-            lambda row: get_new_staling_stale_up_to(df, row.Date, staling_interval, stale_interval),
-            axis=1,
-        )
+    # count the new, staling and stale items open at each date
+    df_status["New"], df_status["Staling"], df_status["Stale"] = IntervalState(df["created"], df["closed"]).staleness(
+        df_status["Date"], staling_interval, stale_interval
     )
 
     # formatting for graph generation
@@ -288,33 +283,3 @@ def create_figure(df_status: pd.DataFrame, interval):
     )
 
     return fig
-
-
-def get_new_staling_stale_up_to(df, date, staling_interval, stale_interval):
-    # drop rows that are more recent than the date limit
-    df_created = df[df["created"] <= date]
-
-    # drop rows that have been closed before date
-    df_in_range = df_created[df_created["closed"] > date]
-
-    # include rows that have a null closed value
-    df_in_range = pd.concat([df_in_range, df_created[df_created.closed.isnull()]])
-
-    # time difference for the amount of days before the threshold date
-    staling_days = date - relativedelta(days=+staling_interval)
-
-    # time difference for the amount of days before the threshold date
-    stale_days = date - relativedelta(days=+stale_interval)
-
-    # issuess still open at the specified date
-    numTotal = df_in_range.shape[0]
-
-    # num of currently open issues that have been create in the last staling_value amount of days
-    numNew = df_in_range[df_in_range["created"] >= staling_days].shape[0]
-
-    staling = df_in_range[df_in_range["created"] > stale_days]
-    numStaling = staling[staling["created"] < staling_days].shape[0]
-
-    numStale = numTotal - (numNew + numStaling)
-
-    return [numNew, numStaling, numStale]
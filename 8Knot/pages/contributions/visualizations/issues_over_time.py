@@ -8,6 +8,7 @@ import pandas as pd
 import logging
 from pages.utils.graph_utils import get_graph_time_values, color_seq
 from pages.utils.job_utils import nodata_graph
+from pages.utils.interval_state import IntervalState
 from queries.issues_query import issues_query as iq
 from cache_manager.cache_manager import CacheManager as cm
 import io
@@ -117,10 +118,7 @@ def toggle_popover(n, is_open):
 def issues_over_time_graph(repolist, interval):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=iq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=iq, repos=repolist)
+    df = cache.wait_for(func=iq, repos=repolist)
 
     # data ready.
     start = time.perf_counter()
@@ -191,8 +189,8 @@ def process_data(df: pd.DataFrame, interval):
     # df for open issues for time interval
     df_open = dates.to_frame(index=False, name="Date")
 
-    # aplies function to get the amount of open issues for each day
-    df_open["Open"] = df_open.apply(lambda row: get_open(df, row.Date), axis=1)
+    # amount of open issues on each day
+    df_open["Open"] = IntervalState(df["created"], df["closed"]).open_at(df_open["Date"])
 
     df_open["Date"] = df_open["Date"].dt.strftime("%Y-%m-%d")
 
@@ -249,19 +247,3 @@ def create_figure(df_created: pd.DataFrame, df_closed: pd.DataFrame, df_open: pd
     )
 
     return fig
-
-
-# for each day, this function calculates the amount of open issues
-def get_open(df, date):
-    # drop rows that are more recent than the date limit
-    df_lim = df[df["created"] <= date]
-
-    # drops rows that have been closed after date
-    df_open = df_lim[df_lim["closed"] > date]
-
-    # include issues that have not been close yet
-    df_open = pd.concat([df_open, df_lim[df_lim.closed.isnull()]])
-
-    # generates number of columns ie open issues
-    num_open = df_open.shape[0]
-    return num_open
@@ -112,10 +112,7 @@ def toggle_popover(n, is_open):
 def pr_assignment_graph(repolist, interval, bot_switch):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=praq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=praq, repos=repolist)
+    df = cache.wait_for(func=praq, repos=repolist)
 
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
@@ -12,6 +12,7 @@ from queries.pr_response_query import pr_response_query as prr
 import io
 from cache_manager.cache_manager import CacheManager as cm
 from pages.utils.job_utils import nodata_graph
+from pages.utils.interval_state import IntervalState
 import time
 import app
 
@@ -117,10 +118,7 @@ def toggle_popover(n, is_open):
 def pr_first_response_graph(repolist, num_days, bot_switch):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=prr, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=prr, repos=repolist)
+    df = cache.wait_for(func=prr, repos=repolist)
 
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
@@ -167,13 +165,14 @@ def process_data(df: pd.DataFrame, num_days):
     # df for open prs and responded to prs in time interval
     df_pr_responses = dates.to_frame(index=False, name="Date")
 
+    # PRs that were responded to within num_days of their opening
+    responded = df[df["msg_timestamp"] < df["pr_created_at"] + pd.DateOffset(days=num_days)]
+
     # every day, count the number of PRs that are open on that day and the number of
     # those that were responded to within num_days of their opening
-    df_pr_responses["Open"], df_pr_responses["Response"] = zip(
-        *df_pr_responses.apply(
-            lambda row: get_open_response(df, row.Date, num_days),
-            axis=1,
-        )
+    df_pr_responses["Open"] = IntervalState(df["pr_created_at"], df["pr_closed_at"]).open_at(df_pr_responses["Date"])
+    df_pr_responses["Response"] = IntervalState(responded["pr_created_at"], responded["pr_closed_at"]).open_at(
+        df_pr_responses["Date"]
     )
 
     df_pr_responses["Date"] = df_pr_responses["Date"].dt.strftime("%Y-%m-%d")
@@ -212,47 +211,3 @@ def create_figure(df: pd.DataFrame, num_days):
     )
 
     return fig
-
-
-def get_open_response(df, date, num_days):
-    """
-    This function takes a date and determines how many
-    prs in that time interval are opened and if they have a response within num_days.
-
-    Args:
-    -----
-        df : Pandas Dataframe
-            Dataframe with pr assignment actions of the assignees
-
-        date : Datetime Timestamp
-            Timestamp of the date
-
-        num_days : int
-            number of days that a response should be within
-
-    Returns:
-    --------
-        int, int: Number of opened and responded to prs within num_days on the day
-    """
-    # drop rows that are more recent than the date limit
-    df_created = df[df["pr_created_at"] <= date]
-
-    # drops rows that have been closed after date
-    df_open = df_created[df_created["pr_closed_at"] > date]
-
-    # include prs that have not been close yet
-    df_open = pd.concat([df_open, df_created[df_created.pr_closed_at.isnull()]])
-
-    # column to hold date num_days after the pr_creation date for comparision
-    df_open["response_by"] = df_open["pr_created_at"] + pd.DateOffset(days=num_days)
-
-    # Inlcude only the prs that msg timestamp is before the responded by time
-    df_response = df_open[df_open["msg_timestamp"] < df_open["response_by"]]
-
-    # generates number of columns ie open prs
-    num_open = df_open.shape[0]
-
-    # number of prs that had response in time interval
-    num_response = df_response.shape[0]
-
-    return num_open, num_response
@@ -10,6 +10,7 @@ import logging
 from pages.utils.graph_utils import get_graph_time_values, color_seq
 import io
 from pages.utils.job_utils import nodata_graph
+from pages.utils.interval_state import IntervalState
 from queries.prs_query import prs_query as prq
 from cache_manager.cache_manager import CacheManager as cm
 import time
@@ -118,10 +119,7 @@ def toggle_popover(n, is_open):
 def prs_over_time_graph(repolist, interval):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=prq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=prq, repos=repolist)
+    df = cache.wait_for(func=prq, repos=repolist)
 
     # data ready.
     start = time.perf_counter()
@@ -205,8 +203,8 @@ def process_data(df: pd.DataFrame, interval):
     # df for open prs from time interval
     df_open = dates.to_frame(index=False, name="Date")
 
-    # aplies function to get the amount of open prs for each day
-    df_open["Open"] = df_open.apply(lambda row: get_open(df, row.Date), axis=1)
+    # amount of open prs on each day
+    df_open["Open"] = IntervalState(df["created"], df["closed"]).open_at(df_open["Date"])
 
     df_open["Date"] = df_open["Date"].dt.strftime("%Y-%m-%d")
 
@@ -278,19 +276,3 @@ def create_figure(
     )
 
     return fig
-
-
-# for each day, this function calculates the amount of open prs
-def get_open(df, date):
-    # drop rows that are more recent than the date limit
-    df_created = df[df["created"] <= date]
-
-    # drops rows that have been closed after date
-    df_open = df_created[df_created["closed"] > date]
-
-    # include prs that have not been close yet
-    df_open = pd.concat([df_open, df_created[df_created.closed.isnull()]])
-
-    # generates number of columns ie open prs
-    num_open = df_open.shape[0]
-    return num_open
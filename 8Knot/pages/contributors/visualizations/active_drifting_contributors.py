@@ -173,10 +173,7 @@ def active_drifting_contributors_graph(repolist, interval, drift_interval, away_
 
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=ctq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=ctq, repos=repolist)
+    df = cache.wait_for(func=ctq, repos=repolist)
 
     logging.warning(f"ACTIVE_DRIFTING_CONTRIBUTOR_GROWTH_VIZ - START")
     start = time.perf_counter()
@@ -115,10 +115,7 @@ def toggle_popover(n, is_open):
 def contrib_activity_cycle_graph(repolist, interval):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=cmq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=cmq, repos=repolist)
+    df = cache.wait_for(func=cmq, repos=repolist, columns=["author_timestamp", "committer_timestamp"])
 
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
@@ -158,10 +158,7 @@ def graph_title(view):
 def repeat_drive_by_graph(repolist, contribs, view, bot_switch):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=ctq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=ctq, repos=repolist)
+    df = cache.wait_for(func=ctq, repos=repolist)
 
     # data ready.
     start = time.perf_counter()
@@ -15,13 +15,19 @@ from queries.contributors_query import contributors_query as ctq
 import io
 from cache_manager.cache_manager import CacheManager as cm
 from pages.utils.job_utils import nodata_graph
+from pages.utils.lottery_windows import LotteryWindows
 import time
 import datetime as dt
+import threading
+from collections import OrderedDict
 import app
 
 PAGE = "contributors"
 VIZ_ID = "lottery-factor-over-time"
 
+# action types whose lottery factor is graphed, in the order of the traces
+ACTIONS = ["Commit", "Issue Opened", "Issue Comment", "Issue Closed", "PR Opened", "PR Comment", "PR Review"]
+
 gc_lottery_factor_over_time = dbc.Card(
     [
         dbc.CardBody(
@@ -235,32 +241,50 @@ def graph_title(window_width):
 def create_contrib_prolificacy_over_time_graph(
     repolist, patterns, threshold, window_width, step_size, start_date, end_date, bot_switch
 ):
-    # main function for all data pre processing
     cache = cm()
-    df = cache.grabm(func=ctq, repos=repolist)
 
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=ctq, repos=repolist)
+    # the windows only depend on the threshold through their lottery factors. They're
+    # kept per process, so that moving the threshold slider doesn't recount them.
+    key = (
+        tuple(repolist),
+        tuple(patterns or []),
+        bool(bot_switch),
+        window_width,
+        step_size,
+        start_date,
+        end_date,
+    )
+    built = _cached_windows(key, cache.versions(func=ctq, repos=repolist))
+
+    if built is None:
+        # main function for all data pre processing
+        df = cache.wait_for(func=ctq, repos=repolist)
+        versions = cache.versions(func=ctq, repos=repolist)
 
-    # remove bot data
-    if bot_switch:
-        df = df[~df["cntrb_id"].isin(app.bots_list)]
+        # remove bot data
+        if bot_switch:
+            df = df[~df["cntrb_id"].isin(app.bots_list)]
+
+        # test if there is data
+        if df.empty:
+            logging.warning(f"{VIZ_ID} - NO DATA AVAILABLE")
+            return nodata_graph, False
+    else:
+        df = None
 
     # data ready.
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
 
-    # test if there is data
-    if df.empty:
-        logging.warning(f"{VIZ_ID} - NO DATA AVAILABLE")
-        return nodata_graph, False
-
     # if the step size is greater than window width raise Alert
     if step_size > window_width:
         return dash.no_update, True
 
-    df_final = process_data(df, patterns, threshold, window_width, step_size, start_date, end_date)
+    if built is None:
+        built = process_data(df, patterns, window_width, step_size, start_date, end_date)
+        _cache_windows(key, versions, built)
+
+    df_final = lottery_factors(*built, threshold)
 
     fig = create_figure(df_final, threshold, step_size)
 
@@ -268,7 +292,36 @@ def create_contrib_prolificacy_over_time_graph(
     return fig, False
 
 
-def process_data(df, patterns, threshold, window_width, step_size, start_date, end_date):
+# windows built per set of inputs other than the threshold, most recently used last.
+_WINDOWS = OrderedDict()
+_WINDOWS_LOCK = threading.Lock()
+
+# number of input sets whose windows are kept per process.
+WINDOWS_KEPT = 8
+
+
+def _cached_windows(key, versions):
+    """Windows built for the inputs, None if they weren't or the data has changed since."""
+    with _WINDOWS_LOCK:
+        entry = _WINDOWS.get(key)
+        if entry is None or entry[0] != versions or None in versions:
+            return None
+        _WINDOWS.move_to_end(key)
+        return entry[1]
+
+
+def _cache_windows(key, versions, built):
+    """Keeps the windows built for the inputs from the data at the given versions."""
+    if None in versions:
+        return
+    with _WINDOWS_LOCK:
+        _WINDOWS[key] = (versions, built)
+        _WINDOWS.move_to_end(key)
+        while len(_WINDOWS) > WINDOWS_KEPT:
+            _WINDOWS.popitem(last=False)
+
+
+def process_data(df, patterns, window_width, step_size, start_date, end_date):
 
     # convert to datetime objects rather than strings
     df["created_at"] = pd.to_datetime(df["created_at"], utc=True)
@@ -287,32 +340,30 @@ def process_data(df, patterns, threshold, window_width, step_size, start_date, e
         patterns_mask = df["login"].str.contains("|".join(patterns), na=False)
         df = df[~patterns_mask]
 
-    # threshold is an integer value eg. 10, 20,..., 90 since dcc.Slider only accepts integers as values
-    # divide by 100 to convert it to a decimal representation of a percentage eg. 0.10, 0.20,..., 0.90
-    threshold = threshold / 100
-
     # create bins with a size equivalent to the the step size starting from the start date up to the end date
     period_from = pd.date_range(start=start_date, end=end_date, freq=f"{step_size}m", inclusive="both")
     # store the period_from dates in a df
-    df_final = period_from.to_frame(index=False, name="period_from")
+    df_periods = period_from.to_frame(index=False, name="period_from")
     # calculate the end of each interval and store the values in a column named period_from
-    df_final["period_to"] = df_final["period_from"] + pd.DateOffset(months=window_width)
-
-    # dynamically calculate the contributor prolificacy over time for each of the action times and store results in df_final
-    (
-        df_final["Commit"],
-        df_final["Issue Opened"],
-        df_final["Issue Comment"],
-        df_final["Issue Closed"],
-        df_final["PR Opened"],
-        df_final["PR Comment"],
-        df_final["PR Review"],
-    ) = zip(
-        *df_final.apply(
-            lambda row: cntrb_prolificacy_over_time(df, row.period_from, row.period_to, window_width, threshold), axis=1
-        )
+    df_periods["period_to"] = df_periods["period_from"] + pd.DateOffset(months=window_width)
+
+    # contributions of each action type in every window, tallied for all windows at once
+    windows = LotteryWindows(
+        df["created_at"], df["cntrb_id"], df["Action"], df_periods["period_from"], df_periods["period_to"], ACTIONS
     )
 
+    return df_periods, windows
+
+
+def lottery_factors(df_periods, windows, threshold):
+
+    # threshold is an integer value eg. 10, 20,..., 90 since dcc.Slider only accepts integers as values
+    # divide by 100 to convert it to a decimal representation of a percentage eg. 0.10, 0.20,..., 0.90
+    threshold = threshold / 100
+
+    df_final = df_periods.copy()
+    df_final[ACTIONS] = windows.lottery_factor(threshold).to_numpy()
+
     return df_final
 
 
@@ -437,72 +488,3 @@ def create_figure(df_final, threshold, step_size):
     )
 
     return fig
-
-
-def cntrb_prolificacy_over_time(df, period_from, period_to, window_width, threshold):
-    # subset df such that the rows correspond to the window of time defined by period from and period to
-    time_mask = (df["created_at"] >= period_from) & (df["created_at"] <= period_to)
-    df_in_range = df.loc[time_mask]
-
-    # initialize varibles to store contributor prolificacy accoding to action type
-    commit, issueOpened, issueComment, issueClosed, prOpened, prReview, prComment = (
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-    )
-
-    # count the number of contributions each contributor has made according each action type
-    df_count_cntrbs = df_in_range.groupby(["Action", "cntrb_id"])["cntrb_id"].count().to_frame()
-    df_count_cntrbs = df_count_cntrbs.rename(columns={"cntrb_id": "count"}).reset_index()
-
-    # pivot df such that the column names correspond to the different action types, index is the cntrb_ids, and the values are the number of contributions of each contributor
-    df_count_cntrbs = df_count_cntrbs.pivot(index="cntrb_id", columns="Action", values="count")
-
-    commit = calc_lottery_factor(df_count_cntrbs, "Commit", threshold)
-    issueOpened = calc_lottery_factor(df_count_cntrbs, "Issue Opened", threshold)
-    issueComment = calc_lottery_factor(df_count_cntrbs, "Issue Comment", threshold)
-    issueClosed = calc_lottery_factor(df_count_cntrbs, "Issue Closed", threshold)
-    prOpened = calc_lottery_factor(df_count_cntrbs, "PR Opened", threshold)
-    prReview = calc_lottery_factor(df_count_cntrbs, "PR Review", threshold)
-    prComment = calc_lottery_factor(df_count_cntrbs, "PR Comment", threshold)
-
-    return commit, issueOpened, issueComment, issueClosed, prOpened, prReview, prComment
-
-
-def calc_lottery_factor(df, action_type, threshold):
-    # if the df is empty return None
-    if df.empty:
-        return None
-
-    # if the specified action type is not in the dfs' cols return None
-    if action_type not in df.columns:
-        return None
-
-    # sort rows in df based on number of contributions from greatest to least
-    df = df.sort_values(by=action_type, ascending=False)
-
-    # calculate the threshold amount of contributions
-    thresh_cntrbs = df[action_type].sum() * threshold
-
-    # drop rows where the cntrb_id is None
-    mask = df.index.get_level_values("cntrb_id") == None
-    df = df[~mask]
-
-    # initilize running sum of contributors who make up contributor prolificacy
-    lottery_factor = 0
-
-    # initialize running sum of contributions
-    running_sum = 0
-
-    for _, row in df.iterrows():
-        running_sum += row[action_type]  # update the running sum by the number of contributions a contributor has made
-        lottery_factor += 1  # update contributor prolificacy
-        # if the running sum of contributions is greater than or equal to the threshold amount, break
-        if running_sum >= thresh_cntrbs:
-            break
-
-    return lottery_factor
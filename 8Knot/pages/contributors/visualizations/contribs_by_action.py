@@ -8,7 +8,7 @@ import logging
 from dateutil.relativedelta import *  # type: ignore
 import plotly.express as px
 from pages.utils.graph_utils import get_graph_time_values, color_seq
-from queries.contributors_query import contributors_query as ctq
+from queries.contributors_query import contributor_activity
 import io
 from cache_manager.cache_manager import CacheManager as cm
 from pages.utils.job_utils import nodata_graph
@@ -158,11 +158,9 @@ def toggle_popover(n, is_open):
 def contribs_by_action_graph(repolist, interval, action, bot_switch):
 
     # wait for data to asynchronously download and become available.
+    # the bins are a month or longer, so monthly action counts suffice.
     cache = cm()
-    df = cache.grabm(func=ctq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=ctq, repos=repolist)
+    df = cache.wait_for(func=contributor_activity, repos=repolist)
 
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
@@ -192,10 +190,10 @@ def contribs_by_action_graph(repolist, interval, action, bot_switch):
 def process_data(df: pd.DataFrame, interval, action):
 
     # convert to datetime objects rather than strings
-    df["created_at"] = pd.to_datetime(df["created_at"], utc=True)
+    df["month"] = pd.to_datetime(df["month"], utc=True)
 
     # order values chronologically by COLUMN_TO_SORT_BY date
-    df = df.sort_values(by="created_at", axis=0, ascending=True)
+    df = df.sort_values(by="month", axis=0, ascending=True)
 
     # drop all contributions that are not the selected action
     df = df[df["Action"].str.contains(action)]
@@ -207,8 +205,8 @@ def create_figure(df: pd.DataFrame, interval, action):
     # time values for graph
     x_r, x_name, hover, period = get_graph_time_values(interval)
 
-    # create plotly express histogram
-    fig = px.histogram(df, x="created_at", color_discrete_sequence=[color_seq[3]])
+    # create plotly express histogram, summing the monthly action counts into the bins
+    fig = px.histogram(df, x="month", y="count", histfunc="sum", color_discrete_sequence=[color_seq[3]])
 
     # creates bins with interval size and customizes the hover value for the bars
     fig.update_traces(
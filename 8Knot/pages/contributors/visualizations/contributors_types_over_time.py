@@ -141,10 +141,7 @@ def toggle_popover(n, is_open):
 def create_contrib_over_time_graph(repolist, contribs, interval, bot_switch):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=ctq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=ctq, repos=repolist)
+    df = cache.wait_for(func=ctq, repos=repolist)
 
     start = time.perf_counter()
     logging.warning("CONTRIB_DRIVE_REPEAT_VIZ - START")
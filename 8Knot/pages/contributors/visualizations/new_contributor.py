@@ -129,10 +129,7 @@ def graph_title(view):
 def new_contributor_graph(repolist, interval, bot_switch):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=ctq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=ctq, repos=repolist)
+    df = cache.wait_for(func=ctq, repos=repolist)
 
     logging.warning("TOTAL_CONTRIBUTOR_GROWTH_VIZ - START")
     start = time.perf_counter()
@@ -133,7 +133,7 @@ def commit_count(repolist):
 
     # run query
     df = db.run_query(
-        f"""
+        """
         select
             /*commit_hash'es are unique per commit*/
             count(distinct c.cmt_commit_hash) as num_commits
@@ -141,9 +141,10 @@ def commit_count(repolist):
             augur_data.commits c,
             augur_data.repo r
         where
-            r.repo_id in ({str(repolist)[1:-1]})
+            r.repo_id = ANY(:repo_ids)
             and c.repo_id = r.repo_id
-        """
+        """,
+        {"repo_ids": repolist},
     )
 
     return df.iat[0, 0]
@@ -171,7 +172,7 @@ def commit_lines_delta(repolist):
 
     # run query
     df = db.run_query(
-        f"""
+        """
             select
                 round(avg(l_delta.lines_added), 2) as avg_lines_added, round(avg(l_delta.lines_removed), 2) as avg_lines_removed
             from
@@ -184,10 +185,11 @@ def commit_lines_delta(repolist):
                     augur_data.commits c,
                     augur_data.repo r
                 where
-                    r.repo_id in ({str(repolist)[1:-1]})
+                    r.repo_id = ANY(:repo_ids)
                     and c.repo_id = r.repo_id
                 group by c.cmt_commit_hash) as l_delta
-        """
+        """,
+        {"repo_ids": repolist},
     )
 
     return df.iat[0, 0], df.iat[0, 1]
@@ -214,7 +216,7 @@ def files_per_commit(repolist):
 
     # run query
     df = db.run_query(
-        f"""
+        """
         select
             avg(f.num_files) as avg_files
         from
@@ -225,10 +227,11 @@ def files_per_commit(repolist):
                 augur_data.commits c,
                 augur_data.repo r
             where
-                r.repo_id in ({str(repolist)[1:-1]})
+                r.repo_id = ANY(:repo_ids)
                 and c.repo_id = r.repo_id
             group by c.cmt_commit_hash) as f
-        """
+        """,
+        {"repo_ids": repolist},
     )
 
     return round(df.iat[0, 0], 2)
@@ -4,6 +4,10 @@ import os
 import time
 import logging
 import json
+import uuid
+import heapq
+import math
+from celery import group
 from celery.result import AsyncResult
 import dash_bootstrap_components as dbc
 import dash
@@ -12,26 +16,99 @@ from dash.dependencies import Input, Output, State
 from app import augur
 from flask_login import current_user
 from cache_manager.cache_manager import CacheManager as cm
+from cache_manager.repo_stats import RepoStats
 from queries.issues_query import issues_query as iq
 from queries.commits_query import commits_query as cq
-from queries.contributors_query import contributors_query as cnq
+from queries.contributors_query import contributors_query as cnq, contributor_activity
 from queries.prs_query import prs_query as prq
-from queries.company_query import company_query as cmq
+from queries.company_query import company_query as cmq, company_names
 from queries.pr_assignee_query import pr_assignee_query as praq
 from queries.issue_assignee_query import issue_assignee_query as iaq
 from queries.user_groups_query import user_groups_query as ugq
+from queries.repo_stats_query import schedule_repo_stats
 from queries.pr_response_query import pr_response_query as prr
 from queries.release_frequency_query import release_frequency_query as rfq
 from queries.change_request_closure_ratio_query import change_request_closure_ratio_query as crcrq
 from queries.issues_closed_query import issues_closed_query as icq
 from queries.issues_updated_query import issues_updated_query as iuq
 from queries.change_requests_accepted_query import change_requests_accepted_query as craq
+from queries.repo_files_query import repo_files_query as rfiq
+from queries.cntrb_per_file_query import cntrb_per_file_query as cpfq
+from pages.utils.query_registry import page_queries, prefetch_queries
 import redis
+from _redis_pools import users_client
 import flask
 
 
-# list of queries to be run
-QUERIES = [iq, cq, cnq, prq, cmq, iaq, praq, prr, rfq, crcrq, icq, iuq, craq]
+# queries to be run, by function name. Which of them a search runs depends on
+# the page that's open, see pages/utils/query_registry.py.
+QUERIES = {
+    "issues_query": iq,
+    "commits_query": cq,
+    "contributors_query": cnq,
+    "prs_query": prq,
+    "company_query": cmq,
+    "issue_assignee_query": iaq,
+    "pr_assignee_query": praq,
+    "pr_response_query": prr,
+    "release_frequency_query": rfq,
+    "change_request_closure_ratio_query": crcrq,
+    "issues_closed_query": icq,
+    "issues_updated_query": iuq,
+    "change_requests_accepted_query": craq,
+    "repo_files_query": rfiq,
+    "cntrb_per_file_query": cpfq,
+}
+
+# results that queries cache next to their own, by query function name.
+# A query is run for repos missing any of them.
+QUERY_OUTPUTS = {
+    "contributors_query": [contributor_activity],
+    "company_query": [company_names],
+}
+
+# whether a search also fetches the queries of the pages that aren't open, in the background.
+PREFETCH = os.getenv("QUERY_PREFETCH", "True") == "True"
+
+# Celery priorities of query jobs, 0 is the highest. The open page's queries
+# go ahead of prefetches and refreshes queued by any search.
+VISIBLE_PRIORITY = 0
+PREFETCH_PRIORITY = 6
+
+# queries that can merge newer rows into cached results instead of refetching them
+REFRESHABLE_QUERIES = ["issues_query", "commits_query"]
+
+# seconds after which cached results of REFRESHABLE_QUERIES are refreshed in the background, 0 to disable.
+REFRESH_AFTER = int(os.getenv("CACHE_REFRESH_AFTER", "86400"))
+
+# estimated result rows of a query job, repos are split into shards of about
+# this many rows that are fetched in parallel by the query workers.
+SHARD_ROWS = int(os.getenv("QUERY_SHARD_ROWS", "500000"))
+
+# shards a query's repos are split into at most, per search.
+MAX_SHARDS = int(os.getenv("QUERY_MAX_SHARDS", "16"))
+
+# estimated result rows per repo and query, used for repos without statistics.
+DEFAULT_REPO_ROWS = 5000
+
+# repo statistic that a query's result rows scale with, by query function name. See RepoStats.
+QUERY_SIZE_STATS = {
+    "issues_query": "issues",
+    "commits_query": "commits",
+    "contributors_query": "contributor_actions",
+    "prs_query": "prs",
+    "company_query": "contributor_actions",
+    "issue_assignee_query": "issues",
+    "pr_assignee_query": "prs",
+    "pr_response_query": "prs",
+    "change_request_closure_ratio_query": "prs",
+    "issues_closed_query": "issues",
+    "issues_updated_query": "issues",
+    "change_requests_accepted_query": "prs",
+}
+
+# selections with more contributor actions than this are flagged in the search bar as slow to load.
+LARGE_SELECTION_ACTIONS = int(os.getenv("LARGE_SELECTION_ACTIONS", "5000000"))
 
 # check if login has been enabled in config
 login_enabled = os.getenv("AUGUR_LOGIN_ENABLED", "False") == "True"
@@ -57,13 +134,9 @@ def kick_off_group_collection(url, n_clicks):
     """
     if current_user.is_authenticated:
         user_id = current_user.get_id()
-        users_cache = redis.StrictRedis(
-            host=os.getenv("REDIS_SERVICE_USERS_HOST", "redis-users"),
-            port=6379,
-            password=os.getenv("REDIS_PASSWORD", ""),
-        )
+        users_cache = users_client()
         try:
-            users_cache.ping()
+            groups_cached = users_cache.exists(f"{user_id}_groups")
         except redis.exceptions.ConnectionError:
             logging.error("GROUP-COLLECTION: Could not connect to users-cache.")
             return dash.no_update
@@ -71,7 +144,7 @@ def kick_off_group_collection(url, n_clicks):
         # TODO: check how old groups are. If they're pretty old (threshold tbd) then requery
 
         # check if groups are not already cached, or if the refresh-button was pressed
-        if not users_cache.exists(f"{user_id}_groups") or (dash.ctx.triggered_id == "refresh-button"):
+        if not groups_cached or (dash.ctx.triggered_id == "refresh-button"):
             # kick off celery task to collect groups
             # on query worker queue,
             return [ugq.apply_async(args=[user_id], queue="data").id]
@@ -127,20 +200,14 @@ def login_username_button(url):
         if current_user.is_authenticated:
             logging.warning(f"LOGINBUTTON: USER LOGGED IN {current_user}")
             # TODO: implement more permanent interface
-            users_cache = redis.StrictRedis(
-                host=os.getenv("REDIS_SERVICE_USERS_HOST", "redis-users"),
-                port=6379,
-                password=os.getenv("REDIS_PASSWORD", ""),
-            )
+            users_cache = users_client()
+            user_id = current_user.get_id()
             try:
-                users_cache.ping()
+                user_info = json.loads(users_cache.get(user_id))
             except redis.exceptions.ConnectionError:
                 logging.error("USERNAME: Could not connect to users-cache.")
                 return dash.no_update
 
-            user_id = current_user.get_id()
-            user_info = json.loads(users_cache.get(user_id))
-
             navlink = [
                 dbc.NavItem(
                     dbc.NavLink(
@@ -187,21 +254,11 @@ def dynamic_multiselect_options(user_in: str, selections):
     if current_user.is_authenticated:
         logging.warning(f"LOGINBUTTON: USER LOGGED IN {current_user}")
         # TODO: implement more permanent interface
-        users_cache = redis.StrictRedis(
-            host=os.getenv("REDIS_SERVICE_USERS_HOST", "redis-users"),
-            port=6379,
-            password=os.getenv("REDIS_PASSWORD", ""),
-            decode_responses=True,
-        )
-        try:
-            users_cache.ping()
-        except redis.exceptions.ConnectionError:
-            logging.error("MULTISELECT: Could not connect to users-cache.")
-            return dash.no_update
-
+        users_cache = users_client(decode_responses=True)
         try:
-            if users_cache.exists(f"{current_user.get_id()}_group_options"):
-                options = options + json.loads(users_cache.get(f"{current_user.get_id()}_group_options"))
+            group_options = users_cache.get(f"{current_user.get_id()}_group_options")
+            if group_options:
+                options = options + json.loads(group_options)
         except redis.exceptions.ConnectionError:
             logging.error("Searchbar: couldn't connect to Redis for user group options.")
 
@@ -256,21 +313,11 @@ def multiselect_values_to_repo_ids(n_clicks, user_vals):
     if current_user.is_authenticated:
         logging.warning(f"LOGINBUTTON: USER LOGGED IN {current_user}")
         # TODO: implement more permanent interface
-        users_cache = redis.StrictRedis(
-            host=os.getenv("REDIS_SERVICE_USERS_HOST", "redis-users"),
-            port=6379,
-            password=os.getenv("REDIS_PASSWORD", ""),
-            decode_responses=True,
-        )
+        users_cache = users_client(decode_responses=True)
         try:
-            users_cache.ping()
-        except redis.exceptions.ConnectionError:
-            logging.error("SEARCH-BUTTON: Could not connect to users-cache.")
-            return dash.no_update
-
-        try:
-            if users_cache.exists(f"{current_user.get_id()}_groups"):
-                user_groups = json.loads(users_cache.get(f"{current_user.get_id()}_groups"))
+            groups = users_cache.get(f"{current_user.get_id()}_groups")
+            if groups:
+                user_groups = json.loads(groups)
                 logging.warning(f"USERS Groups: {type(user_groups)}, {user_groups}")
         except redis.exceptions.ConnectionError:
             logging.error("Searchbar: couldn't connect to Redis for user group options.")
@@ -284,7 +331,34 @@ def multiselect_values_to_repo_ids(n_clicks, user_vals):
     all_repo_ids = list(set().union(*[repos, org_repos, group_repos]))
     logging.warning(f"SELECTED_REPOS: {all_repo_ids}")
 
-    return "", all_repo_ids
+    return _selection_warning(all_repo_ids), all_repo_ids
+
+
+def _selection_warning(repo_ids):
+    """Warns about selections that take long to load, estimated by the repo statistics.
+
+    Args:
+        repo_ids ([int]): selected repos
+
+    Returns:
+        dbc.Alert | str: warning, or "" if the selection isn't large or there are no statistics.
+    """
+    try:
+        totals = RepoStats().totals(repo_ids)
+    except redis.exceptions.ConnectionError:
+        logging.error("Searchbar: couldn't connect to Redis for repo statistics.")
+        return ""
+
+    if totals["contributor_actions"] <= LARGE_SELECTION_ACTIONS:
+        return ""
+
+    return dbc.Alert(
+        f"Large selection: {len(repo_ids)} repos with about {totals['commits']:,} commits, "
+        f"{totals['prs']:,} PRs, {totals['issues']:,} issues and {totals['contributor_actions']:,} "
+        "contributor actions. Data that isn't cached yet may take several minutes to load.",
+        color="warning",
+        dismissable=True,
+    )
 
 
 @callback(
@@ -351,8 +425,8 @@ def wait_queries(job_ids):
     # default 'result_expires' for celery config is 86400 seconds.
     # so we don't have to check if the jobs exist. if this tasks
     # is enqueued 24 hours after the query-worker tasks finish
-    # then we have a big problem. However, we should 'forget' all
-    # results before we exit.
+    # then we have a big problem. Results aren't 'forgotten' here,
+    # other searches may be waiting on the same jobs; they expire.
 
     while True:
         logging.warning([j.status for j in jobs])
@@ -360,16 +434,12 @@ def wait_queries(job_ids):
         # jobs are either all ready
         if all(j.successful() for j in jobs):
             logging.warning([j.status for j in jobs])
-            jobs = [j.forget() for j in jobs]
             return "Data Ready", "#b5b683"
 
         # or one of them has failed
         if any(j.failed() for j in jobs):
-            # if a job fails, we need to wait for the others to finish before
-            # we can 'forget' them. otherwise to-be-successful jobs will always
-            # be forgotten if one fails.
-
-            # tasks need to have either failed or succeeded before being forgotten.
+            # if a job fails, we wait for the others to finish so that
+            # the data they fetch is cached before the user retries.
             while True:
                 num_succeeded = [j.successful() for j in jobs].count(True)
                 num_failed = [j.failed() for j in jobs].count(True)
@@ -380,7 +450,6 @@ def wait_queries(job_ids):
 
                 time.sleep(4.0)
 
-            jobs = [j.forget() for j in jobs]
             return "Data Incomplete- Retry", "danger"
 
         # pause to let something change
@@ -389,35 +458,189 @@ def wait_queries(job_ids):
 
 @callback(
     Output("job-ids", "data"),
-    Input("repo-choices", "data"),
+    [Input("repo-choices", "data"), Input("url", "pathname")],
 )
-def run_queries(repos):
+def run_queries(repos, pathname):
     """
     Executes queries defined in /queries against Augur
     instance for input Repos; caches results in redis per
     (query_function,repo) pair.
 
+    Only the queries that the open page's visualizations read are
+    waited for, see pages/utils/query_registry.py. They're run again
+    when another page is opened. A new search also prefetches the
+    queries of the other pages at a lower priority, unless disabled
+    with QUERY_PREFETCH.
+
+    Repos that another search's job is already fetching aren't
+    fetched again, the search waits for that job instead.
+
+    The rest are split into shards of similar estimated size that are
+    dispatched as a Celery group, so large selections are fetched by
+    all query workers at once.
+
     Args:
         repos ([int]): repositories we collect data for.
+        pathname (str): URL path of the open page.
+
+    Returns:
+        [str]: ids of the jobs the open page's visualizations wait for.
     """
+    if not repos:
+        return []
+
+    # rebuild the repo statistics in the background if they're outdated
+    schedule_repo_stats()
 
     # cache manager object
     cache = cm()
 
-    # list of queries to process
-    funcs = QUERIES
+    # ids of the jobs the search waits for
+    jobs = []
+    for name in page_queries(pathname):
+        jobs.extend(j for j in _dispatch(cache, name, repos, VISIBLE_PRIORITY) if j not in jobs)
+
+    # visiting another page doesn't prefetch again, the search already did.
+    if PREFETCH and dash.ctx.triggered_id == "repo-choices":
+        for name in prefetch_queries(pathname):
+            _dispatch(cache, name, repos, PREFETCH_PRIORITY)
+
+    return jobs
+
+
+def _dispatch(cache, name, repos, priority):
+    """Fetches the repos a query hasn't cached yet.
+
+    Args:
+        cache (CacheManager): cache manager object
+        name (str): query function name, one of QUERIES
+        repos ([int]): repositories we collect data for.
+        priority (int): Celery priority of the query jobs
+
+    Returns:
+        [str]: ids of the jobs fetching the missing repos, including jobs of other searches.
+    """
+    f = QUERIES[name]
+    outputs = [f] + QUERY_OUTPUTS.get(name, [])
+
+    # only download repos that aren't currently in cache
+    missing = set().union(*(cache.missingm(o, repos) for o in outputs))
+    not_ready = [r for r in repos if r in missing]
+
+    # keep the cached repos from being evicted or expiring
+    # before the visualizations have read them.
+    cached = [r for r in repos if r not in missing]
+    for o in outputs:
+        cache.touchm(o, cached)
+
+    # lease the missing repos of each shard to a new job. Repos already
+    # leased to a job of another search are left to that job.
+    shards, attached = [], set()
+    for shard in _shard_repos(not_ready, _repo_weights(name, not_ready)):
+        job_id = str(uuid.uuid4())
+        owners = cache.claimm(f, shard, job_id)
+        claimed = [r for r, o in zip(shard, owners) if o == job_id]
+        if claimed:
+            shards.append((job_id, claimed))
+        attached.update(o for o in owners if o != job_id)
 
-    # list of job promises
     jobs = []
+    if shards:
+        # add jobs to queue
+        try:
+            g = group(
+                f.s(claimed).set(queue="data", task_id=job_id, priority=priority) for job_id, claimed in shards
+            ).apply_async()
+        except Exception:
+            for job_id, claimed in shards:
+                cache.releasem(f, claimed, job_id)
+            raise
+
+        # wait for the new jobs
+        jobs.extend(j.id for j in g.results)
+
+    # attach to the jobs fetching the rest
+    jobs.extend(attached - set(jobs))
+
+    # bring old results up to date. Visualizations don't wait for
+    # this, they use the cached data in the meantime.
+    if name in REFRESHABLE_QUERIES and REFRESH_AFTER > 0:
+        stale = cache.stalem(f, cached, REFRESH_AFTER)
+
+        # lease the stale repos like the fetches above, so repos that another
+        # search is already refreshing aren't refreshed a second time.
+        job_id = str(uuid.uuid4())
+        claimed = [r for r, o in zip(stale, cache.claimm(f, stale, job_id)) if o == job_id]
+        if claimed:
+            try:
+                f.apply_async(
+                    args=[claimed],
+                    kwargs={"refresh": True},
+                    queue="data",
+                    task_id=job_id,
+                    priority=PREFETCH_PRIORITY,
+                )
+            except Exception:
+                cache.releasem(f, claimed, job_id)
+                raise
+
+    return jobs
+
+
+def _repo_weights(name, repos):
+    """Estimated result rows of a query per repo.
+
+    Taken from the repo statistic the query scales with, DEFAULT_REPO_ROWS
+    for repos without statistics and queries that don't scale with one.
 
-    for f in funcs:
-        # only download repos that aren't currently in cache
-        not_ready = [r for r in repos if cache.exists(f, r) != 1]
+    Args:
+        name (str): query function name
+        repos ([int]): repo_ids
+
+    Returns:
+        dict{int: float}: estimated rows per repo
+    """
+    stat = QUERY_SIZE_STATS.get(name)
+    if stat is None or not repos:
+        return {r: DEFAULT_REPO_ROWS for r in repos}
+
+    try:
+        counts = RepoStats().getm(stat, repos)
+    except redis.exceptions.ConnectionError:
+        logging.error("DISPATCH: couldn't connect to Redis for repo statistics.")
+        counts = [None] * len(repos)
+
+    # every repo costs a little even if it's empty
+    return {r: DEFAULT_REPO_ROWS if c is None else max(c, 1) for r, c in zip(repos, counts)}
+
+
+def _shard_repos(repos, weights):
+    """Splits repos into shards of similar estimated size.
+
+    Every shard gets about SHARD_ROWS estimated rows, at most MAX_SHARDS
+    shards are made. Repos are assigned largest first to the currently
+    smallest shard, so no shard exceeds the average by more than its
+    largest repo.
+
+    Args:
+        repos ([int]): repo_ids
+        weights (dict{int: float}): estimated rows per repo
+
+    Returns:
+        [[int]]: non-empty shards of repo_ids
+    """
+    if not repos:
+        return []
 
-        # add job to queue
-        j = f.apply_async(args=[not_ready], queue="data")
+    total = sum(weights[r] for r in repos)
+    n_shards = max(1, min(MAX_SHARDS, len(repos), math.ceil(total / SHARD_ROWS)))
 
-        # add job promise to local promise list
-        jobs.append(j)
+    # (estimated rows, shard index), smallest shard on top
+    heap = [(0, i) for i in range(n_shards)]
+    shards = [[] for _ in range(n_shards)]
+    for r in sorted(repos, key=lambda r: weights[r], reverse=True):
+        rows, i = heapq.heappop(heap)
+        shards[i].append(r)
+        heapq.heappush(heap, (rows + weights[r], i))
 
-    return [j.id for j in jobs]
+    return [s for s in shards if s]
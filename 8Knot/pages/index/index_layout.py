@@ -116,7 +116,9 @@ navbar = dbc.Navbar(
                                     ),
                                     dbc.NavLink("CHAOSS", href="/chaoss", active="exact"),
                                     # added:
-                                    dbc.NavLink("Project Starter Health", href="/project_starter_health", active="exact"),
+                                    dbc.NavLink(
+                                        "Project Starter Health", href="/project_starter_health", active="exact"
+                                    ),
                                     dbc.NavLink("Project Engagement", href="/project_engagement", active="exact"),
                                     dbc.NavLink("Info", href="/info", active="exact"),
                                 ],
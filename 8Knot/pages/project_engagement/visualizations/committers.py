@@ -56,16 +56,16 @@ gc_committers = dbc.Card(
                                 ),
                                 dbc.Col(
                                     [
-                                        html.Div([
-                                            dcc.Dropdown(
-                                                id=f"action-dropdown-{PAGE}-{VIZ_ID}",
-                                                value="Commit",
-                                                clearable=False,
-                                            )
-                                            ], style= {'display': 'none'}
+                                        html.Div(
+                                            [
+                                                dcc.Dropdown(
+                                                    id=f"action-dropdown-{PAGE}-{VIZ_ID}",
+                                                    value="Commit",
+                                                    clearable=False,
+                                                )
+                                            ],
+                                            style={"display": "none"},
                                         ),
-                                        
-
                                         dbc.Alert(
                                             children="""No contributions of this type have been made.\n
                                             Please select a different contribution type.""",
@@ -152,10 +152,7 @@ def committers_graph(repolist, interval, action, bot_switch):
 
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=ctq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=ctq, repos=repolist)
+    df = cache.wait_for(func=ctq, repos=repolist)
 
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
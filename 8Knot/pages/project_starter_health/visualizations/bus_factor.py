@@ -216,10 +216,7 @@ def graph_title(k, action_type):
 def create_top_k_cntrbs_graph(repolist, action_type, top_k, patterns, start_date, end_date):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=ctq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=ctq, repos=repolist)
+    df = cache.wait_for(func=ctq, repos=repolist)
 
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
@@ -312,4 +309,4 @@ def create_figure(df: pd.DataFrame, action_type):
     # add legend title
     fig.update_layout(legend_title_text="Contributor ID")
 
-    return fig
\ No newline at end of file
+    return fig
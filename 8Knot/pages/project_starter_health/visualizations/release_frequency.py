@@ -117,10 +117,7 @@ def toggle_popover(n, is_open):
 def releases_over_time_graph(repolist, interval):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=rfq, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=rfq, repos=repolist)
+    df = cache.wait_for(func=rfq, repos=repolist)
 
     print(df)
 
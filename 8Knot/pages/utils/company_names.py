@@ -0,0 +1,192 @@
+"""
+    Canonical names of the companies contributors list on their profiles.
+
+    The same company is spelled many ways ("Red Hat", "Red Hat, Inc.",
+    "@redhat"), so names are grouped before contributions are counted per
+    company. Comparing every name with every other one is quadratic, and
+    an org-wide selection lists thousands of distinct names.
+
+    CompanyIndex normalizes the names to keys first, which merges spellings
+    that only differ in case, punctuation or a legal suffix. The keys are
+    then blocked by their character trigrams: only keys that share a
+    trigram are ever compared, and the trigrams they share are counted for
+    all candidate pairs at once. Two keys match if the shared trigrams make
+    up a large enough part of the shorter key, i.e. it (nearly) appears
+    within the longer one.
+"""
+import unicodedata
+import numpy as np
+import pandas as pd
+
+# tokens that don't tell companies apart, dropped from the keys.
+LEGAL_SUFFIXES = {
+    "ag",
+    "bv",
+    "co",
+    "company",
+    "corp",
+    "corporation",
+    "gmbh",
+    "inc",
+    "incorporated",
+    "limited",
+    "llc",
+    "ltd",
+    "plc",
+    "sa",
+    "the",
+}
+
+# trigrams shared by more keys than this are too common to block on, e.g. " co".
+# They're left out of blocking and scoring alike.
+DEFAULT_MAX_BLOCK = 500
+
+
+def normalize(names):
+    """Keys of company names: lowercase ASCII words without punctuation or legal suffixes.
+
+    Args:
+    -----
+        names (pd.Series): company names
+
+    Returns:
+    --------
+        pd.Series: key of each name, NaN where nothing is left of it
+    """
+    names = pd.Series(names, dtype=object)
+    keys = {}
+    for name in names.dropna().unique():
+        ascii_name = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode()
+        words = "".join(c if c.isalnum() else " " for c in ascii_name.lower()).split()
+        keys[name] = " ".join(w for w in words if w not in LEGAL_SUFFIXES) or np.nan
+    return names.map(keys)
+
+
+def _trigrams(key):
+    """Character trigrams of a key, padded so that its start and end are trigrams too."""
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class CompanyIndex:
+    """
+    Company names grouped by normalized key, with trigram overlaps between keys.
+
+    Attributes
+    ----------
+        _names : (private) distinct names, heaviest first
+
+        _key_codes : (private) key of each of _names, -1 for names without a key
+
+        _key_weights : (private) summed weight of each key
+
+        _pairs : (private) candidate (key, key) pairs, as two arrays
+
+        _overlap : (private) share of the shorter key's trigrams that each pair shares
+
+    Methods
+    -------
+        canonical(threshold) :
+            Canonical name of each company name.
+    """
+
+    def __init__(self, names, weights=None, max_block=DEFAULT_MAX_BLOCK):
+        """
+        Args:
+        -----
+            names (pd.Series): company name of each row, nulls are ignored
+            weights (pd.Series | np.ndarray | None): weight of each row, e.g. its contributions. 1 per row if None.
+            max_block (int): trigrams shared by more keys are ignored
+        """
+        names = pd.Series(names, dtype=object).reset_index(drop=True)
+        weights = np.ones(len(names)) if weights is None else np.asarray(weights, dtype=float)
+        valid = names.notna().to_numpy()
+        totals = pd.Series(weights[valid]).groupby(names[valid].to_numpy(), sort=False).sum()
+
+        # heaviest names first, ties by name so the result doesn't depend on the row order.
+        totals = totals.sort_index(kind="stable").sort_values(ascending=False, kind="stable")
+        self._names = totals.index.to_numpy(dtype=object)
+
+        key_codes, keys = pd.factorize(normalize(pd.Series(self._names)), sort=False)
+        self._key_codes = key_codes.astype(np.int64)
+        known = self._key_codes >= 0
+        self._key_weights = np.bincount(self._key_codes[known], weights=totals.to_numpy()[known], minlength=len(keys))
+
+        # inverted index: (trigram, key) entries, grouped by trigram.
+        trigram_sets = [_trigrams(k) for k in keys]
+        lengths = np.array([len(t) for t in trigram_sets], dtype=np.int64)
+        key_of_entry = np.repeat(np.arange(len(keys), dtype=np.int64), lengths)
+        tri_codes, _ = pd.factorize(pd.Series([t for ts in trigram_sets for t in ts], dtype=object))
+        tri_codes = tri_codes.astype(np.int64)
+
+        # drop the trigrams too common to block on.
+        block_sizes = np.bincount(tri_codes, minlength=1)
+        kept = block_sizes[tri_codes] <= max_block
+        tri_codes, key_of_entry = tri_codes[kept], key_of_entry[kept]
+        kept_lengths = np.bincount(key_of_entry, minlength=len(keys))
+
+        order = np.lexsort((key_of_entry, tri_codes))
+        tri_codes, key_of_entry = tri_codes[order], key_of_entry[order]
+
+        # every pair of entries within a block is a candidate pair; a pair
+        # appears once per trigram its keys share.
+        block_starts = np.flatnonzero(np.r_[True, tri_codes[1:] != tri_codes[:-1]]) if len(tri_codes) else []
+        block_bounds = np.r_[block_starts, len(tri_codes)].astype(np.int64)
+        sizes = np.diff(block_bounds)
+        left, right = [], []
+        for size in np.unique(sizes[sizes > 1]):
+            # blocks of the same size are expanded together.
+            starts = block_bounds[:-1][sizes == size]
+            i, j = np.triu_indices(size, k=1)
+            left.append(key_of_entry[(starts[:, None] + i).ravel()])
+            right.append(key_of_entry[(starts[:, None] + j).ravel()])
+        left = np.concatenate(left) if left else np.empty(0, dtype=np.int64)
+        right = np.concatenate(right) if right else np.empty(0, dtype=np.int64)
+
+        pair, shared = np.unique(left * len(keys) + right, return_counts=True)
+        a, b = pair // max(len(keys), 1), pair % max(len(keys), 1)
+        overlap = shared / np.minimum(kept_lengths[a], kept_lengths[b])
+
+        self._pairs = (a, b)
+        self._overlap = overlap
+
+    def canonical(self, threshold=0.7):
+        """Canonical name of each company name.
+
+        Keys are grouped greedily, heaviest first: a key that isn't in a
+        group yet starts one, and takes in the keys it matches that aren't
+        in one either. A group is named after the most common spelling of
+        its heaviest key. Names without a key are their own canonical names.
+
+        Args:
+        -----
+            threshold (float): share of the shorter key's trigrams two keys must share to match, 0 to 1
+
+        Returns:
+        --------
+            pd.Series: canonical name, indexed by company name
+        """
+        n_keys = len(self._key_weights)
+        match = self._overlap >= threshold
+        a, b = self._pairs[0][match], self._pairs[1][match]
+        src, dst = np.r_[a, b], np.r_[b, a]
+        order = np.argsort(src, kind="stable")
+        src, dst = src[order], dst[order]
+        bounds = np.searchsorted(src, np.arange(n_keys + 1))
+
+        # heaviest keys first, ties by the position of their heaviest name.
+        first_name = np.full(n_keys, len(self._names), dtype=np.int64)
+        known = self._key_codes >= 0
+        np.minimum.at(first_name, self._key_codes[known], np.flatnonzero(known))
+        leader = np.full(n_keys, -1, dtype=np.int64)
+        for k in np.lexsort((first_name, -self._key_weights)):
+            if leader[k] >= 0:
+                continue
+            neighbours = dst[bounds[k] : bounds[k + 1]]
+            leader[neighbours[leader[neighbours] < 0]] = k
+            leader[k] = k
+
+        # names are sorted heaviest first, so a key's first name is its most common spelling.
+        canonical = self._names.copy()
+        canonical[known] = self._names[first_name[leader[self._key_codes[known]]]]
+        return pd.Series(canonical, index=self._names)
@@ -0,0 +1,227 @@
+"""
+    Counts of items (issues, PRs, ...) that are open at each of many dates.
+
+    An item is open at a date if it was created at or before the date and
+    wasn't closed at or before it. Rather than filtering the whole frame
+    once per date, IntervalState sorts the created and closed times once
+    and answers every date by binary search, so a chart sampled daily over
+    many years costs O((items + dates) * log(items)) instead of
+    O(items * dates).
+
+    period_sums does the same for per-label sums over a series of periods,
+    e.g. assignments per assignee and month.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _ns(values):
+    """UTC nanoseconds since the epoch of datetimes, and which of them aren't NaT."""
+    ts = pd.to_datetime(pd.Series(values), utc=True).to_numpy(dtype="datetime64[ns]")
+    return ts.view("int64"), ~np.isnat(ts)
+
+
+class IntervalState:
+    """
+    Open/closed state of a set of items over time.
+
+    Items without a creation time are ignored. Items closed before they
+    were created (bad data) are treated as closed when they were created,
+    i.e. never open.
+
+    Attributes
+    ----------
+        _created : (private) creation times in ns, sorted
+
+        _closed : (private) close times in ns of the closed items, sorted
+
+        _closed_ranks : (private) position in _created of each item of _closed
+
+    Methods
+    -------
+        open_at(dates) :
+            Number of items open at each date.
+
+        open_created_by(dates, cutoffs, inclusive) :
+            Number of items open at each date that were created before a cutoff.
+
+        staleness(dates, staling_interval, stale_interval) :
+            Items open at each date, split into new, staling and stale.
+    """
+
+    def __init__(self, created, closed):
+        """
+        Args:
+        -----
+            created (pd.Series): creation time of each item
+            closed (pd.Series): close time of each item, NaT if it's still open
+        """
+        cr, cr_valid = _ns(created)
+        cl, cl_valid = _ns(closed)
+        cr, cl, cl_valid = cr[cr_valid], cl[cr_valid], cl_valid[cr_valid]
+        cl = np.maximum(cl, cr)
+
+        order = np.argsort(cr, kind="stable")
+        self._created = cr[order]
+
+        # rank of each item by creation time, items created by a cutoff are those below
+        # the cutoff's searchsorted position in _created.
+        rank = np.empty(len(cr), dtype=np.int64)
+        rank[order] = np.arange(len(cr))
+
+        closed_order = np.argsort(cl[cl_valid], kind="stable")
+        self._closed = cl[cl_valid][closed_order]
+        self._closed_ranks = rank[cl_valid][closed_order]
+
+    def open_at(self, dates):
+        """Number of items open at each date.
+
+        Args:
+        -----
+            dates (pd.DatetimeIndex | pd.Series): sample dates
+
+        Returns:
+        --------
+            np.ndarray[int]: open items per date
+        """
+        d, _ = _ns(dates)
+        return np.searchsorted(self._created, d, side="right") - np.searchsorted(self._closed, d, side="right")
+
+    def open_created_by(self, dates, cutoffs, inclusive=False):
+        """Number of items open at each date that were created before its cutoff.
+
+        Args:
+        -----
+            dates (pd.DatetimeIndex | pd.Series): sample dates
+            cutoffs (pd.DatetimeIndex | pd.Series): creation time cutoff of each date
+            inclusive (bool): whether items created at the cutoff itself are counted
+
+        Returns:
+        --------
+            np.ndarray[int]: open items per date
+        """
+        d, _ = _ns(dates)
+        t, _ = _ns(cutoffs)
+        return self._open_below(d, np.searchsorted(self._created, t, side="right" if inclusive else "left"))
+
+    def staleness(self, dates, staling_interval, stale_interval):
+        """Items open at each date, split by how long they've been open.
+
+        New items were created at most staling_interval days before the date,
+        stale ones at least stale_interval days before it, staling ones in between.
+
+        Args:
+        -----
+            dates (pd.DatetimeIndex | pd.Series): sample dates
+            staling_interval (int): days after which an open item is staling
+            stale_interval (int): days after which an open item is stale
+
+        Returns:
+        --------
+            np.ndarray[int], np.ndarray[int], np.ndarray[int]: new, staling and stale items per date
+        """
+        d, _ = _ns(dates)
+        day = pd.Timedelta(days=1).value
+
+        # both cutoffs are answered by one pass over the closed items.
+        r_staling = np.searchsorted(self._created, d - staling_interval * day, side="left")
+        r_stale = np.searchsorted(self._created, d - stale_interval * day, side="right")
+        counts = self._open_below(np.concatenate([d, d]), np.concatenate([r_staling, r_stale]))
+        before_staling, stale = counts[: len(d)], counts[len(d) :]
+
+        # with stale_interval <= staling_interval nothing is staling.
+        if stale_interval <= staling_interval:
+            stale = before_staling
+
+        return self.open_at(dates) - before_staling, before_staling - stale, stale
+
+    def _open_below(self, d, r):
+        """For each i, items open at d[i] (ns) whose creation rank is below r[i].
+
+        = (created with rank below r) - (created with rank below r and closed by d)
+        """
+        k = np.searchsorted(self._closed, d, side="right")
+        return r - _prefix_counts(self._closed_ranks, k, r)
+
+
+def _prefix_counts(values, k, r):
+    """For each i, how many of values[:k[i]] are less than r[i].
+
+    Every prefix [0, k) is a union of aligned blocks, one per set bit of k.
+    The blocks of each size 2**L are sorted once and answer their part of
+    every query with one searchsorted.
+
+    Args:
+    -----
+        values (np.ndarray[int]): distinct non-negative ints
+        k (np.ndarray[int]): prefix lengths
+        r (np.ndarray[int]): exclusive upper bounds
+
+    Returns:
+    --------
+        np.ndarray[int]: counts per query
+    """
+    n = len(values)
+    out = np.zeros(len(k), dtype=np.int64)
+    if n == 0:
+        return out
+
+    # keys of block b are b * span + value, so one sorted array holds every block in order.
+    span = np.int64(max(int(values.max()), int(r.max(initial=0))) + 1)
+    position = np.arange(n, dtype=np.int64)
+
+    size = 1
+    while size <= n:
+        covered = (k // size) % 2 == 1
+        if covered.any():
+            keys = np.sort((position // size) * span + values)
+            b = k[covered] // size - 1
+            out[covered] += np.searchsorted(keys, b * span + r[covered], side="left") - b * size
+        size *= 2
+
+    return out
+
+
+def period_sums(labels, weights, since, until, starts, ends, columns):
+    """Sum of the weights of the rows that are active in each period, per label.
+
+    A row counts towards a period if it became active by the period's end
+    and didn't stop before the period's start, i.e. ends[p] >= since and
+    starts[p] < until. Each row therefore covers a run of consecutive
+    periods; its weight is added at the run's first period and taken out
+    after its last, and a cumulative sum over the periods sweeps up the
+    whole (period, label) matrix at once.
+
+    Args:
+    -----
+        labels (pd.Series): label of each row, rows with other labels are ignored
+        weights (np.ndarray): weight of each row
+        since (pd.Series): time each row became active, rows with NaT are ignored
+        until (pd.Series): time each row stopped being active, NaT if it still is
+        starts (pd.Series | pd.DatetimeIndex): start of each period, ascending
+        ends (pd.Series | pd.DatetimeIndex): end of each period, ascending
+        columns ([str]): labels to sum for
+
+    Returns:
+    --------
+        np.ndarray: shape (len(starts), len(columns)), summed weights per period and label
+    """
+    s, _ = _ns(starts)
+    e, _ = _ns(ends)
+    a, a_valid = _ns(since)
+    u, u_valid = _ns(until)
+    codes = pd.Index(columns).get_indexer(pd.Series(labels)).astype(np.int64)
+
+    keep = a_valid & (codes >= 0)
+    codes, weights, a, u, u_valid = codes[keep], np.asarray(weights)[keep], a[keep], u[keep], u_valid[keep]
+
+    # run of periods [first, stop) each row covers
+    first = np.searchsorted(e, a, side="left")
+    stop = np.where(u_valid, np.searchsorted(s, u, side="left"), len(s))
+    stop = np.maximum(stop, first)
+
+    n = len(s) + 1
+    diff = np.bincount(codes * n + first, weights=weights, minlength=len(columns) * n)
+    diff -= np.bincount(codes * n + stop, weights=weights, minlength=len(columns) * n)
+
+    return np.cumsum(diff.reshape(len(columns), n), axis=1)[:, :-1].T
@@ -0,0 +1,134 @@
+"""
+    Lottery factor of each action type over sliding time windows.
+
+    The lottery factor of a set of contributions is the smallest number of
+    contributors that together made at least a threshold share of them.
+
+    Rather than filtering the frame once per window, LotteryWindows tallies
+    contributions per (action, contributor, segment) once, segments being
+    the stretches of time between consecutive window bounds. Each window is
+    a run of segments, so its per-contributor counts are sums of tallies.
+    Counts are sorted and cumulated per (action, window) once, after which
+    the lottery factors of every window for any threshold are found with
+    a single searchsorted.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _ns(values):
+    """UTC nanoseconds since the epoch of datetimes, and which of them aren't NaT."""
+    ts = pd.to_datetime(pd.Series(values), utc=True).to_numpy(dtype="datetime64[ns]")
+    return ts.view("int64"), ~np.isnat(ts)
+
+
+class LotteryWindows:
+    """
+    Per-window contributor counts of each action type, sorted for lottery factors.
+
+    Attributes
+    ----------
+        actions : action types, in the order of the columns 'lottery_factor' returns
+
+        _n_windows : (private) number of windows
+
+        _group : (private) (action, window) group of each nonzero (action, window, contributor) count
+
+        _cum : (private) cumulative sum of the counts, sorted by group and descending count
+
+        _first : (private) index of each group's first entry in _cum, -1 for groups without contributions
+
+        _totals : (private) contributions per group
+
+    Methods
+    -------
+        lottery_factor(threshold) :
+            Lottery factor of each window and action type.
+    """
+
+    def __init__(self, created_at, cntrb_id, action, starts, ends, actions):
+        """
+        Args:
+        -----
+            created_at (pd.Series): time of each contribution
+            cntrb_id (pd.Series): contributor of each contribution, rows with nulls are ignored
+            action (pd.Series): action type of each contribution
+            starts (pd.Series | pd.DatetimeIndex): first moment of each window, ascending
+            ends (pd.Series | pd.DatetimeIndex): last moment of each window, inclusive and ascending
+            actions ([str]): action types to count, other actions are ignored
+        """
+        self.actions = list(actions)
+        s, _ = _ns(starts)
+        e, _ = _ns(ends)
+        n_windows = self._n_windows = len(s)
+        n_groups = len(self.actions) * n_windows
+
+        t, valid = _ns(created_at)
+        c_codes, _ = pd.factorize(pd.Series(cntrb_id), sort=False)
+        a_codes = pd.Index(self.actions).get_indexer(pd.Series(action)).astype(np.int64)
+        keep = valid & (c_codes >= 0) & (a_codes >= 0)
+        t, c_codes, a_codes = t[keep], c_codes[keep].astype(np.int64), a_codes[keep]
+        n_cntrbs = np.int64(c_codes.max() + 1 if len(c_codes) else 1)
+
+        # segments between consecutive window bounds; windows include their end.
+        edges = np.unique(np.concatenate([s, e + 1]))
+        seg = np.searchsorted(edges, t, side="right") - 1
+        inside = (seg >= 0) & (seg < len(edges) - 1)
+        t, c_codes, a_codes, seg = t[inside], c_codes[inside], a_codes[inside], seg[inside]
+
+        # contributions per (action, segment, contributor)
+        key, tally = np.unique((a_codes * len(edges) + seg) * n_cntrbs + c_codes, return_counts=True)
+        cntrb = key % n_cntrbs
+        seg = (key // n_cntrbs) % len(edges)
+        act = key // n_cntrbs // len(edges)
+
+        # every segment lies in a run of windows: those starting at or before it
+        # and ending at or after it, both bounds being ascending.
+        lo = np.searchsorted(e, edges[seg], side="left")
+        hi = np.searchsorted(s, edges[seg], side="right")
+        reps = np.maximum(hi - lo, 0)
+
+        # expand each tally to the windows containing its segment.
+        row = np.repeat(np.arange(len(key)), reps)
+        window = lo[row] + np.arange(len(row)) - np.repeat(np.cumsum(reps) - reps, reps)
+
+        # contributions per (action, window, contributor)
+        key, inverse = np.unique((act[row] * n_windows + window) * n_cntrbs + cntrb[row], return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=tally[row], minlength=len(key)).astype(np.int64)
+        group = key // n_cntrbs
+
+        # largest counts first within each group, then cumulate per group.
+        order = np.lexsort((-counts, group))
+        self._group = group[order]
+        self._cum = np.cumsum(counts[order])
+
+        self._totals = np.bincount(self._group, weights=counts[order], minlength=n_groups).astype(np.int64)
+        self._first = np.full(n_groups, -1, dtype=np.int64)
+        present = np.flatnonzero(self._totals)
+        self._first[present] = np.searchsorted(self._group, present, side="left")
+
+    def lottery_factor(self, threshold):
+        """Lottery factor of each window and action type.
+
+        Args:
+        -----
+            threshold (float): share of the contributions, 0 to 1
+
+        Returns:
+        --------
+            pd.DataFrame: one row per window, one column per action type.
+                NaN where a window has no contributions of an action type.
+        """
+        out = np.full(len(self._totals), np.nan)
+        present = np.flatnonzero(self._first >= 0)
+
+        if len(present):
+            # contributions are integers, so reaching total * threshold means reaching its ceiling.
+            needed = np.ceil(self._totals[present] * threshold).astype(np.int64)
+            before = np.where(self._first[present] > 0, self._cum[self._first[present] - 1], 0)
+
+            # first contributor at which the group's running sum reaches what's needed, counting from 1.
+            reached = np.searchsorted(self._cum, before + needed, side="left")
+            out[present] = np.maximum(reached - self._first[present], 0) + 1
+
+        return pd.DataFrame(out.reshape(len(self.actions), self._n_windows).T, columns=self.actions)
@@ -0,0 +1,126 @@
+"""
+    Registry of the queries each page's visualizations read.
+
+    A search only has to fetch the queries of the page that's on screen
+    before its visualizations can render, see 'run_queries' in
+    index_callbacks.py. The queries of the other pages are prefetched
+    behind them at a lower priority.
+
+    Queries are referred to by function name, so that this module doesn't
+    import the Celery tasks themselves.
+
+    NOTE: when a visualization is added or starts reading another query,
+    add it here. A query missing from a page is fetched once the
+    visualization waits for it, but only after the prefetch reaches it.
+"""
+
+# queries read by each visualization, by page path and the visualization's VIZ_ID.
+PAGE_QUERIES = {
+    "/": {},
+    "/info": {},
+    "/contributions": {
+        "commits-over-time": ["commits_query"],
+        "issues-over-time": ["issues_query"],
+        "issue-staleness": ["issues_query"],
+        "pr-staleness": ["prs_query"],
+        "prs-over-time": ["prs_query"],
+        "cntrib_issue-assignment": ["issue_assignee_query"],
+        "issue_assignment": ["issue_assignee_query"],
+        "pr_assignment": ["pr_assignee_query"],
+        "cntrib-pr-assignment": ["pr_assignee_query"],
+        "pr-first-response": ["pr_response_query"],
+    },
+    "/contributors/behavior": {
+        "contrib-drive-repeat": ["contributors_query"],
+        "first-time-contribution": ["contributors_query"],
+        "contrib-types-over-time": ["contributors_query"],
+        "active-drifting-contributors": ["contributors_query"],
+        "new-contributor": ["contributors_query"],
+    },
+    "/contributors/contribution_types": {
+        "contrib-activity-cycle": ["commits_query"],
+        "contribs-by-action": ["contributors_query"],
+        "contrib-importance-pie": ["contributors_query"],
+        "lottery-factor-over-time": ["contributors_query"],
+    },
+    "/affiliation": {
+        "gh-company-affiliation": ["company_query"],
+        "unique-domains": ["company_query"],
+        "company-associated-activity": ["company_query"],
+        "company-core-contributors": ["company_query"],
+        "commit-domains": ["commits_query"],
+    },
+    "/project_engagement": {
+        "issues_closed": ["issues_closed_query"],
+        "issues_updated": ["issues_updated_query"],
+        "project-engagement": ["contributors_query"],
+        "change_requests_accepted": ["change_requests_accepted_query"],
+        "committers": ["contributors_query"],
+    },
+    "/project_starter_health": {
+        "bus-factor-pie": ["contributors_query"],
+        "time_to_first_response": ["pr_response_query"],
+        "release_frequency": ["release_frequency_query"],
+        "change_request_closure_ratio": ["change_request_closure_ratio_query"],
+    },
+    "/chaoss": {
+        "project-velocity": ["contributors_query"],
+        "contrib-importance-pie": ["contributors_query"],
+    },
+    "/codebase": {
+        "cntrb-file-heatmap": ["repo_files_query", "contributors_query", "cntrb_per_file_query"],
+    },
+}
+
+# every query whose results are cached per repo, in the order they're prefetched:
+# those read by the most visualizations first, the codebase's large per-file queries last.
+PREFETCH_ORDER = [
+    "contributors_query",
+    "commits_query",
+    "prs_query",
+    "issues_query",
+    "company_query",
+    "pr_response_query",
+    "issue_assignee_query",
+    "pr_assignee_query",
+    "issues_closed_query",
+    "issues_updated_query",
+    "change_requests_accepted_query",
+    "change_request_closure_ratio_query",
+    "release_frequency_query",
+    "repo_files_query",
+    "cntrb_per_file_query",
+]
+
+
+def _page(path):
+    """Visualizations of the page at a URL path, {} for unknown paths."""
+    if not path:
+        return {}
+    return PAGE_QUERIES.get(path.rstrip("/") or "/", {})
+
+
+def page_queries(path):
+    """Queries the visualizations of a page read.
+
+    Args:
+        path (str): URL path of the page, e.g. "/contributions"
+
+    Returns:
+        [str]: query function names, each once, in PREFETCH_ORDER.
+    """
+    needed = {q for queries in _page(path).values() for q in queries}
+    return [q for q in PREFETCH_ORDER if q in needed]
+
+
+def prefetch_queries(path):
+    """Queries that no visualization of a page reads, to fetch in the background.
+
+    Args:
+        path (str | None): URL path of the page, None for all queries
+
+    Returns:
+        [str]: query function names in PREFETCH_ORDER.
+    """
+    needed = set(page_queries(path))
+    return [q for q in PREFETCH_ORDER if q not in needed]
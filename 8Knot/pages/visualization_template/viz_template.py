@@ -34,6 +34,7 @@ NOTE: IMPORTING A VISUALIZATION INTO A PAGE
 (1) Include the visualization file in the visualization folder for the respective page
 (2) Import the visualization into the page_name.py file using "from .visualizations.visualization_file_name import gc_visualization_name"
 (3) Add the card into a column in a row on the page
+(4) Register the queries the visualization reads under the page's path and VIZ_ID in pages/utils/query_registry.py
 
 NOTE: ADDITIONAL DASH COMPONENTS FOR USER GRAPH CUSTOMIZATIONS
 
@@ -191,10 +192,7 @@ def toggle_popover(n, is_open):
 def NAME_OF_VISUALIZATION_graph(repolist, interval):
     # wait for data to asynchronously download and become available.
     cache = cm()
-    df = cache.grabm(func=QUERY_INITIALS, repos=repolist)
-    while df is None:
-        time.sleep(1.0)
-        df = cache.grabm(func=QUERY_INITIALS, repos=repolist)
+    df = cache.wait_for(func=QUERY_INITIALS, repos=repolist)
 
     start = time.perf_counter()
     logging.warning(f"{VIZ_ID}- START")
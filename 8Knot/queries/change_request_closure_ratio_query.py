@@ -2,8 +2,7 @@ import logging
 import pandas as pd
 from db_manager.augur_manager import AugurManager
 from app import celery_app
-from cache_manager.cache_manager import CacheManager as cm
-import io
+from cache_manager.cache_manager import CacheManager as cm, partition_by_repo, TIMESTAMP_UTC, CATEGORY, STRING
 import datetime as dt
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -20,9 +19,21 @@ TODO:
 """
 
 QUERY_NAME = "CHANGE_REQUEST_CLOSURE_RATIO"
+# bump when the cached result changes in a way the query code alone doesn't show,
+# e.g. a schema change in Augur. Invalidates this query's cached results.
+QUERY_VERSION = 1
 
+# Arrow types of the cached columns, enforced when they're written.
+CACHE_SCHEMA = {
+    "repo_name": CATEGORY,
+    "cntrb_id": STRING,
+    "created": TIMESTAMP_UTC,
+    "closed": TIMESTAMP_UTC,
+    "merged": TIMESTAMP_UTC,
+}
 
-@celery_app.task(   
+
+@celery_app.task(
     bind=True,
     autoretry_for=(Exception,),
     exponential_backoff=2,
@@ -62,7 +73,7 @@ def change_request_closure_ratio_query(self, repos):
                         pull_requests pr
                     WHERE
                         r.repo_id = pr.repo_id AND
-                        r.repo_id in ({str(repos)[1:-1]})
+                        r.repo_id = ANY(:repo_ids)
                     """
 
     try:
@@ -77,11 +88,11 @@ def change_request_closure_ratio_query(self, repos):
         # allow retry via Celery rules.
         raise SQLAlchemyError("DBConnect failed")
 
-    df = dbm.run_query(query_string)
+    df = dbm.run_query(query_string, {"repo_ids": repos})
 
     # change to compatible type and remove all data that has been incorrectly formated
-    df["created"] = pd.to_datetime(df["created"], utc=True).dt.date
-    df = df[df.created < dt.date.today()]
+    df["created"] = pd.to_datetime(df["created"], utc=True).dt.normalize()
+    df = df[df.created < pd.Timestamp(dt.date.today(), tz="UTC")]
 
     # reformat cntrb_id
     df["cntrb_id"] = df["cntrb_id"].astype(str)
@@ -92,26 +103,9 @@ def change_request_closure_ratio_query(self, repos):
     df = df.reset_index()
     df.drop("index", axis=1, inplace=True)
 
-    # break apart returned data per repo
-    # and temporarily store in List to be
-    # stored in Redis.
-    pic = []
-    for i, r in enumerate(repos):
-        # convert series to a dataframe
-        c_df = pd.DataFrame(df.loc[df["id"] == r]).reset_index(drop=True)
-
-        # bytes buffer to be written to
-        b = io.BytesIO()
-
-        # write dataframe in feather format to BytesIO buffer
-        bs = c_df.to_feather(b)
-
-        # move head of buffer to the beginning
-        b.seek(0)
-
-        # write the bytes of the buffer into the array
-        bs = b.read()
-        pic.append(bs)
+    # split rows per repo in one pass, the slices are serialized
+    # column-by-column by the cache manager without further copies.
+    pic = partition_by_repo(df, repos)
 
     del df
 
@@ -123,7 +117,8 @@ def change_request_closure_ratio_query(self, repos):
         func=change_request_closure_ratio_query,
         repos=repos,
         datas=pic,
+        schema=CACHE_SCHEMA,
     )
 
     logging.warning(f"{QUERY_NAME}_DATA_QUERY - END")
-    return ack
\ No newline at end of file
+    return ack
@@ -1,13 +1,22 @@
 import logging
 import pandas as pd
+import pyarrow as pa
 from db_manager.augur_manager import AugurManager
 from app import celery_app
-from cache_manager.cache_manager import CacheManager as cm
-import io
+from cache_manager.cache_manager import CacheManager as cm, partition_by_repo, STRING
 import datetime as dt
 from sqlalchemy.exc import SQLAlchemyError
 
 QUERY_NAME = "CNTRB_PER_FILE"
+# bump when the cached result changes in a way the query code alone doesn't show,
+# e.g. a schema change in Augur. Invalidates this query's cached results.
+QUERY_VERSION = 1
+
+# Arrow types of the cached columns, enforced when they're written.
+CACHE_SCHEMA = {
+    "file_path": STRING,
+    "cntrb_ids": pa.list_(STRING),
+}
 
 
 @celery_app.task(
@@ -45,7 +54,7 @@ def cntrb_per_file_query(self, repos):
                     pull_request_files prf
                 WHERE
                     pr.pull_request_id = prf.pull_request_id AND
-                    pr.repo_id in ({str(repos)[1:-1]})
+                    pr.repo_id = ANY(:repo_ids)
                 GROUP BY prf.pr_file_path, pr.repo_id
                 """
 
@@ -61,7 +70,7 @@ def cntrb_per_file_query(self, repos):
         # allow retry via Celery rules.
         raise SQLAlchemyError("DBConnect failed")
 
-    df = dbm.run_query(query_string)
+    df = dbm.run_query(query_string, {"repo_ids": repos})
 
     # pandas column and format updates
     df["cntrb_ids"] = df["cntrb_ids"].str.split(",")
@@ -78,24 +87,9 @@ def cntrb_per_file_query(self, repos):
 
     """
 
-    pic = []
-
-    for i, r in enumerate(repos):
-        # convert series to a dataframe
-        c_df = pd.DataFrame(df.loc[df["id"] == r]).reset_index(drop=True)
-
-        # bytes buffer to be written to
-        b = io.BytesIO()
-
-        # write dataframe in feather format to BytesIO buffer
-        bs = c_df.to_feather(b)
-
-        # move head of buffer to the beginning
-        b.seek(0)
-
-        # write the bytes of the buffer into the array
-        bs = b.read()
-        pic.append(bs)
+    # split rows per repo in one pass, the slices are serialized
+    # column-by-column by the cache manager without further copies.
+    pic = partition_by_repo(df, repos)
 
     del df
 
@@ -107,6 +101,7 @@ def cntrb_per_file_query(self, repos):
         func=cntrb_per_file_query,
         repos=repos,
         datas=pic,
+        schema=CACHE_SCHEMA,
     )
     logging.warning(f"{QUERY_NAME}_DATA_QUERY - END")
 
@@ -2,8 +2,8 @@ import logging
 from db_manager.augur_manager import AugurManager
 from app import celery_app
 import pandas as pd
-from cache_manager.cache_manager import CacheManager as cm
-import io
+import pyarrow as pa
+from cache_manager.cache_manager import CacheManager as cm, high_water_marks, partition_by_repo, TIMESTAMP_UTC, STRING
 import datetime as dt
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -11,6 +11,29 @@ from sqlalchemy.exc import SQLAlchemyError
 import os
 
 QUERY_NAME = "COMMITS"
+# bump when the cached result changes in a way the query code alone doesn't show,
+# e.g. a schema change in Augur. Invalidates this query's cached results.
+QUERY_VERSION = 1
+
+# Arrow types of the cached columns, enforced when they're written.
+CACHE_SCHEMA = {
+    "commits": STRING,
+    "author_email": STRING,
+    "date": TIMESTAMP_UTC,
+    "author_timestamp": TIMESTAMP_UTC,
+    "committer_timestamp": TIMESTAMP_UTC,
+}
+
+# Arrow types of the result's columns, lets AugurManager fetch it with COPY.
+COLUMN_TYPES = {
+    "id": pa.int64(),
+    "commits": pa.string(),
+    "author_email": pa.string(),
+    "date": pa.string(),
+    "author_timestamp": pa.timestamp("us", tz="UTC"),
+    "committer_timestamp": pa.timestamp("us", tz="UTC"),
+    "collected": pa.timestamp("us"),
+}
 
 
 @celery_app.task(
@@ -20,7 +43,7 @@ QUERY_NAME = "COMMITS"
     retry_kwargs={"max_retries": 5},
     retry_jitter=True,
 )
-def commits_query(self, repos):
+def commits_query(self, repos, refresh=False):
     """
     (Worker Query)
     Executes SQL query against Augur database for commit data.
@@ -29,6 +52,9 @@ def commits_query(self, repos):
     -----
         repo_ids ([str]): repos that SQL query is executed on.
 
+        refresh (bool): only fetch commits Augur collected since the cached
+            data was fetched and merge them into it.
+
     Returns:
     --------
         dict: Results from SQL query, interpreted from pd.to_dict('records')
@@ -38,6 +64,16 @@ def commits_query(self, repos):
     if len(repos) == 0:
         return None
 
+    cm_o = cm()
+
+    # watermark: the newest 'data_collection_date' of cached commits
+    previous = None
+    if refresh:
+        previous = cm_o.watermarks(func=commits_query, repos=repos)
+        if None in previous:
+            logging.warning(f"{QUERY_NAME}_DATA_QUERY - NO WATERMARK, FULL FETCH")
+            refresh, previous = False, None
+
     # commenting-outunused query components. only need the repo_id and the
     # authorship date for our current queries. remove the '--' to re-add
     # the now-removed values.
@@ -53,14 +89,16 @@ def commits_query(self, repos):
                         c.cmt_author_email AS author_email,
                         c.cmt_author_date AS date,
                         c.cmt_author_timestamp AS author_timestamp,
-                        c.cmt_committer_timestamp AS committer_timestamp
+                        c.cmt_committer_timestamp AS committer_timestamp,
+                        c.data_collection_date AS collected
 
                     FROM
                         repo r
                     JOIN commits c
                         ON r.repo_id = c.repo_id
                     WHERE
-                        c.repo_id in ({str(repos)[1:-1]})
+                        c.repo_id = ANY(:repo_ids)
+                        {'AND c.data_collection_date >= :since' if refresh else ''}
                     """
 
     try:
@@ -75,45 +113,46 @@ def commits_query(self, repos):
         # allow retry via Celery rules.
         raise SQLAlchemyError("DBConnect failed")
 
-    df = dbm.run_query(query_string)
-
-    # change to compatible type and remove all data that has been incorrectly formated
-    df["author_timestamp"] = pd.to_datetime(df["author_timestamp"], utc=True).dt.date
-    df = df[df.author_timestamp < dt.date.today()]
-
-    # break apart returned data per repo
-    # and temporarily store in List to be
-    # stored in Redis.
-    pic = []
-    for r in repos:
-        # convert series to a dataframe
-        # once we've stored the data by ID we no longer need the column.
-        c_df = pd.DataFrame(df.loc[df["id"] == r].drop(columns=["id"])).reset_index(drop=True)
+    params = {"repo_ids": repos}
+    if refresh:
+        params["since"] = min(pd.Timestamp(w) for w in previous)
 
-        # bytes buffer to be written to
-        b = io.BytesIO()
+    df = dbm.run_query(query_string, params, column_types=COLUMN_TYPES)
 
-        # write dataframe in feather format to BytesIO buffer
-        bs = c_df.to_feather(b)
+    # change to compatible type and remove all data that has been incorrectly formated
+    # Augur stores the author date as text.
+    df["date"] = pd.to_datetime(df["date"], utc=True)
+    df["author_timestamp"] = pd.to_datetime(df["author_timestamp"], utc=True).dt.normalize()
+    left_out = df.author_timestamp >= pd.Timestamp(dt.date.today(), tz="UTC")
+    watermarks = high_water_marks(df["id"], df["collected"], repos, left_out=left_out, previous=previous)
 
-        # move head of buffer to the beginning
-        b.seek(0)
+    # the rows of a commit's files differ in their collection date only
+    df = df[~left_out].drop(columns="collected").drop_duplicates()
 
-        # write the bytes of the buffer into the array
-        bs = b.read()
-        pic.append(bs)
+    # split rows per repo in one pass, the slices are serialized
+    # column-by-column by the cache manager without further copies.
+    # once we've stored the data by ID we no longer need the id column.
+    pic = partition_by_repo(df, repos, drop_id=True)
 
     del df
 
-    # store results in Redis
-    cm_o = cm()
-
     # 'ack' is a boolean of whether data was set correctly or not.
-    ack = cm_o.setm(
-        func=commits_query,
-        repos=repos,
-        datas=pic,
-    )
+    if refresh:
+        ack = cm_o.mergem(
+            func=commits_query,
+            repos=repos,
+            deltas=pic,
+            watermarks=watermarks,
+            schema=CACHE_SCHEMA,
+        )
+    else:
+        ack = cm_o.setm(
+            func=commits_query,
+            repos=repos,
+            datas=pic,
+            watermarks=watermarks,
+            schema=CACHE_SCHEMA,
+        )
 
     logging.warning(f"{QUERY_NAME}_DATA_QUERY - END")
     return ack
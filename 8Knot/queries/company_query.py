@@ -2,12 +2,29 @@ import logging
 from db_manager.augur_manager import AugurManager
 from app import celery_app
 import pandas as pd
-from cache_manager.cache_manager import CacheManager as cm
-import io
+from cache_manager.cache_manager import CacheManager as cm, partition_by_repo, TIMESTAMP_UTC, CATEGORY, STRING
 import datetime as dt
 from sqlalchemy.exc import SQLAlchemyError
+from pages.utils.company_names import CompanyIndex
 
 QUERY_NAME = "COMPANY"
+# bump when the cached result changes in a way the query code alone doesn't show,
+# e.g. a schema change in Augur. Invalidates this query's cached results.
+QUERY_VERSION = 1
+
+# Arrow types of the cached columns, enforced when they're written.
+CACHE_SCHEMA = {
+    "cntrb_id": STRING,
+    "created": TIMESTAMP_UTC,
+    "login": CATEGORY,
+    "action": CATEGORY,
+}
+
+# Arrow types of the cached company name mapping's columns, see company_names.
+NAMES_SCHEMA = {
+    "cntrb_company": STRING,
+    "company_name": STRING,
+}
 
 
 @celery_app.task(
@@ -57,7 +74,7 @@ def company_query(self, repos):
                     JOIN contributors con
                         ON c.cntrb_id = con.cntrb_id
                     WHERE
-                        c.repo_id in({str(repos)[1:-1]})
+                        c.repo_id = ANY(:repo_ids)
                     GROUP BY c.cntrb_id, c.created_at, c.repo_id, c.login, c.action, c.rank, con.cntrb_company
                     """
 
@@ -73,7 +90,7 @@ def company_query(self, repos):
         # allow retry via Celery rules.
         raise SQLAlchemyError("DBConnect failed")
 
-    df = dbm.run_query(query_string)
+    df = dbm.run_query(query_string, {"repo_ids": repos})
 
     # reformat cntrb_id
     df["cntrb_id"] = df["cntrb_id"].astype(str)
@@ -82,33 +99,17 @@ def company_query(self, repos):
     df = df.sort_values(by="created")
 
     # change to compatible type and remove all data that has been incorrectly formatted
-    df["created"] = pd.to_datetime(df["created"], utc=True).dt.date
-    df = df[df.created < dt.date.today()]
+    df["created"] = pd.to_datetime(df["created"], utc=True).dt.normalize()
+    df = df[df.created < pd.Timestamp(dt.date.today(), tz="UTC")]
 
     df = df.reset_index()
     df.drop("index", axis=1, inplace=True)
 
-    # break apart returned data per repo
-    # and temporarily store in List to be
-    # stored in Redis.
-    pic = []
-    for r in repos:
-        # convert series to a dataframe
-        # once we've stored the data by ID we no longer need the column.
-        c_df = pd.DataFrame(df.loc[df["id"] == r].drop(columns=["id"])).reset_index(drop=True)
-
-        # bytes buffer to be written to
-        b = io.BytesIO()
-
-        # write dataframe in feather format to BytesIO buffer
-        bs = c_df.to_feather(b)
-
-        # move head of buffer to the beginning
-        b.seek(0)
-
-        # write the bytes of the buffer into the array
-        bs = b.read()
-        pic.append(bs)
+    # split rows per repo in one pass, the slices are serialized
+    # column-by-column by the cache manager without further copies.
+    # once we've stored the data by ID we no longer need the id column.
+    pic = partition_by_repo(df, repos, drop_id=True)
+    names = partition_by_repo(company_names(df), repos, drop_id=True)
 
     del df
 
@@ -120,7 +121,46 @@ def company_query(self, repos):
         func=company_query,
         repos=repos,
         datas=pic,
+        schema=CACHE_SCHEMA,
+    )
+
+    ack = ack and cm_o.setm(
+        func=company_names,
+        repos=repos,
+        datas=names,
+        schema=NAMES_SCHEMA,
     )
 
     logging.warning(f"{QUERY_NAME}_DATA_QUERY - END")
     return ack
+
+
+def company_names(df):
+    """
+    Canonical name of each company listed by a repo's contributors.
+
+    Spellings of the same company are grouped per repo with CompanyIndex,
+    weighted by their contributions. company_query caches the mapping per
+    repo under this function's name next to its own results, so it's
+    built once per fetch rather than on every callback.
+
+    Args:
+    -----
+        df (pd.DataFrame): processed rows of company_query, with the repo in column "id".
+
+    Returns:
+    --------
+        pd.DataFrame: one row per (repo, company name) with its canonical name.
+    """
+    names = []
+    for repo, rows in df.groupby("id", sort=False):
+        canonical = CompanyIndex(rows["cntrb_company"]).canonical()
+        names.append(
+            pd.DataFrame(
+                {"id": repo, "cntrb_company": canonical.index.to_numpy(), "company_name": canonical.to_numpy()}
+            )
+        )
+
+    if not names:
+        return pd.DataFrame(columns=["id", "cntrb_company", "company_name"])
+    return pd.concat(names, ignore_index=True)
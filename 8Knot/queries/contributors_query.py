@@ -1,13 +1,55 @@
 import logging
 import pandas as pd
+import pyarrow as pa
 from db_manager.augur_manager import AugurManager
 from app import celery_app
-from cache_manager.cache_manager import CacheManager as cm
-import io
+from cache_manager.cache_manager import (
+    CacheManager as cm,
+    partition_by_repo,
+    TIMESTAMP_UTC,
+    CATEGORY,
+    STRING,
+)
 import datetime as dt
 from sqlalchemy.exc import SQLAlchemyError
 
 QUERY_NAME = "CONTRIBUTOR"
+# bump when the cached result changes in a way the query code alone doesn't show,
+# e.g. a schema change in Augur. Invalidates this query's cached results.
+QUERY_VERSION = 1
+
+# Arrow types of the cached columns, enforced when they're written.
+CACHE_SCHEMA = {
+    "repo_name": CATEGORY,
+    "cntrb_id": STRING,
+    "created_at": TIMESTAMP_UTC,
+    "login": CATEGORY,
+    "Action": CATEGORY,
+}
+
+# Arrow types of the cached activity cube's columns, see contributor_activity.
+ACTIVITY_SCHEMA = {
+    "repo_name": CATEGORY,
+    "cntrb_id": CATEGORY,
+    "login": CATEGORY,
+    "Action": CATEGORY,
+    "month": TIMESTAMP_UTC,
+    "count": pa.int32(),
+}
+
+# columns identifying a cell of the activity cube
+ACTIVITY_KEYS = ["id", "repo_name", "cntrb_id", "login", "Action", "month"]
+
+# Arrow types of the result's columns, lets AugurManager fetch it with COPY.
+COLUMN_TYPES = {
+    "id": pa.int64(),
+    "repo_name": pa.string(),
+    "cntrb_id": pa.string(),
+    "created_at": pa.timestamp("us", tz="UTC"),
+    "login": pa.string(),
+    "action": pa.string(),
+    "rank": pa.int64(),
+}
 
 
 @celery_app.task(
@@ -26,6 +68,10 @@ def contributors_query(self, repos):
     may not be in your augur database. The SQL query content can be found
     in docs/materialized_views/explorer_contributor_actions.sql
 
+    The view has no collection timestamp to take a watermark from and ranks
+    each contributor's actions over their whole history, so its rows are
+    always fetched in full rather than refreshed incrementally.
+
     Args:
     -----
         repo_ids ([str]): repos that SQL query is executed on.
@@ -52,7 +98,7 @@ def contributors_query(self, repos):
                     FROM
                         augur_data.explorer_contributor_actions
                     WHERE
-                        repo_id in ({str(repos)[1:-1]})
+                        repo_id = ANY(:repo_ids)
                 """
 
     try:
@@ -67,8 +113,84 @@ def contributors_query(self, repos):
         # allow retry via Celery rules.
         raise SQLAlchemyError("DBConnect failed")
 
-    df = dbm.run_query(query_string)
+    params = {"repo_ids": repos}
+
+    cm_o = cm()
+
+    # org-wide selections return millions of actions- they're streamed
+    # from a server-side cursor into the cache batch by batch so the
+    # worker never holds the whole result.
+    # the activity cube is tallied batch by batch, its cells are summed at the end.
+    cubes = []
+    with cm_o.stream(func=contributors_query, repos=repos, schema=CACHE_SCHEMA) as stream:
+        for batch in dbm.stream_query(query_string, params, column_types=COLUMN_TYPES):
+            batch, left_out = _process_actions(batch)
+            cubes.append(contributor_activity(batch[~left_out]))
+            stream.write(batch, left_out=left_out)
+
+        # 'ack' is a boolean of whether data was set correctly or not.
+        ack = stream.close()
+
+    if ack:
+        cube = pd.concat(cubes, ignore_index=True) if cubes else pd.DataFrame(columns=ACTIVITY_KEYS + ["count"])
+        cube = cube.groupby(ACTIVITY_KEYS, observed=True, dropna=False, sort=False)["count"].sum().reset_index()
+        ack = cm_o.setm(
+            func=contributor_activity,
+            repos=repos,
+            datas=partition_by_repo(cube, repos, drop_id=True),
+            schema=ACTIVITY_SCHEMA,
+        )
+
+    logging.warning(f"{QUERY_NAME}_DATA_QUERY - END")
+
+    return ack
+
+
+def contributor_activity(df):
+    """
+    Monthly activity cube of contributors_query's rows.
+
+    Counts the actions of each contributor per action type and calendar
+    month (UTC). contributors_query caches it per repo under this
+    function's name next to its own results, so visualizations that
+    only need monthly counts can read a few thousand small rows instead
+    of every action. Contributor and action are dictionary-encoded in the
+    cache; their codes and the month are the cube's coordinates.
+
+    Args:
+    -----
+        df (pd.DataFrame): processed rows of contributors_query, with the repo in column "id".
+
+    Returns:
+    --------
+        pd.DataFrame: one row per (repo, contributor, action, month) with its count.
+    """
+    # created_at is already normalized to UTC midnight.
+    created_at = pd.to_datetime(df["created_at"], utc=True)
+    month = created_at - pd.to_timedelta(created_at.dt.day - 1, unit="D")
+
+    return (
+        df.assign(month=month)
+        .groupby(ACTIVITY_KEYS, observed=True, dropna=False, sort=False)
+        .size()
+        .astype("int32")
+        .reset_index(name="count")
+    )
+
 
+def _process_actions(df):
+    """
+    Renames actions and reformats the columns of rows of contributor actions.
+
+    Args:
+    -----
+        df (pd.DataFrame): rows as returned by the SQL query.
+
+    Returns:
+    --------
+        pd.DataFrame: reformatted rows
+        pd.Series[bool]: rows that aren't cached because they're from today
+    """
     # update column values
     df.loc[df["action"] == "pull_request_open", "action"] = "PR Opened"
     df.loc[df["action"] == "pull_request_comment", "action"] = "PR Comment"
@@ -89,41 +211,7 @@ def contributors_query(self, repos):
     df["cntrb_id"] = df["cntrb_id"].str[:15]
 
     # change to compatible type and remove all data that has been incorrectly formated
-    df["created_at"] = pd.to_datetime(df["created_at"], utc=True).dt.date
-    df = df[df.created_at < dt.date.today()]
-
-    df = df.reset_index(drop=True)
-
-    pic = []
-
-    for i, r in enumerate(repos):
-        # convert series to a dataframe
-        c_df = pd.DataFrame(df.loc[df["id"] == r]).reset_index(drop=True)
+    df["created_at"] = pd.to_datetime(df["created_at"], utc=True).dt.normalize()
+    left_out = df.created_at >= pd.Timestamp(dt.date.today(), tz="UTC")
 
-        # bytes buffer to be written to
-        b = io.BytesIO()
-
-        # write dataframe in feather format to BytesIO buffer
-        bs = c_df.to_feather(b)
-
-        # move head of buffer to the beginning
-        b.seek(0)
-
-        # write the bytes of the buffer into the array
-        bs = b.read()
-        pic.append(bs)
-
-    del df
-
-    # store results in Redis
-    cm_o = cm()
-
-    # 'ack' is a boolean of whether data was set correctly or not.
-    ack = cm_o.setm(
-        func=contributors_query,
-        repos=repos,
-        datas=pic,
-    )
-    logging.warning(f"{QUERY_NAME}_DATA_QUERY - END")
-
-    return ack
+    return df, left_out
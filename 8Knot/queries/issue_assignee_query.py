@@ -2,12 +2,23 @@ import logging
 import pandas as pd
 from db_manager.augur_manager import AugurManager
 from app import celery_app
-from cache_manager.cache_manager import CacheManager as cm
-import io
+from cache_manager.cache_manager import CacheManager as cm, partition_by_repo, TIMESTAMP_UTC, CATEGORY, STRING
 import datetime as dt
 from sqlalchemy.exc import SQLAlchemyError
 
 QUERY_NAME = "ISSUE_ASSIGNEE"
+# bump when the cached result changes in a way the query code alone doesn't show,
+# e.g. a schema change in Augur. Invalidates this query's cached results.
+QUERY_VERSION = 1
+
+# Arrow types of the cached columns, enforced when they're written.
+CACHE_SCHEMA = {
+    "created": TIMESTAMP_UTC,
+    "closed": TIMESTAMP_UTC,
+    "assign_date": TIMESTAMP_UTC,
+    "assignment_action": CATEGORY,
+    "assignee": STRING,
+}
 
 
 @celery_app.task(
@@ -44,7 +55,7 @@ def issue_assignee_query(self, repos):
                     FROM
                         explorer_issue_assignments ia
                     WHERE
-                        ia.id in ({str(repos)[1:-1]})
+                        ia.id = ANY(:repo_ids)
                 """
 
     try:
@@ -59,34 +70,19 @@ def issue_assignee_query(self, repos):
         # allow retry via Celery rules.
         raise SQLAlchemyError("DBConnect failed")
 
-    df = dbm.run_query(query_string)
+    df = dbm.run_query(query_string, {"repo_ids": repos})
 
     # id as string and slice to remove excess 0s
     df["assignee"] = df["assignee"].astype(str)
     df["assignee"] = df["assignee"].str[:15]
 
     # change to compatible type and remove all data that has been incorrectly formated
-    df["created"] = pd.to_datetime(df["created"], utc=True).dt.date
-    df = df[df.created < dt.date.today()]
-
-    pic = []
-
-    for i, r in enumerate(repos):
-        # convert series to a dataframe
-        c_df = pd.DataFrame(df.loc[df["id"] == r]).reset_index(drop=True)
-
-        # bytes buffer to be written to
-        b = io.BytesIO()
-
-        # write dataframe in feather format to BytesIO buffer
-        bs = c_df.to_feather(b)
-
-        # move head of buffer to the beginning
-        b.seek(0)
+    df["created"] = pd.to_datetime(df["created"], utc=True).dt.normalize()
+    df = df[df.created < pd.Timestamp(dt.date.today(), tz="UTC")]
 
-        # write the bytes of the buffer into the array
-        bs = b.read()
-        pic.append(bs)
+    # split rows per repo in one pass, the slices are serialized
+    # column-by-column by the cache manager without further copies.
+    pic = partition_by_repo(df, repos)
 
     del df
 
@@ -98,6 +94,7 @@ def issue_assignee_query(self, repos):
         func=issue_assignee_query,
         repos=repos,
         datas=pic,
+        schema=CACHE_SCHEMA,
     )
     logging.warning(f"{QUERY_NAME}_DATA_QUERY - END")
 
@@ -1,13 +1,31 @@
 import logging
 from db_manager.augur_manager import AugurManager
 from app import celery_app
-from cache_manager.cache_manager import CacheManager as cm
+from cache_manager.cache_manager import (
+    CacheManager as cm,
+    high_water_marks,
+    partition_by_repo,
+    TIMESTAMP_UTC,
+    CATEGORY,
+    STRING,
+)
 import pandas as pd
-import io
 import datetime as dt
 from sqlalchemy.exc import SQLAlchemyError
 
 QUERY_NAME = "ISSUE"
+# bump when the cached result changes in a way the query code alone doesn't show,
+# e.g. a schema change in Augur. Invalidates this query's cached results.
+QUERY_VERSION = 1
+
+# Arrow types of the cached columns, enforced when they're written.
+CACHE_SCHEMA = {
+    "repo_name": CATEGORY,
+    "reporter_id": STRING,
+    "issue_closer": STRING,
+    "created": TIMESTAMP_UTC,
+    "closed": TIMESTAMP_UTC,
+}
 
 
 @celery_app.task(
@@ -17,7 +35,7 @@ QUERY_NAME = "ISSUE"
     retry_kwargs={"max_retries": 5},
     retry_jitter=True,
 )
-def issues_query(self, repos):
+def issues_query(self, repos, refresh=False):
     """
     (Worker Query)
     Executes SQL query against Augur database for issue data.
@@ -26,6 +44,9 @@ def issues_query(self, repos):
     -----
         repo_ids ([str]): repos that SQL query is executed on.
 
+        refresh (bool): only fetch issues updated since the cached data
+            was fetched and merge them into it.
+
     Returns:
     --------
         dict: Results from SQL query, interpreted from pd.to_dict('records')
@@ -36,6 +57,16 @@ def issues_query(self, repos):
     if len(repos) == 0:
         return None
 
+    cm_o = cm()
+
+    # watermark: the newest 'updated_at' of cached issues
+    previous = None
+    if refresh:
+        previous = cm_o.watermarks(func=issues_query, repos=repos)
+        if None in previous:
+            logging.warning(f"{QUERY_NAME}_DATA_QUERY - NO WATERMARK, FULL FETCH")
+            refresh, previous = False, None
+
     query_string = f"""
                     SELECT
                         r.repo_id as id,
@@ -47,13 +78,15 @@ def issues_query(self, repos):
                         i.cntrb_id AS issue_closer,
                         i.created_at AS created,
                         i.closed_at AS closed,
+                        i.updated_at AS updated,
                         i.pull_request_id
                     FROM
                         repo r,
                         issues i
                     WHERE
                         r.repo_id = i.repo_id AND
-                        r.repo_id in ({str(repos)[1:-1]})
+                        r.repo_id = ANY(:repo_ids)
+                        {'AND i.updated_at >= :since' if refresh else ''}
                     """
 
     try:
@@ -68,15 +101,21 @@ def issues_query(self, repos):
         # allow retry via Celery rules.
         raise SQLAlchemyError("DBConnect failed")
 
-    df = dbm.run_query(query_string)
+    params = {"repo_ids": repos}
+    if refresh:
+        params["since"] = min(pd.Timestamp(w) for w in previous)
+
+    df = dbm.run_query(query_string, params)
 
     df = df[df["pull_request_id"].isnull()]
     df = df.drop(columns="pull_request_id")
     df = df.sort_values(by="created")
 
     # change to compatible type and remove all data that has been incorrectly formated
-    df["created"] = pd.to_datetime(df["created"], utc=True).dt.date
-    df = df[df.created < dt.date.today()]
+    df["created"] = pd.to_datetime(df["created"], utc=True).dt.normalize()
+    left_out = df.created >= pd.Timestamp(dt.date.today(), tz="UTC")
+    watermarks = high_water_marks(df["id"], df["updated"], repos, left_out=left_out, previous=previous)
+    df = df[~left_out].drop(columns="updated")
 
     # reformat reporter_id and issue_closer
     df["reporter_id"] = df["reporter_id"].astype(str)
@@ -88,38 +127,32 @@ def issues_query(self, repos):
     df = df.reset_index()
     df.drop("index", axis=1, inplace=True)
 
-    # break apart returned data per repo
-    # and temporarily store in List to be
-    # stored in Redis.
-    pic = []
-    for i, r in enumerate(repos):
-        # convert series to a dataframe
-        c_df = pd.DataFrame(df.loc[df["id"] == r]).reset_index(drop=True)
-
-        # bytes buffer to be written to
-        b = io.BytesIO()
-
-        # write dataframe in feather format to BytesIO buffer
-        bs = c_df.to_feather(b)
-
-        # move head of buffer to the beginning
-        b.seek(0)
-
-        # write the bytes of the buffer into the array
-        bs = b.read()
-        pic.append(bs)
+    # split rows per repo in one pass, the slices are serialized
+    # column-by-column by the cache manager without further copies.
+    pic = partition_by_repo(df, repos)
 
     del df
 
-    # store results in Redis
-    cm_o = cm()
-
     # 'ack' is a boolean of whether data was set correctly or not.
-    ack = cm_o.setm(
-        func=issues_query,
-        repos=repos,
-        datas=pic,
-    )
+    if refresh:
+        # updated issues replace their cached rows
+        ack = cm_o.mergem(
+            func=issues_query,
+            repos=repos,
+            deltas=pic,
+            watermarks=watermarks,
+            schema=CACHE_SCHEMA,
+            keys=["issue"],
+            sort_by="created",
+        )
+    else:
+        ack = cm_o.setm(
+            func=issues_query,
+            repos=repos,
+            datas=pic,
+            watermarks=watermarks,
+            schema=CACHE_SCHEMA,
+        )
 
     logging.warning(f"{QUERY_NAME}_DATA_QUERY - END")
     return ack
@@ -2,8 +2,7 @@ import logging
 import pandas as pd
 from db_manager.augur_manager import AugurManager
 from app import celery_app
-from cache_manager.cache_manager import CacheManager as cm
-import io
+from cache_manager.cache_manager import CacheManager as cm, partition_by_repo, TIMESTAMP_UTC
 import datetime as dt
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -20,6 +19,14 @@ TODO:
 """
 
 QUERY_NAME = "ISSUES_UPDATED"
+# bump when the cached result changes in a way the query code alone doesn't show,
+# e.g. a schema change in Augur. Invalidates this query's cached results.
+QUERY_VERSION = 1
+
+# Arrow types of the cached columns, enforced when they're written.
+CACHE_SCHEMA = {
+    "date": TIMESTAMP_UTC,
+}
 
 
 @celery_app.task(
@@ -50,7 +57,7 @@ def issues_updated_query(self, repos):
     query_string = f"""
                     select i.issue_id as issues_updated, r.repo_id as id, i.updated_at as date
                     from issues i, repo r
-                    where r.repo_id = i.repo_id and i.repo_id in ({str(repos)[1:-1]})
+                    where r.repo_id = i.repo_id and i.repo_id = ANY(:repo_ids)
                     order by date
                 """
 
@@ -66,12 +73,11 @@ def issues_updated_query(self, repos):
         # allow retry via Celery rules.
         raise SQLAlchemyError("DBConnect failed")
 
-    df = dbm.run_query(query_string)
+    df = dbm.run_query(query_string, {"repo_ids": repos})
 
     print(df)
     print(df.columns)
 
-
     # pandas column and format updates
     """Commonly used df updates:
 
@@ -83,27 +89,12 @@ def issues_updated_query(self, repos):
 
     """
     # change to compatible type and remove all data that has been incorrectly formated
-    df["date"] = pd.to_datetime(df["date"], utc=True).dt.date
-    df = df[df.date < dt.date.today()]
-
-    pic = []
-
-    for i, r in enumerate(repos):
-        # convert series to a dataframe
-        c_df = pd.DataFrame(df.loc[df["id"] == r]).reset_index(drop=True)
-
-        # bytes buffer to be written to
-        b = io.BytesIO()
-
-        # write dataframe in feather format to BytesIO buffer
-        bs = c_df.to_feather(b)
-
-        # move head of buffer to the beginning
-        b.seek(0)
+    df["date"] = pd.to_datetime(df["date"], utc=True).dt.normalize()
+    df = df[df.date < pd.Timestamp(dt.date.today(), tz="UTC")]
 
-        # write the bytes of the buffer into the array
-        bs = b.read()
-        pic.append(bs)
+    # split rows per repo in one pass, the slices are serialized
+    # column-by-column by the cache manager without further copies.
+    pic = partition_by_repo(df, repos)
     print(df)
 
     del df
@@ -116,6 +107,7 @@ def issues_updated_query(self, repos):
         func=issues_updated_query,
         repos=repos,
         datas=pic,
+        schema=CACHE_SCHEMA,
     )
     logging.warning(f"{QUERY_NAME}_DATA_QUERY - END")
 
@@ -2,12 +2,23 @@ import logging
 import pandas as pd
 from db_manager.augur_manager import AugurManager
 from app import celery_app
-from cache_manager.cache_manager import CacheManager as cm
-import io
+from cache_manager.cache_manager import CacheManager as cm, partition_by_repo, TIMESTAMP_UTC, STRING
 import datetime as dt
 from sqlalchemy.exc import SQLAlchemyError
 
 QUERY_NAME = "PR_RESPONSE"
+# bump when the cached result changes in a way the query code alone doesn't show,
+# e.g. a schema change in Augur. Invalidates this query's cached results.
+QUERY_VERSION = 1
+
+# Arrow types of the cached columns, enforced when they're written.
+CACHE_SCHEMA = {
+    "cntrb_id": STRING,
+    "msg_cntrb_id": STRING,
+    "pr_created_at": TIMESTAMP_UTC,
+    "pr_closed_at": TIMESTAMP_UTC,
+    "msg_timestamp": TIMESTAMP_UTC,
+}
 
 
 @celery_app.task(
@@ -45,7 +56,7 @@ def pr_response_query(self, repos):
                     FROM
                         explorer_pr_response epr
                     WHERE
-                        epr.ID in ({str(repos)[1:-1]})
+                        epr.ID = ANY(:repo_ids)
                 """
 
     try:
@@ -60,7 +71,7 @@ def pr_response_query(self, repos):
         # allow retry via Celery rules.
         raise SQLAlchemyError("DBConnect failed")
 
-    df = dbm.run_query(query_string)
+    df = dbm.run_query(query_string, {"repo_ids": repos})
 
     # reformat cntrb_id
     df["cntrb_id"] = df["cntrb_id"].astype(str)
@@ -70,27 +81,12 @@ def pr_response_query(self, repos):
     df["msg_cntrb_id"] = df["msg_cntrb_id"].str[:15]
 
     # change to compatible type and remove all data that has been incorrectly formated
-    df["pr_created_at"] = pd.to_datetime(df["pr_created_at"], utc=True).dt.date
-    df = df[df.pr_created_at < dt.date.today()]
-
-    pic = []
-
-    for i, r in enumerate(repos):
-        # convert series to a dataframe
-        c_df = pd.DataFrame(df.loc[df["id"] == r]).reset_index(drop=True)
-
-        # bytes buffer to be written to
-        b = io.BytesIO()
-
-        # write dataframe in feather format to BytesIO buffer
-        bs = c_df.to_feather(b)
-
-        # move head of buffer to the beginning
-        b.seek(0)
+    df["pr_created_at"] = pd.to_datetime(df["pr_created_at"], utc=True).dt.normalize()
+    df = df[df.pr_created_at < pd.Timestamp(dt.date.today(), tz="UTC")]
 
-        # write the bytes of the buffer into the array
-        bs = b.read()
-        pic.append(bs)
+    # split rows per repo in one pass, the slices are serialized
+    # column-by-column by the cache manager without further copies.
+    pic = partition_by_repo(df, repos)
 
     del df
 
@@ -102,6 +98,7 @@ def pr_response_query(self, repos):
         func=pr_response_query,
         repos=repos,
         datas=pic,
+        schema=CACHE_SCHEMA,
     )
     logging.warning(f"{QUERY_NAME}_DATA_QUERY - END")
 
@@ -2,8 +2,7 @@ import logging
 import pandas as pd
 from db_manager.augur_manager import AugurManager
 from app import celery_app
-from cache_manager.cache_manager import CacheManager as cm
-import io
+from cache_manager.cache_manager import CacheManager as cm, partition_by_repo, TIMESTAMP_UTC
 import datetime as dt
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -12,14 +11,28 @@ TODO:
 (1) update QUERY_NAME
 (2) update 'NAME_query' found in function definition and in the function call that sets the 'ack' variable below.
 'NAME' should be the same as QUERY_NAME
-(3) paste SQL query in the query_string
+(3) paste SQL query in the query_string, filtering repos with '= ANY(:repo_ids)'
 (4) insert any necessary df column name or format changed under the pandas column and format updates comment
 (5) reset df index if #4 is performed via "df = df.reset_index(drop=True)"
-(6) go to index/index_callbacks.py and import the NAME_query as a unqiue acronym and add it to the QUERIES list
-(7) delete this list when completed
+(6) declare the Arrow type of each cached column in CACHE_SCHEMA: CATEGORY for repeated labels,
+STRING for ids and TIMESTAMP_UTC for dates (normalize them rather than converting to datetime.date)
+(7) go to index/index_callbacks.py and import the NAME_query as a unqiue acronym and add it to the QUERIES dict,
+then add 'NAME_query' to PREFETCH_ORDER and to the visualizations that read it in pages/utils/query_registry.py
+(8) delete this list when completed
+
+Cached results are invalidated automatically when this module's code, or that of the app's modules it imports, changes.
+Bump QUERY_VERSION if they have to be refetched for another reason.
 """
 
 QUERY_NAME = "NAME"
+# bump when the cached result changes in a way the query code alone doesn't show,
+# e.g. a schema change in Augur. Invalidates this query's cached results.
+QUERY_VERSION = 1
+
+# Arrow types of the cached columns, enforced when they're written.
+CACHE_SCHEMA = {
+    "created": TIMESTAMP_UTC,
+}
 
 
 @celery_app.task(
@@ -53,7 +66,7 @@ def NAME_query(self, repos):
                     FROM
 
                     WHERE
-                        repo_id in ({str(repos)[1:-1]})
+                        repo_id = ANY(:repo_ids)
                 """
 
     try:
@@ -68,7 +81,7 @@ def NAME_query(self, repos):
         # allow retry via Celery rules.
         raise SQLAlchemyError("DBConnect failed")
 
-    df = dbm.run_query(query_string)
+    df = dbm.run_query(query_string, {"repo_ids": repos})
 
     # pandas column and format updates
     """Commonly used df updates:
@@ -81,27 +94,12 @@ def NAME_query(self, repos):
 
     """
     # change to compatible type and remove all data that has been incorrectly formated
-    df["created"] = pd.to_datetime(df["created"], utc=True).dt.date
-    df = df[df.created < dt.date.today()]
-
-    pic = []
-
-    for i, r in enumerate(repos):
-        # convert series to a dataframe
-        c_df = pd.DataFrame(df.loc[df["id"] == r]).reset_index(drop=True)
-
-        # bytes buffer to be written to
-        b = io.BytesIO()
-
-        # write dataframe in feather format to BytesIO buffer
-        bs = c_df.to_feather(b)
-
-        # move head of buffer to the beginning
-        b.seek(0)
+    df["created"] = pd.to_datetime(df["created"], utc=True).dt.normalize()
+    df = df[df.created < pd.Timestamp(dt.date.today(), tz="UTC")]
 
-        # write the bytes of the buffer into the array
-        bs = b.read()
-        pic.append(bs)
+    # split rows per repo in one pass, the slices are serialized
+    # column-by-column by the cache manager without further copies.
+    pic = partition_by_repo(df, repos)
 
     del df
 
@@ -113,6 +111,7 @@ def NAME_query(self, repos):
         func=NAME_query,
         repos=repos,
         datas=pic,
+        schema=CACHE_SCHEMA,
     )
     logging.warning(f"{QUERY_NAME}_DATA_QUERY - END")
 
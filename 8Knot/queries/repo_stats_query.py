@@ -0,0 +1,88 @@
+import logging
+from db_manager.augur_manager import AugurManager
+from app import celery_app
+from cache_manager.repo_stats import RepoStats, STATS
+from sqlalchemy.exc import SQLAlchemyError
+
+QUERY_NAME = "REPO_STATS"
+
+
+@celery_app.task(
+    bind=True,
+    autoretry_for=(Exception,),
+    exponential_backoff=2,
+    retry_kwargs={"max_retries": 5},
+    retry_jitter=True,
+)
+def repo_stats_query(self):
+    """
+    (Worker Query)
+    Executes SQL query against Augur database for the size of every repo.
+
+    Counts the commits, PRs, issues and contributor actions of each repo
+    and replaces the statistics kept by RepoStats. Doesn't collect data
+    for visualization.
+
+    Returns:
+    --------
+        bool: Success of storing the statistics
+    """
+    logging.warning(f"{QUERY_NAME}_DATA_QUERY - START")
+
+    # each count is an aggregate over one table, grouped by repo.
+    # commits has a row per file of a commit, so commits are counted by hash.
+    query_string = f"""
+                    SELECT
+                        r.repo_id,
+                        COALESCE(c.n, 0) AS commits,
+                        COALESCE(pr.n, 0) AS prs,
+                        COALESCE(i.n, 0) AS issues,
+                        COALESCE(ca.n, 0) AS contributor_actions
+                    FROM
+                        repo r
+                    LEFT JOIN (
+                        SELECT repo_id, count(DISTINCT cmt_commit_hash) AS n FROM commits GROUP BY repo_id
+                    ) c ON c.repo_id = r.repo_id
+                    LEFT JOIN (
+                        SELECT repo_id, count(*) AS n FROM pull_requests GROUP BY repo_id
+                    ) pr ON pr.repo_id = r.repo_id
+                    LEFT JOIN (
+                        SELECT repo_id, count(*) AS n FROM issues GROUP BY repo_id
+                    ) i ON i.repo_id = r.repo_id
+                    LEFT JOIN (
+                        SELECT repo_id, count(*) AS n FROM explorer_contributor_actions GROUP BY repo_id
+                    ) ca ON ca.repo_id = r.repo_id
+                    """
+
+    try:
+        dbm = AugurManager()
+        engine = dbm.get_engine()
+    except KeyError:
+        # noack, data wasn't successfully set.
+        logging.error(f"{QUERY_NAME}_DATA_QUERY - INCOMPLETE ENVIRONMENT")
+        return False
+    except SQLAlchemyError:
+        logging.error(f"{QUERY_NAME}_DATA_QUERY - COULDN'T CONNECT TO DB")
+        # allow retry via Celery rules.
+        raise SQLAlchemyError("DBConnect failed")
+
+    df = dbm.run_query(query_string)
+
+    RepoStats().setm(df[["repo_id"] + STATS])
+
+    logging.warning(f"{QUERY_NAME}_DATA_QUERY - END")
+    return True
+
+
+def schedule_repo_stats():
+    """Enqueues a rebuild of the repo statistics if they're due for one.
+
+    Cheap enough to be called on every search; only one caller per
+    refresh period enqueues the query.
+    """
+    try:
+        if RepoStats().claim_refresh():
+            repo_stats_query.apply_async(queue="data")
+    except Exception as e:
+        # the statistics only improve estimates, searches work without them.
+        logging.error(f"{QUERY_NAME}_DATA_QUERY - COULDN'T SCHEDULE: {e}")
@@ -5,7 +5,7 @@ from cache_manager.cache_manager import CacheManager as cm
 import io
 import datetime as dt
 from sqlalchemy.exc import SQLAlchemyError
-import redis
+from _redis_pools import users_client
 import json
 import os
 
@@ -32,11 +32,7 @@ def user_groups_query(self, user_id):
     """
     logging.warning(f"{QUERY_NAME}_DATA_QUERY - START")
 
-    users_cache = redis.StrictRedis(
-        host=os.getenv("REDIS_SERVICE_USERS_HOST", "redis-users"),
-        port=6379,
-        password=os.getenv("REDIS_PASSWORD", ""),
-    )
+    users_cache = users_client()
 
     # checks connection to Redis, raises redis.exceptions.ConnectionError if connection fails.
     # returns True if connection succeeds.
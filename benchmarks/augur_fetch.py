@@ -0,0 +1,250 @@
+"""
+    Benchmark: fetching query results with pd.read_sql vs. COPY into Arrow.
+
+    Runs the SELECTs of commits_query and contributors_query against a Postgres
+    database through AugurManager with each fetch engine and reports, per query:
+
+        - rows fetched
+        - wall time until the DataFrame is built
+        - peak RSS of the process
+
+    Each (query, engine) case runs in a fresh subprocess so that peak RSS isn't
+    polluted by earlier cases. Uses the same AUGUR_* environment variables as
+    the app- point them at a throwaway local database, not at a live Augur.
+
+    --seed creates the schema augur_data in that database with synthetic tables
+    shaped like Augur's 'repo', 'commits' and 'explorer_contributor_actions',
+    so AUGUR_SCHEMA should be 'augur_data'.
+
+    Usage:
+        python benchmarks/augur_fetch.py --seed [--repos 100] [--rows 20000]
+        python benchmarks/augur_fetch.py [--repos 100] [--runs 3]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import pyarrow as pa
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "8Knot"))
+
+from db_manager.augur_manager import AugurManager, FETCH_ENGINES  # noqa: E402
+
+# same columns and types as the query modules, which can't be imported
+# without a Celery app.
+QUERIES = {
+    "commits": (
+        """
+        SELECT
+            distinct
+            r.repo_id AS id,
+            c.cmt_commit_hash AS commits,
+            c.cmt_author_email AS author_email,
+            c.cmt_author_date AS date,
+            c.cmt_author_timestamp AS author_timestamp,
+            c.cmt_committer_timestamp AS committer_timestamp,
+            c.data_collection_date AS collected
+        FROM
+            repo r
+        JOIN commits c
+            ON r.repo_id = c.repo_id
+        WHERE
+            c.repo_id = ANY(:repo_ids)
+        """,
+        {
+            "id": "int64",
+            "commits": "string",
+            "author_email": "string",
+            "date": "string",
+            "author_timestamp": "timestamp_utc",
+            "committer_timestamp": "timestamp_utc",
+            "collected": "timestamp",
+        },
+    ),
+    "contributors": (
+        """
+        SELECT
+            repo_id as id,
+            repo_name as repo_name,
+            cntrb_id,
+            created_at,
+            login,
+            action,
+            rank
+        FROM
+            augur_data.explorer_contributor_actions
+        WHERE
+            repo_id = ANY(:repo_ids)
+        """,
+        {
+            "id": "int64",
+            "repo_name": "string",
+            "cntrb_id": "string",
+            "created_at": "timestamp_utc",
+            "login": "string",
+            "action": "string",
+            "rank": "int64",
+        },
+    ),
+}
+
+SEED = """
+    DROP SCHEMA IF EXISTS augur_data CASCADE;
+    CREATE SCHEMA augur_data;
+    SET search_path TO augur_data;
+
+    CREATE TABLE repo (
+        repo_id bigint PRIMARY KEY,
+        repo_name varchar,
+        repo_git varchar
+    );
+    INSERT INTO repo
+        SELECT r, 'repo-' || r, 'https://github.com/org/repo-' || r
+        FROM generate_series(1, %(repos)s) AS r;
+
+    CREATE TABLE commits (
+        cmt_id bigserial PRIMARY KEY,
+        repo_id bigint,
+        cmt_commit_hash varchar,
+        cmt_author_email varchar,
+        cmt_author_date varchar,
+        cmt_author_timestamp timestamptz,
+        cmt_committer_timestamp timestamptz,
+        data_collection_date timestamp
+    );
+    INSERT INTO commits (repo_id, cmt_commit_hash, cmt_author_email, cmt_author_date,
+                         cmt_author_timestamp, cmt_committer_timestamp, data_collection_date)
+        SELECT
+            r,
+            md5((r * %(rows)s + i)::text),
+            'user' || (i %% 500) || '@example.com',
+            to_char(t, 'YYYY-MM-DD'),
+            t,
+            t + interval '1 hour',
+            now()::timestamp - interval '2 days'
+        FROM
+            generate_series(1, %(repos)s) AS r,
+            generate_series(1, %(rows)s) AS i,
+            LATERAL (SELECT timestamptz '2013-01-01' + (i %% 3650) * interval '1 day') AS d(t);
+    CREATE INDEX ON commits (repo_id);
+
+    CREATE TABLE explorer_contributor_actions (
+        repo_id bigint,
+        repo_name varchar,
+        cntrb_id uuid,
+        created_at timestamptz,
+        login varchar,
+        action varchar,
+        rank bigint
+    );
+    INSERT INTO explorer_contributor_actions
+        SELECT
+            r,
+            'repo-' || r,
+            ('01000000-0000-0000-0000-' || lpad((i %% 500)::text, 12, '0'))::uuid,
+            timestamptz '2013-01-01' + (i %% 3650) * interval '1 day',
+            'user' || (i %% 500),
+            (ARRAY['commit', 'pull_request_open', 'pull_request_comment', 'issue_opened',
+                   'issue_comment', 'pull_request_review_APPROVED'])[1 + i %% 6],
+            1 + i %% 50
+        FROM
+            generate_series(1, %(repos)s) AS r,
+            generate_series(1, %(rows)s) AS i;
+    CREATE INDEX ON explorer_contributor_actions (repo_id);
+
+    ANALYZE;
+"""
+
+
+def column_types(spec):
+    """Arrow types from the type names in QUERIES."""
+    names = {
+        "int64": pa.int64(),
+        "string": pa.string(),
+        "timestamp": pa.timestamp("us"),
+        "timestamp_utc": pa.timestamp("us", tz="UTC"),
+    }
+    return {c: names[t] for c, t in spec.items()}
+
+
+def seed(repos, rows):
+    """Creates the synthetic tables, 'rows' commits and actions per repo."""
+    dbm = AugurManager()
+    engine = dbm.get_engine()
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(SEED, {"repos": repos, "rows": rows})
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_case(query, fetch_engine, repos, runs):
+    """Runs in a subprocess: fetches the query 'runs' times, reports the best."""
+    dbm = AugurManager()
+    dbm.get_engine()
+    dbm.fetch_engine = fetch_engine
+
+    query_string, spec = QUERIES[query]
+    params = {"repo_ids": list(range(1, repos + 1))}
+    types = column_types(spec)
+
+    wall = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        df = dbm.run_query(query_string, params, column_types=types)
+        wall = min(wall, time.perf_counter() - start)
+        rows = len(df)
+        del df
+
+    # ru_maxrss is in KiB on Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"rows": rows, "wall_s": wall, "peak_rss_mb": rss / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="(re)create the synthetic tables first")
+    parser.add_argument("--repos", type=int, default=100, help="repos seeded / selected")
+    parser.add_argument("--rows", type=int, default=20000, help="commits and actions per repo when seeding")
+    parser.add_argument("--runs", type=int, default=3, help="timed repetitions, best is reported")
+    parser.add_argument("--case", nargs=2, metavar=("QUERY", "ENGINE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(*args.case, repos=args.repos, runs=args.runs)
+        return
+
+    if args.seed:
+        seed(args.repos, args.rows)
+
+    print(f"{'query':>13} {'engine':>9} {'rows':>10} {'wall_s':>8} {'peak_rss_mb':>12}")
+    for query in QUERIES:
+        for fetch_engine in FETCH_ENGINES:
+            out = subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--case",
+                    query,
+                    fetch_engine,
+                    "--repos",
+                    str(args.repos),
+                    "--runs",
+                    str(args.runs),
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            r = json.loads(out.stdout)
+            print(f"{query:>13} {fetch_engine:>9} {r['rows']:>10} {r['wall_s']:>8.3f} {r['peak_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
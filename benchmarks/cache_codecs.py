@@ -0,0 +1,110 @@
+"""
+    Benchmark: compression ratio vs. decode latency of cache codecs.
+
+    Reads the cached results of every query for the given repos out of a running
+    redis-cache instance (the real column mix of each query), re-encodes them
+    with each codec that CacheManager supports and reports, per query:
+
+        - stored bytes and compression ratio vs. uncompressed
+        - encode time (query worker side, setm)
+        - decode + assembly time (callback worker side, grabm)
+
+    The repos have to be cached already, e.g. by searching for them in the app.
+    Uses the same REDIS_* environment variables as the app.
+
+    --representative N picks N repos spread evenly over the size range of the
+    repo statistics instead (smallest to largest by contributor actions).
+
+    Usage:
+        python benchmarks/cache_codecs.py --repos 25445 25450 [--levels 1 3 9] [--runs 5]
+        python benchmarks/cache_codecs.py --representative 5
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "8Knot"))
+
+from cache_manager.cache_manager import CacheManager  # noqa: E402
+from cache_manager.repo_stats import RepoStats  # noqa: E402
+
+QUERIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "8Knot", "queries")
+
+
+def query_names():
+    """Names of the query functions whose results are cached per repo."""
+    names = [os.path.basename(p)[: -len(".py")] for p in glob.glob(os.path.join(QUERIES_DIR, "*_query.py"))]
+    return sorted(n for n in names if n not in ("query_template", "user_groups_query"))
+
+
+def representative_repos(n):
+    """n repos at evenly spaced ranks of the contributor-action statistic."""
+    ranked = RepoStats().ranked("contributor_actions")
+    if not ranked:
+        sys.exit("no repo statistics, pass --repos")
+    n = min(n, len(ranked))
+    picks = [ranked[round(i * (len(ranked) - 1) / max(n - 1, 1))] for i in range(n)]
+    return [r for r, _ in picks]
+
+
+def encode(cm, df):
+    """Per-chunk, per-column blobs of df as setm writes them."""
+    _, chunks = cm._serialize_chunks(df)
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    repos = parser.add_mutually_exclusive_group(required=True)
+    repos.add_argument("--repos", type=int, nargs="+", help="cached repo_ids to read")
+    repos.add_argument("--representative", type=int, metavar="N", help="read N repos of different sizes")
+    parser.add_argument("--levels", type=int, nargs="+", default=[None], help="compression levels to try")
+    parser.add_argument("--runs", type=int, default=5, help="timed repetitions, best is reported")
+    args = parser.parse_args()
+
+    if args.representative:
+        args.repos = representative_repos(args.representative)
+        print(f"repos: {args.repos}")
+
+    cm = CacheManager()
+    codecs = [("none", None)] + [(c, lvl) for c in ("lz4", "zstd") for lvl in args.levels]
+
+    print(f"{'query':>38} {'codec':>8} {'rows':>9} {'bytes':>12} {'ratio':>6} {'encode_s':>9} {'decode_s':>9}")
+    for name in query_names():
+        # the cache key only depends on the function's name and source
+        func = SimpleNamespace(__name__=name, __module__=f"queries.{name}")
+        df = cm.grabm(func=func, repos=args.repos)
+        if df is None:
+            print(f"{name:>38} not cached for all repos, skipped")
+            continue
+
+        raw_bytes = None
+        for codec, level in codecs:
+            cm.set_codec(codec, level)
+
+            encode_s = float("inf")
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                blobs = encode(cm, df)
+                encode_s = min(encode_s, time.perf_counter() - start)
+
+            decode_s = float("inf")
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                cm._assemble([blobs])
+                decode_s = min(decode_s, time.perf_counter() - start)
+
+            n_bytes = sum(len(b) for chunk in blobs for b in chunk.values())
+            raw_bytes = raw_bytes or n_bytes
+            label = codec if level is None else f"{codec}:{level}"
+            print(
+                f"{name:>38} {label:>8} {len(df):>9} {n_bytes:>12} {raw_bytes / n_bytes:>6.2f} "
+                f"{encode_s:>9.4f} {decode_s:>9.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
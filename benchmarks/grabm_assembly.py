@@ -0,0 +1,145 @@
+"""
+    Benchmark: assembling a multi-repo DataFrame from cached blobs.
+
+    Compares the previous CacheManager.grabm path (one feather blob per repo,
+    pd.read_feather each, then pd.concat) against the current path (per-column
+    Arrow IPC blobs, zero-copy pa.concat_tables, a single to_pandas).
+
+    Redis isn't involved- both paths are fed the same in-memory blobs so that
+    only decode + assembly is measured. Each (path, n_repos) case runs in a
+    fresh subprocess so that peak RSS isn't polluted by earlier cases.
+
+    Usage:
+        python benchmarks/grabm_assembly.py [--repos 10 100 1000] [--rows 2000]
+"""
+import argparse
+import datetime as dt
+import io
+import json
+import os
+import pickle
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "8Knot"))
+
+from cache_manager.cache_manager import CacheManager  # noqa: E402
+
+PATHS = ["feather_concat", "arrow_concat"]
+
+
+def make_repo_frame(rng, rows, repo_id):
+    """Synthetic frame shaped like contributors_query output for one repo."""
+    actions = np.array(["Commit", "PR Opened", "PR Comment", "Issue Opened", "Issue Comment", "PR Review"])
+    logins = np.array([f"user{i}" for i in range(500)])
+    days = rng.integers(0, 3650, rows)
+    return pd.DataFrame(
+        {
+            "id": np.full(rows, repo_id),
+            "repo_name": np.full(rows, f"repo-{repo_id}", dtype=object),
+            "cntrb_id": [f"01000{c:010d}" for c in rng.integers(0, 10**9, rows)],
+            "created_at": [dt.date(2013, 1, 1) + dt.timedelta(days=int(d)) for d in days],
+            "login": logins[rng.integers(0, len(logins), rows)],
+            "Action": actions[rng.integers(0, len(actions), rows)],
+            "rank": rng.integers(1, 50, rows),
+        }
+    )
+
+
+def make_blobs(n_repos, rows):
+    """Builds the cached representation of n_repos frames for both paths."""
+    rng = np.random.default_rng(0)
+    cm = CacheManager()
+    feather_blobs, column_blobs = [], []
+    for r in range(n_repos):
+        df = make_repo_frame(rng, rows, r)
+
+        b = io.BytesIO()
+        df.to_feather(b)
+        feather_blobs.append(b.getvalue())
+
+        _, chunks = cm._serialize_chunks(df)
+        column_blobs.append(chunks)
+    return {"feather_concat": feather_blobs, "arrow_concat": column_blobs}
+
+
+def assemble_feather_concat(blobs):
+    """Previous grabm path."""
+    pd_dfs = []
+    for bdf in blobs:
+        bbuff = io.BytesIO(bdf)
+        bbuff.seek(0)
+        pd_dfs.append(pd.read_feather(bbuff))
+    return pd.concat(pd_dfs)
+
+
+def assemble_arrow_concat(blobs):
+    """Current grabm path."""
+    return CacheManager()._assemble(blobs)
+
+
+def run_case(path, blob_file):
+    """Runs in a subprocess: loads blobs, assembles once, reports timings."""
+    with open(blob_file, "rb") as f:
+        blobs = pickle.load(f)[path]
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    df = assemble_feather_concat(blobs) if path == "feather_concat" else assemble_arrow_concat(blobs)
+    wall = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in KiB on Linux
+    print(
+        json.dumps(
+            {
+                "rows": len(df),
+                "wall_s": wall,
+                "peak_rss_mb": rss_after / 1024,
+                "assembly_rss_mb": (rss_after - rss_before) / 1024,
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repos", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--rows", type=int, default=2000, help="rows per repo")
+    parser.add_argument("--case", nargs=2, metavar=("PATH", "BLOB_FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(*args.case)
+        return
+
+    print(f"{'repos':>6} {'path':>15} {'rows':>10} {'wall_s':>8} {'peak_rss_mb':>12} {'assembly_rss_mb':>16}")
+    for n in args.repos:
+        with tempfile.NamedTemporaryFile(suffix=".pkl", delete=False) as f:
+            pickle.dump(make_blobs(n, args.rows), f)
+            blob_file = f.name
+        try:
+            for path in PATHS:
+                out = subprocess.run(
+                    [sys.executable, __file__, "--case", path, blob_file],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )
+                r = json.loads(out.stdout)
+                print(
+                    f"{n:>6} {path:>15} {r['rows']:>10} {r['wall_s']:>8.3f} "
+                    f"{r['peak_rss_mb']:>12.1f} {r['assembly_rss_mb']:>16.1f}"
+                )
+        finally:
+            os.remove(blob_file)
+
+
+if __name__ == "__main__":
+    main()
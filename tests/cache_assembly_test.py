@@ -0,0 +1,45 @@
+"""
+    Frames of several repos are assembled into one.
+"""
+import pandas as pd
+
+
+def counts_query(self, repos):
+    """Stands in for a query whose results are cached."""
+
+
+def test_repos_are_concatenated_in_the_requested_order(cache):
+    datas = [pd.DataFrame({"id": [r] * r, "value": range(r)}) for r in (1, 2, 3)]
+    assert cache.setm(func=counts_query, repos=[1, 2, 3], datas=datas)
+
+    df = cache.grabm(func=counts_query, repos=[3, 1, 2])
+
+    expected = pd.concat([datas[2], datas[0], datas[1]], ignore_index=True)
+    pd.testing.assert_frame_equal(df.reset_index(drop=True), expected)
+
+
+def test_all_null_and_empty_repos_take_the_type_of_the_others(cache):
+    datas = [
+        pd.DataFrame({"name": ["a", "b"], "value": [1.5, 2.5]}),
+        pd.DataFrame({"name": [None], "value": [None]}),
+        pd.DataFrame({"name": pd.Series([], dtype=object), "value": pd.Series([], dtype=float)}),
+    ]
+    assert cache.setm(func=counts_query, repos=[1, 2, 3], datas=datas)
+
+    df = cache.grabm(func=counts_query, repos=[1, 2, 3]).reset_index(drop=True)
+
+    assert df["value"].tolist()[:2] == [1.5, 2.5]
+    assert df["value"].isna().tolist() == [False, False, True]
+    assert df["name"].tolist()[:2] == ["a", "b"]
+    assert df["name"].isna().tolist() == [False, False, True]
+
+
+def test_frames_can_be_modified_in_place(cache):
+    # a single repo's columns could be handed out without a copy
+    assert cache.setm(func=counts_query, repos=[1], datas=[pd.DataFrame({"value": [1, 2, 3]})])
+
+    df = cache.grabm(func=counts_query, repos=[1])
+    df.loc[df["value"] > 1, "value"] = 0
+    df["value"] += 1
+
+    assert df["value"].tolist() == [2, 1, 1]
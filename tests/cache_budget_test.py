@@ -0,0 +1,133 @@
+"""
+    Cached results expire, and the cache is kept under its byte budget.
+"""
+import pandas as pd
+import pytest
+
+import cache_manager.cache_manager as cmm
+
+
+@pytest.fixture
+def cache(cache, monkeypatch):
+    monkeypatch.setattr(cmm, "EVICTION_GRACE", 0)
+    return cache
+
+
+def counts_query(self, repos):
+    """Stands in for a query whose results are cached."""
+
+
+def frame(n):
+    return pd.DataFrame({"key": [str(i) for i in range(n)], "value": range(n)})
+
+
+def indexed_bytes(cache):
+    return sum(int(v) for v in cache._redis.hvals(cmm.SIZES_INDEX))
+
+
+def total_bytes(cache):
+    return int(cache._redis.get(cmm.TOTAL_BYTES))
+
+
+def last_used(cache, times):
+    """Sets the last access time of each repo's key."""
+    for r, t in times.items():
+        cache._redis.zadd(cmm.ACCESS_INDEX, {cache._get_hash(counts_query, r): t})
+
+
+def test_keys_get_the_query_ttl(cache, monkeypatch):
+    monkeypatch.setenv("CACHE_TTL", "100")
+    monkeypatch.setenv("CACHE_TTL_COUNTS_QUERY", "50")
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame(10)])
+
+    assert 0 < cache.metadata(func=counts_query, repo=1)["ttl"] <= 50
+
+
+def test_ttl_of_zero_keeps_keys(cache, monkeypatch):
+    monkeypatch.setenv("CACHE_TTL", "0")
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame(10)])
+
+    assert cache.metadata(func=counts_query, repo=1)["ttl"] == -1
+
+
+def test_reads_count_as_hits(cache):
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame(10)])
+    cache.grabm(func=counts_query, repos=[1])
+    cache.grabm(func=counts_query, repos=[1])
+
+    assert cache.metadata(func=counts_query, repo=1)["hits"] == 2
+
+
+def test_least_recently_used_keys_are_evicted_over_budget(cache):
+    assert cache.setm(func=counts_query, repos=[1, 2, 3], datas=[frame(100)] * 3)
+    last_used(cache, {1: 3.0, 2: 1.0, 3: 2.0})
+
+    # room for two of the three keys
+    cache._max_bytes = indexed_bytes(cache) - 1
+    cache._enforce_budget()
+
+    assert cache.missingm(func=counts_query, repos=[1, 2, 3]) == [2]
+    assert indexed_bytes(cache) <= cache._max_bytes
+
+
+def test_least_frequently_used_keys_are_evicted_over_budget(cache):
+    cache._eviction_policy = "lfu"
+    assert cache.setm(func=counts_query, repos=[1, 2, 3], datas=[frame(100)] * 3)
+    cache.grabm(func=counts_query, repos=[1])
+    cache.grabm(func=counts_query, repos=[1, 3])
+
+    # ties in hits are broken by last access
+    cache.grabm(func=counts_query, repos=[2])
+    last_used(cache, {1: 1.0, 2: 2.0, 3: 3.0})
+
+    cache._max_bytes = indexed_bytes(cache) - 1
+    cache._enforce_budget()
+
+    assert cache.missingm(func=counts_query, repos=[1, 2, 3]) == [2]
+
+
+def test_recently_used_keys_are_kept_over_budget(cache, monkeypatch):
+    monkeypatch.setattr(cmm, "EVICTION_GRACE", 600)
+    assert cache.setm(func=counts_query, repos=[1, 2], datas=[frame(100)] * 2)
+
+    cache._max_bytes = 1
+    cache._enforce_budget()
+
+    assert cache.missingm(func=counts_query, repos=[1, 2]) == []
+
+
+def test_total_follows_writes_and_rewrites(cache):
+    assert cache.setm(func=counts_query, repos=[1, 2], datas=[frame(10), frame(20)])
+    assert total_bytes(cache) == indexed_bytes(cache) > 0
+
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame(1000)])
+    assert total_bytes(cache) == indexed_bytes(cache)
+
+
+def test_total_follows_evictions(cache):
+    assert cache.setm(func=counts_query, repos=[1, 2, 3], datas=[frame(100)] * 3)
+    last_used(cache, {1: 3.0, 2: 1.0, 3: 2.0})
+
+    cache._max_bytes = total_bytes(cache) - 1
+    cache._enforce_budget()
+
+    assert total_bytes(cache) == indexed_bytes(cache) <= cache._max_bytes
+
+
+def test_expired_keys_leave_the_total(cache):
+    assert cache.setm(func=counts_query, repos=[1, 2], datas=[frame(10), frame(10)])
+    cache._redis.delete(cache._get_hash(counts_query, 1))
+
+    cache._max_bytes = 1 << 30
+    assert cache.setm(func=counts_query, repos=[3], datas=[frame(10)])
+
+    assert cache._get_hash(counts_query, 1).encode() not in cache._redis.hkeys(cmm.SIZES_INDEX)
+    assert total_bytes(cache) == indexed_bytes(cache)
+
+
+def test_missing_total_is_summed_from_the_index(cache):
+    assert cache.setm(func=counts_query, repos=[1, 2], datas=[frame(10), frame(20)])
+    cache._redis.delete(cmm.TOTAL_BYTES)
+
+    assert cache.setm(func=counts_query, repos=[3], datas=[frame(30)])
+    assert total_bytes(cache) == indexed_bytes(cache)
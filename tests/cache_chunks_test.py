@@ -0,0 +1,71 @@
+"""
+    Oversized frames are stored in chunks of rows.
+"""
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import cache_manager.cache_manager as cmm
+
+
+@pytest.fixture
+def cache(cache):
+    cache._chunk_bytes = 1024
+    return cache
+
+
+def counts_query(self, repos):
+    """Stands in for a query whose results are cached."""
+
+
+def frame(n):
+    return pd.DataFrame({"key": [f"k{i}" for i in range(n)], "value": range(n)})
+
+
+def chunk_keys(cache, repo):
+    return cache._redis.keys(f"{cache._get_hash(counts_query, repo)}:*")
+
+
+def test_oversized_frames_are_chunked(cache):
+    assert cache.setm(func=counts_query, repos=[1, 2], datas=[frame(1000), frame(10)])
+
+    n_chunks = cache.metadata(func=counts_query, repo=1)["chunks"]
+    assert n_chunks > 1
+    assert len(chunk_keys(cache, 1)) == n_chunks
+    assert cache.metadata(func=counts_query, repo=2)["chunks"] == 0
+
+    df = cache.grabm(func=counts_query, repos=[1, 2])
+    pd.testing.assert_frame_equal(df.reset_index(drop=True), pd.concat([frame(1000), frame(10)], ignore_index=True))
+
+
+def test_chunked_frames_are_projected(cache):
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame(1000)])
+
+    df = cache.grabm(func=counts_query, repos=[1], columns=["value"])
+
+    pd.testing.assert_frame_equal(df, frame(1000)[["value"]])
+
+
+def test_rewrites_remove_the_old_chunks(cache):
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame(1000)])
+    old = set(chunk_keys(cache, 1))
+
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame(2000)])
+    assert not old & set(chunk_keys(cache, 1))
+
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame(10)])
+    assert chunk_keys(cache, 1) == []
+    pd.testing.assert_frame_equal(cache.grabm(func=counts_query, repos=[1]), frame(10))
+
+
+def test_chunks_with_null_columns_take_the_type_of_the_others():
+    tables = [pa.table({"value": pa.array([None, None], pa.null())}), pa.table({"value": pa.array([1.5])})]
+
+    assert cmm._concat_tables(tables).column("value").to_pylist() == [None, None, 1.5]
+
+
+def test_chunks_of_conflicting_types_raise():
+    tables = [pa.table({"value": pa.array(["a"])}), pa.table({"value": pa.array([1.5])})]
+
+    with pytest.raises(pa.ArrowTypeError):
+        cmm._concat_tables(tables)
@@ -0,0 +1,55 @@
+"""
+    Column blobs are compressed with the configured codec.
+"""
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import cache_manager.cache_manager as cmm
+
+
+def counts_query(self, repos):
+    """Stands in for a query whose results are cached."""
+
+
+def frame():
+    return pd.DataFrame({"key": ["spam"] * 1000, "value": range(1000)})
+
+
+@pytest.mark.parametrize("codec", [c for c in cmm.CODECS if c == "none" or pa.Codec.is_available(c)])
+def test_frames_are_read_back_with_every_codec(cache, codec):
+    cache.set_codec(codec)
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame()])
+
+    pd.testing.assert_frame_equal(cache.grabm(func=counts_query, repos=[1]), frame())
+    assert cache.metadata(func=counts_query, repo=1)["codec"] == codec
+
+
+def test_compressed_blobs_are_smaller(cache):
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame()])
+    cache.set_codec("zstd", level=3)
+    assert cache.setm(func=counts_query, repos=[2], datas=[frame()])
+
+    sizes = [cache.metadata(func=counts_query, repo=r)["size"] for r in (1, 2)]
+    assert sizes[1] < sizes[0]
+    assert cache.metadata(func=counts_query, repo=2)["codec"] == "zstd:3"
+
+
+def test_keys_of_different_codecs_are_read_together(cache):
+    cache.set_codec("lz4")
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame()])
+    cache.set_codec("none")
+    assert cache.setm(func=counts_query, repos=[2], datas=[frame()])
+
+    df = cache.grabm(func=counts_query, repos=[1, 2])
+
+    assert len(df) == 2000
+    assert df["value"].sum() == 2 * frame()["value"].sum()
+
+
+def test_unknown_codecs_fall_back_to_none(cache):
+    cache.set_codec("snappy")
+
+    assert cache._codec == "none"
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame()])
+    assert cache.metadata(func=counts_query, repo=1)["codec"] == "none"
@@ -0,0 +1,58 @@
+"""
+    Cached frames are stored per column, readers fetch only the columns they use.
+"""
+import pandas as pd
+import pytest
+
+
+def counts_query(self, repos):
+    """Stands in for a query whose results are cached."""
+
+
+def frame():
+    return pd.DataFrame(
+        {
+            "key": ["a", "b", None],
+            "value": [1, 2, 3],
+            "created": pd.to_datetime(["2022-01-01", None, "2022-03-01"], utc=True),
+        }
+    )
+
+
+def test_frames_are_read_back_as_written(cache):
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame()])
+
+    pd.testing.assert_frame_equal(cache.grabm(func=counts_query, repos=[1]), frame())
+
+
+def test_grabm_returns_the_requested_columns_in_order(cache):
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame()])
+
+    df = cache.grabm(func=counts_query, repos=[1], columns=["created", "key"])
+
+    pd.testing.assert_frame_equal(df, frame()[["created", "key"]])
+
+
+def test_unknown_columns_raise(cache):
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame()])
+
+    with pytest.raises(KeyError):
+        cache.grabm(func=counts_query, repos=[1], columns=["key", "missing"])
+
+
+def test_rewrites_replace_every_column(cache):
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame()])
+    assert cache.setm(func=counts_query, repos=[1], datas=[pd.DataFrame({"other": [1.5]})])
+
+    df = cache.grabm(func=counts_query, repos=[1])
+
+    assert list(df.columns) == ["other"]
+    with pytest.raises(KeyError):
+        cache.grabm(func=counts_query, repos=[1], columns=["key"])
+
+
+def test_grabm_waits_for_every_repo(cache):
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame()])
+
+    assert cache.grabm(func=counts_query, repos=[1, 2]) is None
+    assert cache.existsm(func=counts_query, repos=[1, 2]) == 1
@@ -0,0 +1,63 @@
+"""
+    Decoded columns are kept per process in front of Redis.
+"""
+import pandas as pd
+import pyarrow as pa
+
+import cache_manager.cache_manager as cmm
+
+
+def counts_query(self, repos):
+    """Stands in for a query whose results are cached."""
+
+
+def frame(values):
+    return pd.DataFrame({"key": [str(v) for v in values], "value": values})
+
+
+def test_columns_are_decoded_once(cache):
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame([1, 2])])
+    cache.grabm(func=counts_query, repos=[1], columns=["value"])
+
+    # a blob changed behind the version's back is never downloaded again
+    h = cache._get_hash(counts_query, 1)
+    cache._redis.hset(h, "value", b"garbage")
+
+    assert cache.grabm(func=counts_query, repos=[1], columns=["value"])["value"].tolist() == [1, 2]
+
+
+def test_rewrites_invalidate_decoded_columns(cache):
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame([1, 2])])
+    cache.grabm(func=counts_query, repos=[1])
+
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame([3])])
+
+    pd.testing.assert_frame_equal(cache.grabm(func=counts_query, repos=[1]), frame([3]))
+
+
+def test_least_recently_used_columns_are_dropped_over_the_cap():
+    col = pa.chunked_array([pa.array(range(10), pa.int64())])
+    l1 = cmm._DecodedCache(max_bytes=2 * col.nbytes)
+
+    l1.put("a", "v1", "value", col)
+    l1.put("b", "v1", "value", col)
+    assert l1.get("a", "v1", "value") is not None
+    l1.put("c", "v1", "value", col)
+
+    assert l1.get("b", "v1", "value") is None
+    assert l1.get("a", "v1", "value") is not None
+    assert l1.get("c", "v1", "value") is not None
+
+
+def test_new_versions_drop_the_old_ones():
+    l1 = cmm._DecodedCache(max_bytes=1 << 20)
+    col = pa.chunked_array([pa.array(range(10), pa.int64())])
+
+    l1.put("a", "v1", "key", col)
+    l1.put("a", "v1", "value", col)
+    l1.put("a", "v2", "value", col)
+
+    assert l1.get("a", "v1", "key") is None
+    assert l1.get("a", "v1", "value") is None
+    assert l1.get("a", "v2", "value") is not None
+    assert l1._nbytes == col.nbytes
@@ -0,0 +1,91 @@
+"""
+    Merging fetched rows into cached frames.
+"""
+import time
+
+import pandas as pd
+
+import cache_manager.cache_manager as cmm
+
+
+def counts_query(self, repos):
+    """Stands in for a query whose results are cached."""
+
+
+def test_mergem_replaces_rows_with_the_same_keys(cache):
+    cached = pd.DataFrame({"key": ["a", "b"], "value": [1, 2]})
+    assert cache.setm(func=counts_query, repos=[1], datas=[cached])
+
+    delta = pd.DataFrame({"key": ["b", "c"], "value": [5, 3]})
+    assert cache.mergem(func=counts_query, repos=[1], deltas=[delta], watermarks=[None], keys=["key"])
+
+    merged = cache.grabm(func=counts_query, repos=[1]).sort_values("key", ignore_index=True)
+    assert merged["value"].tolist() == [1, 5, 3]
+
+
+def test_mergem_sorts_the_merged_frames(cache):
+    cached = pd.DataFrame({"key": ["b", "d"], "value": [2, 4]})
+    assert cache.setm(func=counts_query, repos=[1], datas=[cached])
+
+    delta = pd.DataFrame({"key": ["c", "a"], "value": [3, 1]})
+    assert cache.mergem(func=counts_query, repos=[1], deltas=[delta], watermarks=[None], keys=["key"], sort_by="key")
+
+    assert cache.grabm(func=counts_query, repos=[1])["value"].tolist() == [1, 2, 3, 4]
+
+
+def test_unchanged_repos_are_marked_fresh(cache):
+    frame = pd.DataFrame({"key": ["a"], "value": [1]})
+    assert cache.setm(func=counts_query, repos=[1, 2], datas=[frame, frame], watermarks=["2022-01-01", "2022-01-01"])
+    version = cache.versions(func=counts_query, repos=[1])
+    cache._redis.hset(cache._get_hash(counts_query, 1), cmm.FETCHED_AT_FIELD, 0)
+    cache._redis.hset(cache._get_hash(counts_query, 2), cmm.FETCHED_AT_FIELD, 0)
+
+    empty = frame.iloc[:0]
+    assert cache.mergem(func=counts_query, repos=[1], deltas=[empty], watermarks=["2022-02-01"], keys=["key"])
+
+    assert cache.stalem(func=counts_query, repos=[1, 2], max_age=60) == [2]
+    assert cache.watermarks(func=counts_query, repos=[1, 2]) == ["2022-02-01", "2022-01-01"]
+    assert cache.versions(func=counts_query, repos=[1]) == version
+
+
+def test_repos_that_left_the_cache_are_skipped(cache):
+    delta = pd.DataFrame({"key": ["a"], "value": [1]})
+    assert cache.mergem(func=counts_query, repos=[1], deltas=[delta], watermarks=["2022-02-01"], keys=["key"])
+    assert cache.mergem(func=counts_query, repos=[1], deltas=[delta.iloc[:0]], watermarks=["2022-02-01"])
+
+    assert cache.missingm(func=counts_query, repos=[1]) == [1]
+
+
+def test_stalem_leaves_out_uncached_repos(cache):
+    frame = pd.DataFrame({"key": ["a"], "value": [1]})
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame])
+
+    assert cache.stalem(func=counts_query, repos=[1, 2], max_age=60) == []
+    time.sleep(0.01)
+    assert cache.stalem(func=counts_query, repos=[1, 2], max_age=0) == [1]
+
+
+def test_high_water_marks_stop_before_left_out_rows():
+    ids = pd.Series([1, 1, 2, 2])
+    marks = pd.to_datetime(pd.Series(["2022-01-01", "2022-01-05", "2022-01-02", "2022-01-09"]), utc=True)
+    left_out = pd.Series([False, False, False, True])
+
+    hwm = cmm.high_water_marks(ids, marks, [1, 2, 3], left_out=left_out)
+
+    assert [pd.Timestamp(m) for m in hwm] == [
+        pd.Timestamp("2022-01-05", tz="UTC"),
+        pd.Timestamp("2022-01-02", tz="UTC"),
+        pd.Timestamp("2022-01-05", tz="UTC"),
+    ]
+
+
+def test_high_water_marks_keep_previous_marks_of_repos_without_rows():
+    ids = pd.Series([1])
+    marks = pd.to_datetime(pd.Series(["2022-01-05"]), utc=True)
+
+    hwm = cmm.high_water_marks(ids, marks, [1, 2], previous=[None, "2021-12-01 00:00:00+00:00"])
+
+    assert [pd.Timestamp(m) for m in hwm] == [
+        pd.Timestamp("2022-01-05", tz="UTC"),
+        pd.Timestamp("2021-12-01", tz="UTC"),
+    ]
@@ -0,0 +1,179 @@
+"""
+    Every query's cached frames must have the columns its CACHE_SCHEMA declares.
+
+    Each query runs against a fake Augur that returns a few rows with the
+    columns of the query's SELECT list, and a fake cache that puts every
+    frame written through '_conform' with the schema it was written with,
+    as CacheManager does.
+"""
+import importlib
+import re
+import sys
+import types
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from cache_manager.cache_manager import _conform
+
+QUERIES = [
+    "change_request_closure_ratio_query",
+    "change_requests_accepted_query",
+    "cntrb_per_file_query",
+    "commits_query",
+    "company_query",
+    "contributors_query",
+    "issue_assignee_query",
+    "issues_closed_query",
+    "issues_query",
+    "issues_updated_query",
+    "pr_assignee_query",
+    "pr_response_query",
+    "prs_query",
+    "release_frequency_query",
+    "repo_files_query",
+]
+
+REFRESHABLE = ["commits_query", "issues_query"]
+
+REPOS = [1, 2]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def celery_app():
+    """Stands in for the app module, whose Celery tasks are plain functions here."""
+    app = types.ModuleType("app")
+    app.celery_app = types.SimpleNamespace(task=lambda **kwargs: (lambda f: f))
+    saved = sys.modules.get("app")
+    sys.modules["app"] = app
+    yield
+    if saved is None:
+        del sys.modules["app"]
+    else:
+        sys.modules["app"] = saved
+
+
+def _select_columns(query_string):
+    """Output column names of a query's outermost SELECT list, None for SELECT *."""
+    body = re.search(r"SELECT\s+(?:distinct\s+)?(.*?)\s+FROM\s", query_string, re.S | re.I).group(1)
+    if body.strip() == "*":
+        return None
+
+    items, depth, current = [], 0, ""
+    for c in body:
+        depth += {"(": 1, ")": -1}.get(c, 0)
+        if c == "," and depth == 0:
+            items.append(current)
+            current = ""
+        else:
+            current += c
+    items.append(current)
+
+    # unquoted names are folded to lowercase by Postgres.
+    names = []
+    for item in items:
+        alias = re.search(r"\bAS\s+(\w+)\s*$", item.strip(), re.I)
+        names.append((alias.group(1) if alias else item.strip().split(".")[-1]).lower())
+    return names
+
+
+def _rows(columns, module):
+    """A few rows per repo for the columns, typed as Augur would return them."""
+    types_ = {**module.CACHE_SCHEMA, **getattr(module, "COLUMN_TYPES", {})}
+    n = 2 * len(REPOS)
+    data = {}
+    for c in columns:
+        t = types_.get(c)
+        if c in ("id", "repo_id"):
+            data[c] = [r for r in REPOS for _ in range(2)]
+        elif t is not None and pa.types.is_timestamp(t):
+            data[c] = pd.to_datetime(["2022-01-03", None] * len(REPOS), utc=True)
+        elif t is not None and pa.types.is_integer(t):
+            data[c] = list(range(n))
+        else:
+            # ids, names and dates as text; every other row null.
+            data[c] = ["2022-01-03T12:00:00Z", None] * len(REPOS)
+    return pd.DataFrame(data)
+
+
+class FakeAugur:
+    """AugurManager returning rows with the queried columns."""
+
+    module = None
+
+    def get_engine(self):
+        return None
+
+    def run_query(self, query_string, params=None, column_types=None):
+        columns = _select_columns(query_string)
+        if columns is None:
+            columns = ["id"] + list(self.module.CACHE_SCHEMA)
+        return _rows(columns, self.module)
+
+    def stream_query(self, query_string, params=None, column_types=None):
+        yield self.run_query(query_string, params, column_types)
+
+
+class FakeCache:
+    """CacheManager conforming every written frame to its declared schema."""
+
+    written = []
+
+    def _write(self, func, datas, schema):
+        for data in datas:
+            table = data if isinstance(data, pa.Table) else pa.Table.from_pandas(data, preserve_index=False)
+            _conform(table, schema or {})
+            FakeCache.written.append(func.__name__)
+        return True
+
+    def setm(self, func, repos, datas, watermarks=None, schema=None):
+        return self._write(func, datas, schema)
+
+    def mergem(self, func, repos, deltas, watermarks, keys=None, sort_by=None, schema=None):
+        return self._write(func, deltas, schema)
+
+    def watermarks(self, func, repos):
+        return [pd.Timestamp("2022-01-01", tz="UTC").isoformat() for _ in repos]
+
+    def grabm(self, func, repos, columns=None):
+        return None
+
+    def stream(self, func, repos, previous=None, schema=None):
+        cache = self
+
+        class Stream:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def write(self, df, marks=None, left_out=None):
+                cache._write(func, [df if left_out is None else df[~left_out]], schema)
+
+            def close(self):
+                return True
+
+        return Stream()
+
+
+def _run(name, monkeypatch, **kwargs):
+    module = importlib.import_module(f"queries.{name}")
+    monkeypatch.setattr(FakeAugur, "module", module)
+    monkeypatch.setattr(module, "AugurManager", FakeAugur)
+    monkeypatch.setattr(module, "cm", FakeCache)
+    FakeCache.written = []
+
+    assert getattr(module, name)(None, REPOS, **kwargs)
+    assert name in FakeCache.written
+
+
+@pytest.mark.parametrize("name", QUERIES)
+def test_cached_frames_match_schema(name, monkeypatch):
+    _run(name, monkeypatch)
+
+
+@pytest.mark.parametrize("name", REFRESHABLE)
+def test_refreshed_frames_match_schema(name, monkeypatch):
+    _run(name, monkeypatch, refresh=True)
@@ -0,0 +1,40 @@
+"""
+    Waiting for cached results is woken by the writes that publish them.
+"""
+import threading
+import time
+
+import pandas as pd
+
+
+def counts_query(self, repos):
+    """Stands in for a query whose results are cached."""
+
+
+def test_wait_for_returns_once_every_repo_is_written(cache):
+    frame = pd.DataFrame({"value": [1]})
+    assert cache.setm(func=counts_query, repos=[1], datas=[frame])
+
+    writer = threading.Timer(0.2, cache.setm, kwargs={"func": counts_query, "repos": [2], "datas": [frame]})
+    writer.start()
+    try:
+        start = time.monotonic()
+        df = cache.wait_for(func=counts_query, repos=[1, 2], timeout=5)
+    finally:
+        writer.join()
+
+    assert df["value"].tolist() == [1, 1]
+    assert time.monotonic() - start < 5
+
+
+def test_wait_for_returns_cached_results_right_away(cache):
+    assert cache.setm(func=counts_query, repos=[1], datas=[pd.DataFrame({"value": [1]})])
+
+    assert cache.wait_for(func=counts_query, repos=[1], timeout=0)["value"].tolist() == [1]
+
+
+def test_wait_for_gives_up_after_the_timeout(cache):
+    start = time.monotonic()
+
+    assert cache.wait_for(func=counts_query, repos=[1], timeout=0.2) is None
+    assert time.monotonic() - start < 5
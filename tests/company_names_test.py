@@ -0,0 +1,117 @@
+"""
+    CompanyIndex groups the spellings of company names that the affiliation
+    chart used to group by fuzzy matching every name with every other one.
+"""
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pages.utils.company_names import CompanyIndex, normalize
+
+
+def partial_ratio(s1, s2):
+    """fuzzywuzzy's fuzz.partial_ratio, as computed without python-Levenshtein."""
+    if s1 == s2:
+        return 100
+    if len(s1) == 0 or len(s2) == 0:
+        return 0
+
+    shorter, longer = (s1, s2) if len(s1) <= len(s2) else (s2, s1)
+    scores = []
+    for block in SequenceMatcher(None, shorter, longer).get_matching_blocks():
+        long_start = max(block[1] - block[0], 0)
+        r = SequenceMatcher(None, shorter, longer[long_start : long_start + len(shorter)]).ratio()
+        if r > 0.995:
+            return 100
+        scores.append(r)
+    return int(round(100 * max(scores)))
+
+
+def fuzzy_canonical(companies):
+    """Group name of each company name, as gh_company_affiliation used to match them."""
+    df = companies.value_counts(dropna=False).to_frame("contribution_count")
+    df["company_name"] = [str(name) for name in df.index]
+    df = df.reset_index(drop=True)
+
+    df["match"] = [
+        [i for i, other in enumerate(df["company_name"]) if partial_ratio(other, name) >= 70]
+        for name in df["company_name"]
+    ]
+    for x in range(0, len(df)):
+        for y in df.iloc[x]["match"]:
+            df.loc[y, "company_name"] = df.iloc[x]["company_name"]
+            df.loc[y, "match"] = ""
+
+    return df
+
+
+SPELLINGS = {
+    "Red Hat": 40,
+    "Red Hat, Inc.": 12,
+    "Red Hat Inc": 5,
+    "Microsoft": 30,
+    "Microsoft Corporation": 8,
+    "Google": 25,
+    "Google LLC": 6,
+    "IBM": 20,
+    "Intel": 15,
+    "Intel Corporation": 4,
+    "VMware": 10,
+    "VMware, Inc.": 3,
+    "SUSE": 7,
+    "Canonical": 6,
+    "Canonical Ltd.": 2,
+}
+
+
+@pytest.fixture
+def companies():
+    rng = np.random.default_rng(0)
+    names = [name for name, n in SPELLINGS.items() for _ in range(n)]
+    return pd.Series(rng.permutation(np.array(names, dtype=object)))
+
+
+def test_groups_match_the_fuzzy_matching(companies):
+    old = fuzzy_canonical(companies)
+    names = pd.Series(companies.value_counts().index)
+    old_groups = dict(zip(names, old["company_name"]))
+
+    counts = companies.value_counts()
+    canonical = CompanyIndex(counts.index, counts.to_numpy()).canonical()
+
+    assert canonical.to_dict() == old_groups
+
+
+def test_weights_count_like_rows(companies):
+    counts = companies.value_counts()
+
+    by_rows = CompanyIndex(companies).canonical()
+    by_weights = CompanyIndex(counts.index, counts.to_numpy()).canonical()
+
+    pd.testing.assert_series_equal(by_rows.sort_index(), by_weights.sort_index())
+
+
+def test_missing_companies_are_kept_out_of_matching():
+    companies = pd.Series(["Financial"] * 3 + [np.nan] * 5, dtype=object)
+
+    # the old matching compared "nan" with the names, and it appears within "Financial"
+    old = fuzzy_canonical(companies)
+    assert set(old["company_name"]) == {"nan"}
+
+    canonical = CompanyIndex(companies).canonical()
+    assert canonical.to_dict() == {"Financial": "Financial"}
+
+
+def test_names_without_a_key_are_their_own_group():
+    canonical = CompanyIndex(pd.Series(["Inc.", "@", "Red Hat", "Red Hat"])).canonical()
+
+    assert canonical.to_dict() == {"Red Hat": "Red Hat", "Inc.": "Inc.", "@": "@"}
+
+
+def test_normalize_drops_case_punctuation_accents_and_legal_suffixes():
+    keys = normalize(pd.Series(["Red Hat, Inc.", "@RedHat", "Société Générale S.A.", "The Linux Foundation", None]))
+
+    assert keys.iloc[:4].tolist() == ["red hat", "redhat", "societe generale s a", "linux foundation"]
+    assert pd.isna(keys.iloc[4])
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import fakeredis
+import pytest
+
+# modules import each other relative to the app directory, as in the containers.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "8Knot"))
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """CacheManager backed by an in-memory Redis server of its own."""
+    import cache_manager.cache_manager as cmm
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(cmm, "cache_client", lambda **kwargs: fakeredis.FakeStrictRedis(server=server, **kwargs))
+    monkeypatch.setattr(cmm, "_L1", cmm._DecodedCache(cmm._L1.max_bytes))
+    return cmm.CacheManager()
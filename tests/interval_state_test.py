@@ -0,0 +1,133 @@
+"""
+    IntervalState and period_sums answer every date at once what the
+    charts used to compute by filtering the frame once per date.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from dateutil.relativedelta import relativedelta
+
+from pages.utils.interval_state import IntervalState, period_sums
+
+
+def get_open(df, date):
+    """Open items at a date, as issues_over_time used to count them."""
+    df_lim = df[df["created"] <= date]
+    df_open = df_lim[df_lim["closed"] > date]
+    df_open = pd.concat([df_open, df_lim[df_lim.closed.isnull()]])
+    return df_open.shape[0]
+
+
+def get_new_staling_stale_up_to(df, date, staling_interval, stale_interval):
+    """New, staling and stale items at a date, as issue_staleness used to count them."""
+    df_created = df[df["created"] <= date]
+    df_in_range = df_created[df_created["closed"] > date]
+    df_in_range = pd.concat([df_in_range, df_created[df_created.closed.isnull()]])
+
+    staling_days = date - relativedelta(days=+staling_interval)
+    stale_days = date - relativedelta(days=+stale_interval)
+
+    numTotal = df_in_range.shape[0]
+    numNew = df_in_range[df_in_range["created"] >= staling_days].shape[0]
+    staling = df_in_range[df_in_range["created"] > stale_days]
+    numStaling = staling[staling["created"] < staling_days].shape[0]
+    numStale = numTotal - (numNew + numStaling)
+
+    return [numNew, numStaling, numStale]
+
+
+def pr_assignment(df, start_date, end_date, contrib):
+    """Assignments of a contributor during a period, as cntrb_pr_assignment used to count them."""
+    df = df[df["assignee"] == contrib]
+    df_created = df[df["created"] <= end_date]
+    df_in_range = df_created[(df_created["closed"] > start_date) | (df_created["closed"].isnull())]
+    df_unassign = df_in_range[
+        (df_in_range["assignment_action"] == "unassigned") & (df_in_range["assign_date"] <= end_date)
+    ]
+    df_assigned = df_in_range[
+        (df_in_range["assignment_action"] == "assigned") & (df_in_range["assign_date"] <= end_date)
+    ]
+    return df_assigned.shape[0] - df_unassign.shape[0]
+
+
+def random_days(rng, n, nulls=0.0):
+    """Whole days in 2022, so that ties with the sample dates are common."""
+    days = pd.Series(pd.Timestamp("2022-01-01", tz="UTC") + pd.to_timedelta(rng.integers(0, 365, n), unit="D"))
+    return days.where(rng.random(n) >= nulls)
+
+
+@pytest.fixture
+def items():
+    rng = np.random.default_rng(0)
+    created = random_days(rng, 400, nulls=0.05)
+    closed = (created + pd.to_timedelta(rng.integers(-10, 120, 400), unit="D")).where(rng.random(400) >= 0.3)
+    return pd.DataFrame({"created": created, "closed": closed})
+
+
+@pytest.fixture
+def dates():
+    return pd.Series(pd.date_range("2021-12-01", "2023-03-01", freq="3D", tz="UTC"))
+
+
+def test_open_at_matches_the_per_date_count(items, dates):
+    expected = [get_open(items, d) for d in dates]
+
+    assert IntervalState(items["created"], items["closed"]).open_at(dates).tolist() == expected
+
+
+@pytest.mark.parametrize("staling_interval, stale_interval", [(7, 30), (30, 30), (30, 7), (0, 1)])
+def test_staleness_matches_the_per_date_count(items, dates, staling_interval, stale_interval):
+    expected = np.array([get_new_staling_stale_up_to(items, d, staling_interval, stale_interval) for d in dates])
+
+    new, staling, stale = IntervalState(items["created"], items["closed"]).staleness(
+        dates, staling_interval, stale_interval
+    )
+
+    assert np.column_stack([new, staling, stale]).tolist() == expected.tolist()
+
+
+def test_open_created_by_counts_items_created_before_the_cutoff(items, dates):
+    cutoffs = dates - pd.Timedelta(days=14)
+
+    state = IntervalState(items["created"], items["closed"])
+
+    for inclusive in (False, True):
+        expected = []
+        for d, t in zip(dates, cutoffs):
+            created = items["created"] <= t if inclusive else items["created"] < t
+            expected.append(get_open(items[created], d))
+        assert state.open_created_by(dates, cutoffs, inclusive=inclusive).tolist() == expected
+
+
+def test_empty_state_counts_nothing(dates):
+    state = IntervalState(pd.Series([], dtype="datetime64[ns, UTC]"), pd.Series([], dtype="datetime64[ns, UTC]"))
+
+    assert state.open_at(dates).tolist() == [0] * len(dates)
+
+
+@pytest.mark.parametrize("months", [1, 6, 12])
+def test_period_sums_match_the_per_period_count(months):
+    rng = np.random.default_rng(1)
+    n = 600
+    created = random_days(rng, n)
+    df = pd.DataFrame(
+        {
+            "assignee": rng.choice(["a", "b", "c", "d"], n),
+            "assignment_action": rng.choice(["assigned", "unassigned", "assigned"], n),
+            "created": created,
+            "assign_date": (created + pd.to_timedelta(rng.integers(0, 60, n), unit="D")).where(rng.random(n) >= 0.05),
+            "closed": (created + pd.to_timedelta(rng.integers(0, 200, n), unit="D")).where(rng.random(n) >= 0.3),
+        }
+    )
+    starts = pd.Series(pd.date_range("2021-11-01", "2023-06-01", freq="MS", tz="UTC"))[::months].reset_index(drop=True)
+    ends = starts + pd.DateOffset(months=months)
+    contributors = ["a", "b", "c"]
+
+    weights = np.select(
+        [df["assignment_action"] == "assigned", df["assignment_action"] == "unassigned"], [1, -1], default=0
+    )
+    since = df[["created", "assign_date"]].max(axis=1, skipna=False)
+    counts = period_sums(df["assignee"], weights, since, df["closed"], starts, ends, contributors)
+
+    expected = [[pr_assignment(df, s, e, c) for c in contributors] for s, e in zip(starts, ends)]
+    assert counts.astype(int).tolist() == expected
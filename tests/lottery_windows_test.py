@@ -0,0 +1,125 @@
+"""
+    LotteryWindows computes for all windows at once what the lottery factor
+    chart used to compute by filtering the frame once per window.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from pages.utils.lottery_windows import LotteryWindows
+
+ACTIONS = ["Commit", "Issue Opened", "Issue Comment", "Issue Closed", "PR Opened", "PR Comment", "PR Review"]
+
+# the order cntrb_prolificacy_over_time returned its values in
+RETURNED = ["Commit", "Issue Opened", "Issue Comment", "Issue Closed", "PR Opened", "PR Review", "PR Comment"]
+
+
+def cntrb_prolificacy_over_time(df, period_from, period_to, threshold):
+    """Lottery factor of each action type in a window, as contrib_importance_over_time used to compute it."""
+    time_mask = (df["created_at"] >= period_from) & (df["created_at"] <= period_to)
+    df_in_range = df.loc[time_mask]
+
+    df_count_cntrbs = df_in_range.groupby(["Action", "cntrb_id"], observed=True)["cntrb_id"].count().to_frame()
+    df_count_cntrbs = df_count_cntrbs.rename(columns={"cntrb_id": "count"}).reset_index()
+    df_count_cntrbs = df_count_cntrbs.pivot(index="cntrb_id", columns="Action", values="count")
+
+    return tuple(calc_lottery_factor(df_count_cntrbs, action, threshold) for action in RETURNED)
+
+
+def calc_lottery_factor(df, action_type, threshold):
+    if df.empty:
+        return None
+    if action_type not in df.columns:
+        return None
+
+    df = df.sort_values(by=action_type, ascending=False)
+    thresh_cntrbs = df[action_type].sum() * threshold
+    mask = df.index.get_level_values("cntrb_id") == None  # noqa: E711
+    df = df[~mask]
+
+    lottery_factor = 0
+    running_sum = 0
+    for _, row in df.iterrows():
+        running_sum += row[action_type]
+        lottery_factor += 1
+        if running_sum >= thresh_cntrbs:
+            break
+
+    return lottery_factor
+
+
+@pytest.fixture(scope="module")
+def actions():
+    rng = np.random.default_rng(0)
+    n = 3000
+    # a few prolific contributors and a long tail, on whole days so that window bounds are hit
+    cntrbs = np.minimum(rng.zipf(1.5, n), 60).astype(str).astype(object)
+    cntrbs[rng.random(n) < 0.02] = None
+    return pd.DataFrame(
+        {
+            "created_at": pd.Timestamp("2020-01-01", tz="UTC") + pd.to_timedelta(rng.integers(0, 3 * 365, n), unit="D"),
+            "cntrb_id": cntrbs,
+            "Action": rng.choice(ACTIONS + ["Something Else"], n, p=[0.3, 0.1, 0.2, 0.1, 0.1, 0.1, 0.06, 0.04]),
+        }
+    )
+
+
+def windows(step_size, window_width):
+    period_from = pd.Series(
+        pd.Timestamp("2019-11-15", tz="UTC") + pd.DateOffset(months=m) for m in range(0, 44, step_size)
+    )
+    return period_from, period_from + pd.DateOffset(months=window_width)
+
+
+@pytest.mark.parametrize("step_size, window_width", [(1, 1), (1, 6), (3, 2), (6, 12)])
+@pytest.mark.parametrize("threshold", [0.1, 0.5, 1.0])
+def test_matches_the_per_window_computation(actions, step_size, window_width, threshold):
+    starts, ends = windows(step_size, window_width)
+
+    factors = LotteryWindows(
+        actions["created_at"], actions["cntrb_id"], actions["Action"], starts, ends, ACTIONS
+    ).lottery_factor(threshold)
+
+    for i, (s, e) in enumerate(zip(starts, ends)):
+        expected = dict(zip(RETURNED, cntrb_prolificacy_over_time(actions, s, e, threshold)))
+        assert factors.loc[i].tolist() == pytest.approx([expected[a] or np.nan for a in ACTIONS], nan_ok=True)
+
+
+def test_pr_review_and_pr_comment_are_not_swapped():
+    # one reviewer does all reviews, comments are spread over three contributors
+    df = pd.DataFrame(
+        {
+            "created_at": pd.to_datetime(["2022-01-10"] * 6, utc=True),
+            "cntrb_id": ["a", "a", "a", "b", "c", "d"],
+            "Action": ["PR Review", "PR Review", "PR Review", "PR Comment", "PR Comment", "PR Comment"],
+        }
+    )
+    starts, ends = pd.to_datetime(["2022-01-01"], utc=True), pd.to_datetime(["2022-02-01"], utc=True)
+
+    factors = LotteryWindows(df["created_at"], df["cntrb_id"], df["Action"], starts, ends, ACTIONS).lottery_factor(1.0)
+
+    assert factors.loc[0, "PR Review"] == 1
+    assert factors.loc[0, "PR Comment"] == 3
+
+    # the old code assigned its values, in RETURNED order, to the columns in ACTIONS order
+    old = dict(zip(ACTIONS, cntrb_prolificacy_over_time(df, starts[0], ends[0], 1.0)))
+    assert (old["PR Review"], old["PR Comment"]) == (3, 1)
+
+
+def test_windows_without_contributions_are_nan():
+    df = pd.DataFrame(
+        {
+            "created_at": pd.to_datetime(["2022-01-10"], utc=True),
+            "cntrb_id": ["a"],
+            "Action": ["Commit"],
+        }
+    )
+    starts = pd.to_datetime(["2022-01-01", "2022-03-01"], utc=True)
+
+    factors = LotteryWindows(
+        df["created_at"], df["cntrb_id"], df["Action"], starts, starts + pd.DateOffset(months=1), ACTIONS
+    ).lottery_factor(0.5)
+
+    assert factors.loc[0, "Commit"] == 1
+    assert factors.drop(index=0, columns="Commit").isna().all().all()
+    assert factors.loc[1].isna().all()
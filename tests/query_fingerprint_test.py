@@ -0,0 +1,81 @@
+"""
+    Cached results are keyed by a fingerprint of the code that produced them.
+"""
+import sys
+import types
+
+import pytest
+
+import cache_manager.cache_manager as cmm
+
+QUERY = '''
+"""Query module."""
+from helpers.names import canonical
+from cache_manager.cache_manager import STRING
+
+QUERY_VERSION = 1
+
+CACHE_SCHEMA = {"name": STRING}
+
+
+def fake_query(self, repos):
+    """Fetches."""
+    return canonical(repos)
+'''
+
+HELPER = """
+def canonical(names):
+    return names
+"""
+
+
+@pytest.fixture
+def app_dir(tmp_path, monkeypatch):
+    """An app directory with a query module importing a helper module."""
+    (tmp_path / "queries_fp").mkdir()
+    (tmp_path / "queries_fp" / "__init__.py").write_text("")
+    (tmp_path / "helpers").mkdir()
+    (tmp_path / "helpers" / "__init__.py").write_text("")
+    (tmp_path / "queries_fp" / "fake_query.py").write_text(QUERY)
+    (tmp_path / "helpers" / "names.py").write_text(HELPER)
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(cmm, "APP_DIR", str(tmp_path))
+    monkeypatch.setattr(cmm, "_FINGERPRINTS", {})
+    yield tmp_path
+    sys.modules.pop("queries_fp", None)
+
+
+def fingerprint():
+    cmm._FINGERPRINTS.clear()
+    return cmm._query_fingerprint(types.SimpleNamespace(__name__="fake_query", __module__="queries_fp.fake_query"))
+
+
+def test_unchanged_by_comments_and_docstrings(app_dir):
+    before = fingerprint()
+    assert before
+
+    path = app_dir / "queries_fp" / "fake_query.py"
+    path.write_text(QUERY.replace('"""Fetches."""', '"""Fetches, see the docs."""') + "\n# a comment\n")
+    assert fingerprint() == before
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    [
+        ('{"name": STRING}', '{"name": STRING, "other": STRING}'),
+        ("QUERY_VERSION = 1", "QUERY_VERSION = 2"),
+        ("return canonical(repos)", "return canonical(sorted(repos))"),
+    ],
+)
+def test_changed_by_module_code(app_dir, old, new):
+    before = fingerprint()
+    path = app_dir / "queries_fp" / "fake_query.py"
+    path.write_text(QUERY.replace(old, new))
+    assert fingerprint() != before
+
+
+def test_changed_by_imported_helper(app_dir):
+    before = fingerprint()
+    (app_dir / "helpers" / "names.py").write_text(HELPER.replace("return names", "return sorted(names)"))
+    assert fingerprint() != before
@@ -0,0 +1,43 @@
+"""
+    Redis clients share one connection pool per instance and process.
+"""
+import pytest
+
+import _redis_pools
+
+
+@pytest.fixture(autouse=True)
+def pools(monkeypatch):
+    monkeypatch.setattr(_redis_pools, "_pools", {})
+
+
+def test_clients_of_an_instance_share_its_pool():
+    a, b = _redis_pools.cache_client(), _redis_pools.cache_client()
+
+    assert a.connection_pool is b.connection_pool
+    assert _redis_pools.users_client().connection_pool is not a.connection_pool
+
+
+def test_decoding_clients_get_a_pool_of_their_own():
+    raw, decoded = _redis_pools.cache_client(), _redis_pools.cache_client(decode_responses=True)
+
+    assert raw.connection_pool is not decoded.connection_pool
+    assert decoded.connection_pool.connection_kwargs["decode_responses"]
+
+
+def test_pools_are_capped(monkeypatch):
+    monkeypatch.setenv("REDIS_MAX_CONNECTIONS", "7")
+
+    assert _redis_pools.cache_client().connection_pool.max_connections == 7
+
+
+def test_pool_metrics_label_every_pool():
+    _redis_pools.cache_client()
+    _redis_pools.cache_client(decode_responses=True)
+    _redis_pools.users_client()
+
+    metrics = _redis_pools.pool_metrics()
+
+    assert set(metrics) == {"cache", "cache-decoded", "users"}
+    assert metrics["cache"]["created_connections"] == 0
+    assert metrics["cache"]["max_connections"] == _redis_pools.DEFAULT_MAX_CONNECTIONS